@@ -1,26 +1,42 @@
 """
 Agenda voor Sonja: taken/afspraken (eenmalig of recurring) met titel en prompt.
-Opslag in JSON; elke minuut door scheduler gecheckt. Tijdzone: Europe/Amsterdam.
+Opslag in SQLite (data/sonja.db, tabel agenda_items; zie db.py); uitgevoerd door scheduler.py. Tijdzone: Europe/Amsterdam.
+Run-historie: elke uitvoering komt append-only in agenda_runs (status, duur, tokens, denkstappen, antwoord); het item
+zelf houdt alleen een korte samenvatting van de laatste run. Retentie per item via AGENDA_RUN_HISTORY_MAX (default 50)
+en AGENDA_RUN_HISTORY_DAYS (default 90, 0 = geen leeftijdsgrens).
 E-mail: als de taak resultaat per e-mail moet, geef dat in de prompt aan (bijv. 'mail het resultaat naar jan@example.com').
 """
 
 import json
+import os
+import threading
 import uuid
-from datetime import datetime
-from pathlib import Path
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 
 from pydantic import BaseModel, ConfigDict, Field
 
+import db
+
 TZ_AMSTERDAM = ZoneInfo("Europe/Amsterdam")
 
-# Bestand in backend/data/agenda.json
-_DATA_DIR = Path(__file__).resolve().parent / "data"
-_AGENDA_FILE = _DATA_DIR / "agenda.json"
+_SUMMARY_CHARS = 280  # lengte van last_run_summary op het item
+
+_listeners: list = []
+
+# Agendaversies (agenda_version) die dit proces zelf heeft geschreven; de scheduler resynct alleen op andere
+_own_versions: set[int] = set()
+_version_lock = threading.Lock()
+
+# Gememoiseerde volgende run per item: item_id → (sleutel, volgende run). Geldig zolang type/schedule/last_run_at
+# gelijk zijn, het moment nog niet voorbij is en de UTC-offset van Amsterdam niet is veranderd (DST-overgang).
+_next_run_cache: dict[str, tuple[tuple, datetime | None]] = {}
+_next_run_lock = threading.Lock()
 
 
 class AgendaItem(BaseModel):
-    model_config = ConfigDict(extra="ignore")  # oude items met mail_to blijven laden
+    model_config = ConfigDict(extra="ignore")  # oude items met mail_to / last_run_response blijven laden
 
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
@@ -28,153 +44,333 @@ class AgendaItem(BaseModel):
     type: str = Field(description="once or recurring")
     schedule: str = Field(description="ISO datetime (once) or cron (recurring, bijv. 0 9 * * 1-5)")
     created_at: str = Field(default_factory=lambda: datetime.utcnow().isoformat() + "Z")
+    priority: int = Field(default=0, description="Hoger = eerder uitgevoerd als meerdere taken tegelijk wachten")
+    kind: str = Field(default="prompt", description="prompt (Sonja voert de prompt uit) of competitor_monitor")
     last_run_at: str | None = None
-    last_run_response: str | None = None  # Antwoord van Sonja bij laatste run
-    last_run_steps: list[dict] | None = None  # Denkstappen (tool-aanroepen) bij laatste run
+    last_run_id: str | None = None  # Volledige run (antwoord, denkstappen) via get_run
+    last_run_status: str | None = None  # done, retrying, error of timeout
+    last_run_duration_ms: int | None = None
+    last_run_summary: str | None = None  # Begin van het antwoord (of de fout)
+    # Opgegeven uitvoering (geen pogingen meer): {run_id, scheduled_for, error, attempts, at}; weg na een geslaagde run
+    dead_letter: dict | None = None
+    # Laatste geplande moment dat het misfire-beleid heeft overgeslagen; geldt ook na een herstart en in andere processen
+    skipped_for: str | None = None
+
+
+class AgendaRun(BaseModel):
+    """Eén uitvoering van een agenda-item. In lijsten zonder steps/response (alleen step_count en summary)."""
+
+    id: str
+    item_id: str
+    started_at: str
+    finished_at: str | None = None
+    status: str
+    duration_ms: int | None = None  # looptijd van de run zelf
+    scheduled_for: str | None = None  # gepland moment (scheduler) of None (handmatig)
+    queue_wait_ms: int | None = None  # tijd tussen afvuren en start in de worker-pool
+    attempt: int = 1  # poging binnen dezelfde uitvoering (retry na een tijdelijke fout)
+    tokens: dict | None = None  # usage_metrics van de agent (prompt_tokens, completion_tokens, total_tokens, …)
+    step_count: int = 0
+    summary: str | None = None
+    error: str | None = None
+    steps: list[dict] | None = None
+    response: str | None = None
 
 
-def _load() -> list[dict]:
-    _DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if not _AGENDA_FILE.exists():
-        return []
-    raw = _AGENDA_FILE.read_text(encoding="utf-8")
-    return json.loads(raw) if raw.strip() else []
+def _row_to_item(row) -> AgendaItem:
+    return AgendaItem.model_validate(json.loads(row["data"]))
 
 
-def _save(items: list[dict]) -> None:
-    _DATA_DIR.mkdir(parents=True, exist_ok=True)
-    # Verwijder oude mail_to-velden zodat ze niet meer in de file staan
-    for d in items:
-        d.pop("mail_to", None)
-    _AGENDA_FILE.write_text(json.dumps(items, indent=2, ensure_ascii=False), encoding="utf-8")
+def list_items(limit: int | None = None, offset: int = 0) -> list[AgendaItem]:
+    """Agenda-items in volgorde van aanmaken; optioneel één pagina."""
+    rows = db.connect().execute(
+        "SELECT data FROM agenda_items ORDER BY rowid LIMIT ? OFFSET ?",
+        (-1 if limit is None else limit, offset),
+    ).fetchall()
+    return [_row_to_item(r) for r in rows]
 
 
-def list_items() -> list[AgendaItem]:
-    """Alle agenda-items."""
-    data = _load()
-    return [AgendaItem.model_validate(d) for d in data]
+def count_items() -> int:
+    return db.connect().execute("SELECT COUNT(*) FROM agenda_items").fetchone()[0]
 
 
 def get_item(item_id: str) -> AgendaItem | None:
-    data = _load()
-    for d in data:
-        if d.get("id") == item_id:
-            return AgendaItem.model_validate(d)
-    return None
+    row = db.connect().execute("SELECT data FROM agenda_items WHERE id = ?", (item_id,)).fetchone()
+    return _row_to_item(row) if row else None
+
+
+@contextmanager
+def _write():
+    """Schrijftransactie op de agenda die de agendaversie ophoogt; na de commit onthouden als eigen wijziging."""
+    with db.transaction() as conn:
+        yield conn
+        conn.execute("UPDATE agenda_version SET version = version + 1 WHERE id = 1")
+        version = conn.execute("SELECT version FROM agenda_version WHERE id = 1").fetchone()[0]
+    with _version_lock:
+        _own_versions.add(version)
+
+
+def changes_since(version: int) -> tuple[int, bool]:
+    """(huidige agendaversie, of er sinds `version` wijzigingen van andere processen zijn).
+    Versies lopen strikt op (BEGIN IMMEDIATE), dus elke versie daartussen die niet van ons is, komt van elders."""
+    current = db.connect().execute("SELECT version FROM agenda_version WHERE id = 1").fetchone()[0]
+    with _version_lock:
+        external = current - version > len(_own_versions) or any(
+            v not in _own_versions for v in range(version + 1, current + 1)
+        )
+        _own_versions.difference_update([v for v in _own_versions if v <= current])
+    return current, external
 
 
 def add_item(item: AgendaItem) -> AgendaItem:
-    data = _load()
-    d = item.model_dump()
-    data.append(d)
-    _save(data)
+    with _write() as conn:
+        conn.execute(
+            "INSERT INTO agenda_items (id, created_at, data) VALUES (?, ?, ?)",
+            (item.id, item.created_at, json.dumps(item.model_dump(), ensure_ascii=False)),
+        )
+    _notify(item.id)
     return item
 
 
 def update_item(item_id: str, **kwargs) -> AgendaItem | None:
-    data = _load()
-    for i, d in enumerate(data):
-        if d.get("id") == item_id:
-            for k, v in kwargs.items():
-                d[k] = v
-            data[i] = d
-            _save(data)
-            return AgendaItem.model_validate(d)
-    return None
+    """Werk velden van één item bij; lezen en schrijven in één transactie (geen lost updates tussen threads)."""
+    with _write() as conn:
+        row = conn.execute("SELECT data FROM agenda_items WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            return None
+        d = json.loads(row["data"])
+        d.update(kwargs)
+        conn.execute("UPDATE agenda_items SET data = ? WHERE id = ?", (json.dumps(d, ensure_ascii=False), item_id))
+    _notify(item_id)
+    return AgendaItem.model_validate(d)
+
+
+def mark_skipped(item_id: str, scheduled_for: datetime) -> None:
+    """Leg vast dat het misfire-beleid `scheduled_for` heeft overgeslagen. Verhoogt de agendaversie (andere processen
+    resyncen en zien de skip) maar wekt de scheduler van dit proces niet: die heeft het zelf besloten."""
+    with _write() as conn:
+        row = conn.execute("SELECT data FROM agenda_items WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
+            return
+        d = json.loads(row["data"])
+        d["skipped_for"] = scheduled_for.isoformat()
+        conn.execute("UPDATE agenda_items SET data = ? WHERE id = ?", (json.dumps(d, ensure_ascii=False), item_id))
 
 
 def delete_item(item_id: str) -> bool:
-    data = _load()
-    new_data = [d for d in data if d.get("id") != item_id]
-    if len(new_data) == len(data):
-        return False
-    _save(new_data)
-    return True
+    with _write() as conn:
+        conn.execute("DELETE FROM agenda_runs WHERE item_id = ?", (item_id,))
+        deleted = conn.execute("DELETE FROM agenda_items WHERE id = ?", (item_id,)).rowcount > 0
+    if deleted:
+        _notify(item_id)
+    return deleted
 
 
-def set_last_run(item_id: str, at: datetime) -> None:
-    update_item(item_id, last_run_at=at.isoformat())
+def _history_max() -> int:
+    try:
+        return max(1, int(os.getenv("AGENDA_RUN_HISTORY_MAX", "50")))
+    except ValueError:
+        return 50
 
 
-def get_next_run(item: AgendaItem, now: datetime | None = None) -> datetime | None:
-    """Volgende geplande uitvoering voor dit item (Amsterdam). Voor once: schedule-datum (of None als al uitgevoerd); voor recurring: volgende cron-moment."""
-    if now is None:
-        now = datetime.now(TZ_AMSTERDAM)
-    elif now.tzinfo is None:
-        now = now.replace(tzinfo=TZ_AMSTERDAM)
-    else:
-        now = now.astimezone(TZ_AMSTERDAM)
-    if item.type == "once":
-        if item.last_run_at:
-            return None  # Eenmalige taak al uitgevoerd
-        try:
-            raw = item.schedule.replace("Z", "+00:00")
-            dt = datetime.fromisoformat(raw)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=TZ_AMSTERDAM)
-            else:
-                dt = dt.astimezone(TZ_AMSTERDAM)
-            return dt
-        except Exception:
+def _history_days() -> int:
+    try:
+        return max(0, int(os.getenv("AGENDA_RUN_HISTORY_DAYS", "90")))
+    except ValueError:
+        return 90
+
+
+def _summary(text: str | None) -> str | None:
+    text = " ".join((text or "").split())
+    if len(text) > _SUMMARY_CHARS:
+        text = text[:_SUMMARY_CHARS].rstrip() + " …"
+    return text or None
+
+
+def _row_to_run(row, details: bool) -> AgendaRun:
+    run = AgendaRun(
+        id=row["id"],
+        item_id=row["item_id"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        status=row["status"],
+        duration_ms=row["duration_ms"],
+        scheduled_for=row["scheduled_for"],
+        queue_wait_ms=row["queue_wait_ms"],
+        attempt=row["attempt"],
+        tokens=json.loads(row["tokens"]) if row["tokens"] else None,
+        step_count=row["step_count"],
+        summary=_summary(row["response"] if row["status"] == "done" else row["error"]),
+        error=row["error"],
+    )
+    if details:
+        run.steps = json.loads(row["steps"]) if row["steps"] else []
+        run.response = row["response"]
+    return run
+
+
+def record_run(
+    item_id: str,
+    started_at: datetime,
+    finished_at: datetime,
+    status: str,
+    response: str | None = None,
+    steps: list[dict] | None = None,
+    error: str | None = None,
+    tokens: dict | None = None,
+    scheduled_for: datetime | None = None,
+    queue_wait_ms: int | None = None,
+    attempt: int = 1,
+    dead_letter: bool = False,
+) -> AgendaRun | None:
+    """Voeg een run toe aan de historie en werk de samenvatting op het item bij (één transactie).
+    Tijden in de run-tabel in UTC (sorteerbaar als tekst); last_run_at op het item blijft zoals meegegeven.
+    dead_letter=True: de uitvoering is opgegeven en komt als dead_letter op het item; een geslaagde run wist dat.
+    Oudere runs boven de retentiegrenzen worden meteen opgeruimd. None als het item niet (meer) bestaat."""
+    steps = steps or []
+    run_id = str(uuid.uuid4())
+    duration_ms = max(0, int((finished_at - started_at).total_seconds() * 1000))
+    with db.transaction() as conn:
+        row = conn.execute("SELECT data FROM agenda_items WHERE id = ?", (item_id,)).fetchone()
+        if row is None:
             return None
+        conn.execute(
+            "INSERT INTO agenda_runs (id, item_id, started_at, finished_at, status, duration_ms, tokens, step_count, "
+            "steps, response, error, scheduled_for, queue_wait_ms, attempt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                run_id, item_id, started_at.astimezone(timezone.utc).isoformat(),
+                finished_at.astimezone(timezone.utc).isoformat(), status, duration_ms,
+                json.dumps(tokens) if tokens else None, len(steps), json.dumps(steps, ensure_ascii=False),
+                response, error,
+                scheduled_for.astimezone(timezone.utc).isoformat() if scheduled_for else None, queue_wait_ms, attempt,
+            ),
+        )
+        d = json.loads(row["data"])
+        d.update(
+            last_run_at=started_at.isoformat(),
+            last_run_id=run_id,
+            last_run_status=status,
+            last_run_duration_ms=duration_ms,
+            last_run_summary=_summary(response if status == "done" else error),
+        )
+        if status == "done":
+            d["dead_letter"] = None
+        elif dead_letter:
+            d["dead_letter"] = {
+                "run_id": run_id,
+                "scheduled_for": scheduled_for.isoformat() if scheduled_for else None,
+                "error": error,
+                "attempts": attempt,
+                "at": finished_at.isoformat(),
+            }
+        conn.execute("UPDATE agenda_items SET data = ? WHERE id = ?", (json.dumps(d, ensure_ascii=False), item_id))
+        _prune_runs(conn, item_id)
+    return get_run(item_id, run_id)
+
+
+def _prune_runs(conn, item_id: str) -> None:
+    """Retentie: alleen de laatste AGENDA_RUN_HISTORY_MAX runs en niets ouder dan AGENDA_RUN_HISTORY_DAYS."""
+    conn.execute(
+        "DELETE FROM agenda_runs WHERE item_id = ? AND id NOT IN "
+        "(SELECT id FROM agenda_runs WHERE item_id = ? ORDER BY started_at DESC LIMIT ?)",
+        (item_id, item_id, _history_max()),
+    )
+    days = _history_days()
+    if days:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        conn.execute("DELETE FROM agenda_runs WHERE item_id = ? AND started_at < ?", (item_id, cutoff))
+
+
+def list_runs(item_id: str, limit: int = 20, offset: int = 0) -> tuple[int, list[AgendaRun]]:
+    """Runs van een item, nieuwste eerst, zonder steps/response. Retourneert (totaal, pagina)."""
+    conn = db.connect()
+    total = conn.execute("SELECT COUNT(*) FROM agenda_runs WHERE item_id = ?", (item_id,)).fetchone()[0]
+    rows = conn.execute(
+        "SELECT id, item_id, started_at, finished_at, status, duration_ms, scheduled_for, queue_wait_ms, attempt, "
+        "tokens, step_count, substr(response, 1, ?) AS response, error FROM agenda_runs WHERE item_id = ? "
+        "ORDER BY started_at DESC LIMIT ? OFFSET ?",
+        (_SUMMARY_CHARS * 2, item_id, limit, offset),
+    ).fetchall()
+    return total, [_row_to_run(r, details=False) for r in rows]
+
+
+def list_dead_letters() -> list[AgendaItem]:
+    """Items met een opgegeven uitvoering (dead_letter), nieuwste eerst."""
+    rows = db.connect().execute(
+        "SELECT data FROM agenda_items WHERE json_extract(data, '$.dead_letter') IS NOT NULL"
+    ).fetchall()
+    items = [_row_to_item(r) for r in rows]
+    return sorted(items, key=lambda i: i.dead_letter.get("at") or "", reverse=True)
+
+
+def get_run(item_id: str, run_id: str) -> AgendaRun | None:
+    """Eén run met denkstappen en volledig antwoord."""
+    row = db.connect().execute(
+        "SELECT * FROM agenda_runs WHERE id = ? AND item_id = ?", (run_id, item_id)
+    ).fetchone()
+    return _row_to_run(row, details=True) if row else None
+
+
+def subscribe(callback) -> None:
+    """callback(item_id) na elke add/update/delete (bijv. de scheduler wekken). Ook bij wijzigingen via Sonja's tools."""
+    _listeners.append(callback)
+
+
+def _notify(item_id: str) -> None:
+    with _next_run_lock:
+        _next_run_cache.pop(item_id, None)
+    for callback in _listeners:
+        try:
+            callback(item_id)
+        except Exception as e:
+            print(f"[Agenda] Listener fout voor {item_id}: {e}")
+
+
+def to_amsterdam(dt: datetime) -> datetime:
+    """Naive = Amsterdam; aware wordt omgerekend."""
+    return dt.replace(tzinfo=TZ_AMSTERDAM) if dt.tzinfo is None else dt.astimezone(TZ_AMSTERDAM)
+
+
+def parse_time(value: str | None) -> datetime | None:
+    """ISO-tijd (naive = Amsterdam, Z = UTC) als Amsterdam-datetime; None bij leeg of ongeldig."""
+    if not value:
+        return None
+    try:
+        return to_amsterdam(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        return None
+
+
+def next_fire_after(item: AgendaItem, after: datetime) -> datetime | None:
+    """Eerstvolgende uitvoering na `after` (Amsterdam). Once: de schedule-datum zolang het item nog niet is
+    uitgevoerd (ongeacht `after`); recurring: volgende cron-moment in lokale tijd (croniter op naive Amsterdam-tijd)."""
+    if item.type == "once":
+        return None if item.last_run_at else parse_time(item.schedule)
     if item.type == "recurring":
         try:
             from croniter import croniter
-            now_naive = now.replace(tzinfo=None)
-            c = croniter(item.schedule, now_naive)
-            next_naive = c.get_next(datetime)
-            return next_naive.replace(tzinfo=TZ_AMSTERDAM)
+            c = croniter(item.schedule, to_amsterdam(after).replace(tzinfo=None))
+            return c.get_next(datetime).replace(tzinfo=TZ_AMSTERDAM)
         except Exception:
             return None
     return None
 
 
-def get_due_items(now: datetime | None = None) -> list[AgendaItem]:
-    """Items die nu (deze minuut) uitgevoerd moeten worden. Tijdzone: Europe/Amsterdam."""
-    if now is None:
-        now = datetime.now(TZ_AMSTERDAM)
-    elif now.tzinfo is None:
-        now = now.replace(tzinfo=TZ_AMSTERDAM)
-    else:
-        now = now.astimezone(TZ_AMSTERDAM)
-    due: list[AgendaItem] = []
-    try:
-        from croniter import croniter
-    except ImportError:
-        croniter = None
-
-    for item in list_items():
-        if item.type == "once":
-            try:
-                # schedule = ISO datetime (naive = Amsterdam, of met Z = UTC → omrekenen)
-                raw = item.schedule.replace("Z", "+00:00")
-                dt = datetime.fromisoformat(raw)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=TZ_AMSTERDAM)
-                else:
-                    dt = dt.astimezone(TZ_AMSTERDAM)
-                diff_sec = (now - dt).total_seconds()
-                if 0 <= diff_sec < 60:
-                    due.append(item)
-            except Exception:
-                continue
-        elif item.type == "recurring" and croniter:
-            try:
-                # schedule = cron (bijv. 0 9 * * 1-5); croniter met Amsterdam-tijd
-                now_naive = now.replace(tzinfo=None)
-                c = croniter(item.schedule, now_naive)
-                prev = c.get_prev(datetime)
-                if (now_naive - prev).total_seconds() < 60:
-                    if item.last_run_at:
-                        try:
-                            last = datetime.fromisoformat(item.last_run_at.replace("Z", "+00:00"))
-                            if last.tzinfo:
-                                last = last.astimezone(TZ_AMSTERDAM).replace(tzinfo=None)
-                            if (now_naive - last).total_seconds() < 60:
-                                continue
-                        except Exception:
-                            pass
-                    due.append(item)
-            except Exception:
-                continue
-    return due
+def get_next_run(item: AgendaItem, now: datetime | None = None) -> datetime | None:
+    """Volgende geplande uitvoering voor dit item (Amsterdam). Voor once: schedule-datum (of None als al uitgevoerd); voor recurring: volgende cron-moment.
+    Zonder expliciete `now` gememoiseerd per item (zie _next_run_cache)."""
+    if now is not None:
+        return next_fire_after(item, now)
+    now = datetime.now(TZ_AMSTERDAM)
+    key = (item.type, item.schedule, item.last_run_at, now.utcoffset())
+    with _next_run_lock:
+        cached = _next_run_cache.get(item.id)
+    if cached is not None and cached[0] == key:
+        nxt = cached[1]
+        # once: vast moment (ook als het voorbij is); recurring: geldig tot het moment voorbij is
+        if item.type != "recurring" or nxt is None or nxt > now:
+            return nxt
+    nxt = next_fire_after(item, now)
+    with _next_run_lock:
+        _next_run_cache[item.id] = (key, nxt)
+    return nxt
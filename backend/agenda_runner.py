@@ -0,0 +1,358 @@
+"""
+Uitvoering van agenda-items: een begrensde worker-pool in plaats van een losse thread per afgevuurd item.
+
+- AGENDA_WORKERS (default 3) workers; bij drukte gaat het item met de hoogste `priority` voor, daarna wie het
+  eerst klaarstond. Een item dat al in de wachtrij staat of draait, wordt niet nog eens ingepland.
+- AGENDA_RUN_TIMEOUT_SEC (default 1800, 0 = geen limiet): maximale looptijd; daarna krijgt de run een stopsignaal en
+  stopt hij bij de eerstvolgende tool-aanroep of agent-stap (een LLM-aanroep of tool die al loopt wordt afgemaakt).
+  Status 'timeout' volgt pas als de run echt gestopt is; tot dan blijft de worker bezet, zodat AGENDA_WORKERS ook
+  het aantal werkelijk lopende runs begrenst.
+- AGENDA_STAGGER_SEC (default 0 = uit): geplande uitvoeringen krijgen een vaste vertraging per item tussen 0 en dit
+  aantal seconden, zodat vijftig taken om 09:00 niet tegelijk de LLM-limieten raken.
+- Per run worden wachttijd (afvuren → start) en looptijd vastgelegd in de run-historie (agenda.record_run).
+- Tijdelijke fouten (LLM 429/5xx/overbelast, netwerk) krijgen een nieuwe poging na exponentiële backoff met
+  jitter: AGENDA_RETRY_MAX_ATTEMPTS (default 3 pogingen in totaal), AGENDA_RETRY_BASE_SEC (30), AGENDA_RETRY_MAX_SEC
+  (900). Een retry wacht in dezelfde wachtrij en telt dus mee in de worker-limiet. Geen pogingen meer (of een fout
+  die niet tijdelijk is, of een timeout): de uitvoering komt als dead_letter op het item (zichtbaar in de API).
+- Live volgen: per item dat wacht of draait staat een live-entry (current()) met status en een gedeelde stappenlijst
+  die tijdens de run groeit; main.py streamt die als SSE. Alleen in het proces dat de run uitvoert.
+- Geplande uitvoeringen gaan via een lease (leases.py): met meerdere processen voert alleen de claimer uit. Een
+  heartbeat verlengt de leases van wachtende en lopende runs en neemt verlopen leases van gecrashte processen over.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import competitor_monitor
+import leases
+from agenda import TZ_AMSTERDAM, get_item, record_run
+from sonja import RunCancelled, create_sonja_ephemeral
+
+_cond = threading.Condition()
+_delayed: list[tuple[float, int, dict]] = []  # (klaar om, seq, job) — gestaggerde jobs
+_ready: list[tuple[int, float, int, dict]] = []  # (-priority, klaar om, seq, job)
+_active: set[str] = set()  # item-ids in de wachtrij of in uitvoering
+_held: set[tuple[str, str]] = set()  # leases van dit proces: (item_id, gepland moment)
+# item_id → {status: queued|running|retrying, attempt, steps, result}; result wordt gezet als de uitvoering klaar is
+_live: dict[str, dict] = {}
+_running = 0
+_seq = itertools.count()
+_started = False
+
+
+def _workers() -> int:
+    try:
+        return max(1, int(os.getenv("AGENDA_WORKERS", "3")))
+    except ValueError:
+        return 3
+
+
+def _timeout_sec() -> float:
+    try:
+        return max(0.0, float(os.getenv("AGENDA_RUN_TIMEOUT_SEC", "1800")))
+    except ValueError:
+        return 1800.0
+
+
+def _stagger_sec() -> float:
+    try:
+        return max(0.0, float(os.getenv("AGENDA_STAGGER_SEC", "0")))
+    except ValueError:
+        return 0.0
+
+
+def _max_attempts() -> int:
+    try:
+        return max(1, int(os.getenv("AGENDA_RETRY_MAX_ATTEMPTS", "3")))
+    except ValueError:
+        return 3
+
+
+def _retry_delay(attempt: int) -> float:
+    """Backoff na poging `attempt`: base * 2^(attempt-1), begrensd, met jitter (50–100%)."""
+    try:
+        base = max(1.0, float(os.getenv("AGENDA_RETRY_BASE_SEC", "30")))
+        cap = max(base, float(os.getenv("AGENDA_RETRY_MAX_SEC", "900")))
+    except ValueError:
+        base, cap = 30.0, 900.0
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+_TRANSIENT_NAMES = ("RateLimit", "ServiceUnavailable", "InternalServer", "APIConnection", "Timeout", "Overloaded")
+# Statuscodes alleen in context ("Error code: 529", "HTTP/1.1 503", "status 429"), niet elk los getal in een melding
+_TRANSIENT_TEXT = re.compile(
+    r"\b(?:status|http(?:/[\d.]+)?|error|code)\D{0,3}(?:429|5\d\d)\b"
+    r"|rate.?limit|overloaded|temporarily unavailable|connection (?:error|reset|refused)|timed out",
+    re.I,
+)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    """Tijdelijke provider- of netwerkfout (retry zinvol)? Eerst op statuscode en exceptietype/-naam; de foutmelding
+    alleen als laatste redmiddel."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    if any(name in type(exc).__name__ for name in _TRANSIENT_NAMES):
+        return True
+    return bool(_TRANSIENT_TEXT.search(str(exc)))
+
+
+def _stagger_offset(item_id: str) -> float:
+    """Vaste vertraging per item binnen het stagger-venster (zelfde item → zelfde plek in het venster)."""
+    window = _stagger_sec()
+    if not window:
+        return 0.0
+    h = int(hashlib.sha1(item_id.encode("utf-8")).hexdigest()[:8], 16)
+    return (h / 0xFFFFFFFF) * window
+
+
+def _firing_key(scheduled_for: datetime) -> str:
+    """Lease-sleutel van een geplande uitvoering: het geplande moment in UTC (gelijk in elk proces)."""
+    return scheduled_for.astimezone(timezone.utc).isoformat()
+
+
+def submit(item_id: str, scheduled_for: datetime | None = None, lease: str | None = None) -> bool:
+    """Zet een item in de wachtrij. scheduled_for = gepland moment (of None bij een handmatige run).
+    lease = geclaimde firing-key van een geplande uitvoering; die wordt gestaggerd en na afloop afgesloten.
+    False als het item al wacht of draait."""
+    item = get_item(item_id)
+    if item is None:
+        return False
+    now = time.time()
+    job = {
+        "item_id": item_id,
+        "priority": item.priority,
+        "scheduled_for": scheduled_for,
+        "queued_at": now,
+        "lease": lease,
+        "attempt": 1,
+    }
+    with _cond:
+        if item_id in _active:
+            return False
+        _active.add(item_id)
+        _live[item_id] = {"status": "queued", "attempt": 1, "steps": [], "result": None}
+        if lease:
+            _held.add((item_id, lease))
+        delay = _stagger_offset(item_id) if lease else 0.0
+        if delay:
+            heapq.heappush(_delayed, (now + delay, next(_seq), job))
+        else:
+            heapq.heappush(_ready, (-job["priority"], now, next(_seq), job))
+        _cond.notify()
+    return True
+
+
+def fire(item_id: str, scheduled_for: datetime) -> None:
+    """Callback voor scheduler.py: lease claimen en het item in de pool zetten. Heeft een ander proces de
+    uitvoering al geclaimd, dan gebeurt hier niets."""
+    key = _firing_key(scheduled_for)
+    if not leases.claim(item_id, key):
+        return
+    if not submit(item_id, scheduled_for, lease=key):
+        leases.finish(item_id, key, "skipped")
+        print(f"[Agenda] Item {item_id} wacht of draait nog; uitvoering van {scheduled_for.strftime('%H:%M')} overgeslagen")
+
+
+def _heartbeat() -> None:
+    """Leases van dit proces verlengen, verlopen leases van andere processen overnemen, oude leases opruimen."""
+    last_prune = 0.0
+    while True:
+        time.sleep(leases.ttl_sec() / 3)
+        try:
+            with _cond:
+                held = list(_held)
+            for item_id, key in leases.renew(held):
+                print(f"[Agenda] Lease voor {item_id} ({key}) verloren; een ander proces kan hem overnemen")
+            for item_id, key in leases.take_expired():
+                print(f"[Agenda] Verlopen lease van {item_id} ({key}) overgenomen")
+                if not submit(item_id, datetime.fromisoformat(key).astimezone(TZ_AMSTERDAM), lease=key):
+                    leases.finish(item_id, key, "skipped")
+            if time.time() - last_prune > 3600:
+                leases.prune()
+                last_prune = time.time()
+        except Exception as e:
+            print(f"[Agenda] Lease-heartbeat fout: {e}")
+
+
+def _next_job() -> dict:
+    global _running
+    with _cond:
+        while True:
+            now = time.time()
+            while _delayed and _delayed[0][0] <= now:
+                ready_at, seq, job = heapq.heappop(_delayed)
+                heapq.heappush(_ready, (-job["priority"], ready_at, seq, job))
+            if _ready:
+                _running += 1
+                return heapq.heappop(_ready)[3]
+            _cond.wait(_delayed[0][0] - now if _delayed else None)
+
+
+class _RunTimeout(Exception):
+    """De run is na de maximale looptijd (AGENDA_RUN_TIMEOUT_SEC) via het stopsignaal gestopt."""
+
+
+async def _bounded(run, timeout: float, stop: threading.Event):
+    """run met maximale looptijd. Daarna wordt het stopsignaal gezet en wachten we tot de run echt gestopt is (de
+    kickoff-thread is niet te annuleren), zodat de worker bezet blijft zolang er nog iets gebeurt. _RunTimeout alleen
+    als de run op het stopsignaal is afgebroken; rondt hij toch af, dan telt het antwoord. Andere fouten (ook een
+    TimeoutError uit de run zelf) gaan ongewijzigd door naar het retry-pad."""
+    task = asyncio.ensure_future(run)
+    done, _ = await asyncio.wait({task}, timeout=timeout or None)
+    if not done:
+        stop.set()
+        try:
+            return await task
+        except RunCancelled:
+            raise _RunTimeout() from None
+    return task.result()
+
+
+def _message(item) -> str:
+    return (
+        f"Geplande taak: [{item.title}].\n\n"
+        f"Voer de volgende opdracht uit: {item.prompt}\n\n"
+    )
+
+
+def _execute(job: dict, loop: asyncio.AbstractEventLoop) -> bool:
+    """Eén poging met een ephemeral Sonja (async pad met stopsignaal, zodat de maximale looptijd de run kan stoppen);
+    items van het soort competitor_monitor voeren de website-controle uit in plaats van een prompt.
+    Retourneert True als er een nieuwe poging moet komen (tijdelijke fout, pogingen over)."""
+    item = get_item(job["item_id"])
+    if item is None:
+        return False
+    attempt = job["attempt"]
+    started = datetime.now(TZ_AMSTERDAM)
+    queue_wait_ms = int((time.time() - job["queued_at"]) * 1000)
+    label = f" (poging {attempt})" if attempt > 1 else ""
+    print(f"[Agenda] Start taak: {item.title}{label} (wachttijd {queue_wait_ms / 1000:.1f}s)")
+    sonja = None if item.kind == competitor_monitor.KIND else create_sonja_ephemeral()
+    live = _live.get(item.id) or {"steps": []}
+    live.update(status="running", attempt=attempt)
+    steps: list[dict] = live["steps"]  # gedeeld met SSE-subscribers; bij een retry loopt de lijst door
+    first_step = len(steps)
+    timeout = _timeout_sec()
+    stop = threading.Event()
+    usage: dict = {}
+    response, error, status, retry = None, None, "done", False
+    try:
+        if sonja is None:
+            run = competitor_monitor.run_monitor(steps, stop=stop)
+        else:
+            run = sonja.chat_async_with_list(_message(item), "", steps, stop=stop, usage=usage)
+        response = loop.run_until_complete(_bounded(run, timeout, stop))
+    except _RunTimeout:
+        status = "timeout"
+        error = f"Maximale looptijd ({timeout:.0f}s) overschreden; run gestopt bij de eerstvolgende stap."
+    except Exception as e:
+        status, error = "error", str(e)
+        retry = _is_transient(e) and attempt < _max_attempts()
+        if retry:
+            status = "retrying"
+    finished = datetime.now(TZ_AMSTERDAM)
+    run_record = record_run(
+        item.id, started, finished, status,
+        response=(response or "") if status == "done" else None, steps=steps[first_step:], error=error,
+        tokens=usage or None, scheduled_for=job["scheduled_for"], queue_wait_ms=queue_wait_ms,
+        attempt=attempt, dead_letter=status in ("error", "timeout"),
+    )
+    if retry:
+        live["status"] = "retrying"
+        steps.append({
+            "tool": "agenda_retry",
+            "summary": f"poging={attempt}",
+            "display_label": f"Poging {attempt} mislukt door een tijdelijke fout; nieuwe poging volgt. ({error})",
+        })
+    else:
+        live["result"] = {
+            "status": status,
+            "run_id": run_record.id if run_record else None,
+            "response": response if status == "done" else None,
+            "error": error,
+        }
+    duration = (finished - started).total_seconds()
+    if status == "done":
+        print(f"[Agenda] Taak uitgevoerd: {item.title} ({duration:.1f}s)")
+    elif retry:
+        print(f"[Agenda] Item {item.id} tijdelijke fout (poging {attempt}): {error}")
+    else:
+        print(f"[Agenda] Item {item.id} {status} na {attempt} poging(en), naar dead-letter: {error}")
+    return retry
+
+
+def _requeue(job: dict) -> None:
+    """Nieuwe poging na backoff; het item blijft actief (geen dubbele inplanning) en de lease blijft van ons."""
+    delay = _retry_delay(job["attempt"])
+    job["attempt"] += 1
+    job["queued_at"] = time.time() + delay  # wachttijd van de retry telt vanaf het einde van de backoff
+    with _cond:
+        heapq.heappush(_delayed, (job["queued_at"], next(_seq), job))
+        _cond.notify()
+    print(f"[Agenda] Item {job['item_id']}: poging {job['attempt']} over {delay:.0f}s")
+
+
+def _worker() -> None:
+    global _running
+    loop = asyncio.new_event_loop()  # eigen loop per worker, hergebruikt voor alle runs van deze worker
+    asyncio.set_event_loop(loop)
+    while True:
+        job = _next_job()
+        retry = False
+        try:
+            retry = _execute(job, loop)
+        except Exception as e:
+            print(f"[Agenda] Run van item {job['item_id']} niet opgeslagen: {e}")
+        if retry:
+            with _cond:
+                _running -= 1
+            _requeue(job)
+            continue
+        if job["lease"]:
+            try:
+                leases.finish(job["item_id"], job["lease"])
+            except Exception as e:
+                print(f"[Agenda] Lease van {job['item_id']} niet afgesloten: {e}")
+        with _cond:
+            _running -= 1
+            _active.discard(job["item_id"])
+            _held.discard((job["item_id"], job["lease"]))
+            live = _live.pop(job["item_id"], None)
+        if live is not None and live["result"] is None:
+            live["result"] = {"status": "error", "run_id": None, "response": None, "error": "Run afgebroken."}
+
+
+def start() -> None:
+    """Start de workers en de lease-heartbeat (één keer per proces)."""
+    global _started
+    with _cond:
+        if _started:
+            return
+        _started = True
+    for _ in range(_workers()):
+        threading.Thread(target=_worker, daemon=True).start()
+    threading.Thread(target=_heartbeat, daemon=True).start()
+
+
+def current(item_id: str) -> dict | None:
+    """Live-entry van een wachtende of lopende uitvoering van dit item (in dit proces), of None."""
+    with _cond:
+        return _live.get(item_id)
+
+
+def stats() -> dict:
+    """Aantal workers, wachtende (incl. gestaggerde) en lopende runs."""
+    with _cond:
+        return {"workers": _workers(), "queued": len(_ready) + len(_delayed), "running": _running}
@@ -0,0 +1,364 @@
+"""
+Monitoring van concurrentenwebsites: compacte tekstsnapshots van de gevolgde pagina's (Competitor.urls) en alleen
+een LLM-samenvatting als de inhoud echt verandert.
+
+- Draait als agenda-item van het soort competitor_monitor (id competitor-monitor) via dezelfde scheduler,
+  worker-pool en leases als andere taken. Het item wordt aangemaakt zodra een concurrent pagina's heeft, met
+  COMPETITOR_MONITOR_CRON (default elke 6 uur; leeg of off = niet aanmaken). Schema en prioriteit zijn daarna in de
+  agenda aan te passen; de run-historie bevat per controle het rapport.
+- Conditionele fetch met de headers van scrape_website plus If-None-Match/If-Modified-Since: een ongewijzigde
+  pagina kost een 304 zonder body.
+- Bij een 200 wordt de pagina markdown (ingest.html_to_markdown) en vergeleken op een hash van de genormaliseerde
+  tekst (witruimte, hoofdletters, kloktijden en datums tellen niet mee). Verschilt die, dan volgt een structurele
+  diff per regel/blok en per kop. Minder dan COMPETITOR_MONITOR_MIN_CHANGE_CHARS (default 80) gewijzigde tekens en
+  geen gewijzigde koppen telt niet als inhoudelijke wijziging: de snapshot blijft dan staan, zodat kleine
+  wijzigingen optellen tot ze de drempel wel halen.
+- Alleen bij een inhoudelijke wijziging volgt één LLM-aanroep; diff en samenvatting komen in competitor_page_changes
+  (laatste _KEEP_CHANGES per pagina).
+- Een pagina is per concurrent en URL (competitor_id, url): twee concurrenten die dezelfde URL volgen hebben elk
+  hun eigen snapshot en wijzigingen. Een pagina die niet meer gevolgd wordt, verdwijnt samen met haar wijzigingen.
+
+Env: COMPETITOR_MONITOR_CRON, COMPETITOR_MONITOR_MIN_CHANGE_CHARS, COMPETITOR_MONITOR_CONCURRENCY (default 4).
+"""
+
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+
+import requests
+from crewai import Agent
+
+import db
+from agenda import AgendaItem, add_item, get_item
+from competitors import Competitor, list_competitors
+from ingest import html_to_markdown
+from sonja import check_stop
+from tools.scrape_website import scrape_website_tool
+
+KIND = "competitor_monitor"
+ITEM_ID = "competitor-monitor"
+
+_FETCH_TIMEOUT = 15
+_SNAPSHOT_MAX_CHARS = 30000
+_DIFF_MAX_LINES = 40  # per kant (toegevoegd/verwijderd) in opslag en prompt
+_KEEP_CHANGES = 20
+# Wisselt per bezoek zonder dat de inhoud verandert; prijzen (12,50 / 12.50) blijven wel meetellen
+_VOLATILE = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b|\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b|\b\d{4}-\d{2}-\d{2}\b|©\s*\d{4}")
+
+_lock = threading.Lock()
+_summarizer: Agent | None = None
+
+
+def _cron() -> str | None:
+    cron = os.getenv("COMPETITOR_MONITOR_CRON", "0 */6 * * *").strip()
+    return None if cron.lower() in ("", "off", "false", "0") else cron
+
+
+def _min_change_chars() -> int:
+    try:
+        return max(0, int(os.getenv("COMPETITOR_MONITOR_MIN_CHANGE_CHARS", "80")))
+    except ValueError:
+        return 80
+
+
+def _concurrency() -> int:
+    try:
+        return max(1, int(os.getenv("COMPETITOR_MONITOR_CONCURRENCY", "4")))
+    except ValueError:
+        return 4
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+# ─── Snapshot en diff ─────────────────────────────────────────────────────────
+
+
+def compact_snapshot(html: str) -> str:
+    """Pagina → compacte markdown: één blok per regel, lege regels weg, begrensd op _SNAPSHOT_MAX_CHARS."""
+    lines = [line.strip() for line in html_to_markdown(html).splitlines()]
+    return "\n".join(line for line in lines if line)[:_SNAPSHOT_MAX_CHARS]
+
+
+def _normalise(line: str) -> str:
+    return " ".join(_VOLATILE.sub("", line.lower()).split())
+
+
+def content_hash(snapshot: str) -> str:
+    normalised = (_normalise(line) for line in snapshot.splitlines())
+    return hashlib.sha256("\n".join(n for n in normalised if n).encode("utf-8")).hexdigest()
+
+
+def structural_diff(old: str, new: str) -> dict:
+    """Diff per regel (blok) op genormaliseerde tekst; changed_chars telt per gewijzigd blok alleen de tekens die
+    echt verschillen, zodat één aangepast woord in een lange alinea klein blijft."""
+    old_lines = [line for line in old.splitlines() if _normalise(line)]
+    new_lines = [line for line in new.splitlines() if _normalise(line)]
+    a, b = [_normalise(line) for line in old_lines], [_normalise(line) for line in new_lines]
+    added: list[str] = []
+    removed: list[str] = []
+    changed_chars = 0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        removed.extend(old_lines[i1:i2])
+        added.extend(new_lines[j1:j2])
+        before, after = "\n".join(a[i1:i2]), "\n".join(b[j1:j2])
+        matched = sum(m.size for m in difflib.SequenceMatcher(None, before, after, autojunk=False).get_matching_blocks())
+        changed_chars += len(before) + len(after) - 2 * matched
+    old_headings = {_normalise(line) for line in old_lines if line.startswith("#")}
+    new_headings = {_normalise(line) for line in new_lines if line.startswith("#")}
+    return {
+        "added": added[:_DIFF_MAX_LINES],
+        "removed": removed[:_DIFF_MAX_LINES],
+        "headings_added": [line for line in new_lines if line.startswith("#") and _normalise(line) not in old_headings],
+        "headings_removed": [line for line in old_lines if line.startswith("#") and _normalise(line) not in new_headings],
+        "changed_chars": changed_chars,
+        "truncated": len(added) > _DIFF_MAX_LINES or len(removed) > _DIFF_MAX_LINES,
+    }
+
+
+def is_meaningful(diff: dict) -> bool:
+    return diff["changed_chars"] >= _min_change_chars() or bool(diff["headings_added"] or diff["headings_removed"])
+
+
+# ─── Ophalen en samenvatten ─────────────────────────────────────────────────────
+
+
+def _fetch(url: str, etag: str | None, last_modified: str | None) -> tuple[int, str | None, str | None, str | None]:
+    """Conditionele GET met de headers van scrape_website → (status, html of None bij 304, etag, last_modified)."""
+    headers = dict(scrape_website_tool.headers or {})
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    resp = requests.get(url, headers=headers, timeout=_FETCH_TIMEOUT)
+    if resp.status_code == 304:
+        return 304, None, resp.headers.get("ETag") or etag, resp.headers.get("Last-Modified") or last_modified
+    resp.raise_for_status()
+    if not resp.encoding or resp.encoding.lower() == "iso-8859-1":  # requests-default zonder charset in de header
+        resp.encoding = resp.apparent_encoding
+    return resp.status_code, resp.text, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+
+
+def _get_summarizer() -> Agent:
+    global _summarizer
+    with _lock:
+        if _summarizer is None:
+            _summarizer = Agent(
+                role="Website Change Analyst",
+                goal="Vat wijzigingen op de website van een concurrent kort samen in het Nederlands.",
+                backstory=(
+                    "Je ondersteunt Sonja, de AI Marketing Coordinator van AFAS. Je krijgt de tekst die op een pagina "
+                    "van een concurrent is toegevoegd en verwijderd en beschrijft wat er inhoudelijk veranderd is "
+                    "(prijzen, pakketten, features, positionering) en wat dat kan betekenen voor AFAS-marketing. "
+                    "Je verzint niets dat niet in de wijziging staat."
+                ),
+                tools=[],
+                verbose=False,
+                allow_delegation=False,
+            )
+        return _summarizer
+
+
+def _summarize(competitor: Competitor, url: str, diff: dict) -> str:
+    parts = [f"Concurrent: {competitor.name}\nPagina: {url}"]
+    if diff["headings_added"] or diff["headings_removed"]:
+        parts.append(
+            "Koppen toegevoegd: " + ("; ".join(diff["headings_added"]) or "-")
+            + "\nKoppen verwijderd: " + ("; ".join(diff["headings_removed"]) or "-")
+        )
+    parts.append("Verwijderde tekst:\n" + ("\n".join(f"- {line}" for line in diff["removed"]) or "- (niets)"))
+    parts.append("Toegevoegde tekst:\n" + ("\n".join(f"- {line}" for line in diff["added"]) or "- (niets)"))
+    if diff["truncated"]:
+        parts.append("(De wijziging is groter; alleen het begin staat hierboven.)")
+    parts.append("Beschrijf in een paar zinnen wat er inhoudelijk is veranderd en waarom dat relevant kan zijn.")
+    result = _get_summarizer().kickoff("\n\n".join(parts))
+    return result.raw if hasattr(result, "raw") else str(result)
+
+
+# ─── Opslag ────────────────────────────────────────────────────────────────────
+
+
+def _store_page(conn: sqlite3.Connection, url: str, competitor_id: str, **fields) -> None:
+    row = conn.execute(
+        "SELECT * FROM competitor_pages WHERE competitor_id = ? AND url = ?", (competitor_id, url)
+    ).fetchone()
+    data = dict(row) if row else {"url": url}
+    data.update(fields, competitor_id=competitor_id)
+    columns = ("url", "competitor_id", "etag", "last_modified", "content_hash", "snapshot", "checked_at", "changed_at",
+               "status", "error")
+    conn.execute(
+        f"INSERT OR REPLACE INTO competitor_pages ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+        tuple(data.get(c) for c in columns),
+    )
+
+
+def _record_change(conn: sqlite3.Connection, url: str, competitor_id: str, detected_at: str, diff: dict,
+                   summary: str) -> None:
+    conn.execute(
+        "INSERT INTO competitor_page_changes (id, url, competitor_id, detected_at, diff, summary) VALUES (?, ?, ?, ?, ?, ?)",
+        (str(uuid.uuid4()), url, competitor_id, detected_at, json.dumps(diff, ensure_ascii=False), summary),
+    )
+    conn.execute(
+        "DELETE FROM competitor_page_changes WHERE competitor_id = ? AND url = ? AND id NOT IN "
+        "(SELECT id FROM competitor_page_changes WHERE competitor_id = ? AND url = ? ORDER BY detected_at DESC LIMIT ?)",
+        (competitor_id, url, competitor_id, url, _KEEP_CHANGES),
+    )
+
+
+def check_page(competitor: Competitor, url: str) -> dict:
+    """Controleer één pagina. Retourneert {url, status, changed_chars, summary, error}; status is new, not_modified
+    (304), unchanged (zelfde hash), minor (onder de drempel), changed of error."""
+    row = db.connect().execute(
+        "SELECT * FROM competitor_pages WHERE competitor_id = ? AND url = ?", (competitor.id, url)
+    ).fetchone()
+    has_snapshot = bool(row and row["snapshot"])
+    now = _now()
+    result = {"url": url, "status": "error", "changed_chars": 0, "summary": None, "error": None}
+    try:
+        code, html, etag, last_modified = _fetch(
+            url, row["etag"] if has_snapshot else None, row["last_modified"] if has_snapshot else None
+        )
+        if code == 304:
+            result["status"] = "not_modified"
+        else:
+            snapshot = compact_snapshot(html or "")
+            digest = content_hash(snapshot)
+            if not has_snapshot:
+                result["status"] = "new"
+            elif digest == row["content_hash"]:
+                result["status"] = "unchanged"
+            else:
+                diff = structural_diff(row["snapshot"], snapshot)
+                result["changed_chars"] = diff["changed_chars"]
+                if is_meaningful(diff):
+                    result["summary"] = _summarize(competitor, url, diff)
+                    result["status"] = "changed"
+                else:
+                    result["status"] = "minor"
+    except Exception as e:
+        result["error"] = str(e)
+    with db.transaction() as conn:
+        status = result["status"]
+        if status == "error":
+            # Validators en snapshot niet bijwerken: de volgende controle haalt de pagina opnieuw op
+            _store_page(conn, url, competitor.id, checked_at=now, status=status, error=result["error"])
+        elif status in ("not_modified", "unchanged", "minor"):
+            # Bij minor blijft de oude snapshot de basis, zodat kleine wijzigingen optellen
+            _store_page(conn, url, competitor.id, etag=etag, last_modified=last_modified, checked_at=now,
+                        status=status, error=None)
+        else:
+            _store_page(conn, url, competitor.id, etag=etag, last_modified=last_modified, content_hash=digest,
+                        snapshot=snapshot, checked_at=now, changed_at=now if status == "changed" else None,
+                        status=status, error=None)
+            if status == "changed":
+                _record_change(conn, url, competitor.id, now, diff, result["summary"])
+    return result
+
+
+def list_pages(competitor_id: str) -> list[dict]:
+    """Gevolgde pagina's van een concurrent met de status van de laatste controle (zonder snapshot)."""
+    rows = db.connect().execute(
+        "SELECT url, status, checked_at, changed_at, error FROM competitor_pages WHERE competitor_id = ? ORDER BY url",
+        (competitor_id,),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def list_changes(competitor_id: str, limit: int = 20) -> list[dict]:
+    """Inhoudelijke wijzigingen van een concurrent, nieuwste eerst."""
+    rows = db.connect().execute(
+        "SELECT id, url, detected_at, diff, summary FROM competitor_page_changes WHERE competitor_id = ? "
+        "ORDER BY detected_at DESC LIMIT ?",
+        (competitor_id, limit),
+    ).fetchall()
+    return [{**dict(r), "diff": json.loads(r["diff"])} for r in rows]
+
+
+# ─── Run (agenda) ──────────────────────────────────────────────────────────────
+
+_STATUS_LABELS = {
+    "new": "eerste snapshot opgeslagen",
+    "not_modified": "ongewijzigd (304)",
+    "unchanged": "ongewijzigd",
+    "minor": "kleine wijziging, genegeerd",
+    "changed": "inhoudelijk gewijzigd",
+    "error": "ophalen mislukt",
+}
+
+
+async def run_monitor(steps_list: list[dict], stop: threading.Event | None = None) -> str:
+    """Alle gevolgde pagina's controleren (max COMPETITOR_MONITOR_CONCURRENCY tegelijk); retourneert het rapport.
+    stop: na het stopsignaal worden geen nieuwe pagina's meer gecontroleerd; lopende controles ronden af en daarna
+    volgt RunCancelled."""
+    pages = [(c, url) for c in list_competitors() for url in c.urls]
+    with db.transaction() as conn:  # pagina's die niet meer gevolgd worden vergeten, met hun wijzigingen
+        followed = {(c.id, url) for c, url in pages}
+        for r in conn.execute("SELECT competitor_id, url FROM competitor_pages").fetchall():
+            if (r["competitor_id"], r["url"]) not in followed:
+                key = (r["competitor_id"], r["url"])
+                conn.execute("DELETE FROM competitor_pages WHERE competitor_id = ? AND url = ?", key)
+                conn.execute("DELETE FROM competitor_page_changes WHERE competitor_id = ? AND url = ?", key)
+    if not pages:
+        return "Geen gevolgde pagina's: voeg URLs toe aan een concurrent."
+    semaphore = asyncio.Semaphore(_concurrency())
+
+    async def _check(competitor: Competitor, url: str) -> dict | None:
+        async with semaphore:
+            if stop is not None and stop.is_set():
+                return None
+            result = await asyncio.to_thread(check_page, competitor, url)
+        label = _STATUS_LABELS[result["status"]]
+        if result["status"] == "minor":
+            label += f" ({result['changed_chars']} tekens)"
+        elif result["error"]:
+            label += f": {result['error']}"
+        steps_list.append({
+            "tool": "competitor_monitor",
+            "summary": f"url={url}, status={result['status']}",
+            "display_label": f"{competitor.name} – {url}: {label}.",
+        })
+        return result
+
+    results = await asyncio.gather(*(_check(c, url) for c, url in pages))
+    if any(r is None for r in results):
+        check_stop(stop)
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in _STATUS_LABELS}
+    lines = [
+        f"{len(results)} pagina's gecontroleerd: {counts['changed']} inhoudelijk gewijzigd, "
+        f"{counts['not_modified'] + counts['unchanged']} ongewijzigd ({counts['not_modified']} zonder download), "
+        f"{counts['minor']} kleine wijziging(en) genegeerd, {counts['new']} nieuw, {counts['error']} mislukt."
+    ]
+    for (competitor, url), r in zip(pages, results):
+        if r["status"] == "changed":
+            lines.append(f"### {competitor.name} – {url}\n\n{r['summary'].strip()}")
+    return "\n\n".join(lines)
+
+
+def ensure_agenda_item() -> None:
+    """Maak het monitoring-item aan als er gevolgde pagina's zijn en het nog niet bestaat (vaste id, dus één item,
+    ook met meerdere processen)."""
+    cron = _cron()
+    if not cron or get_item(ITEM_ID) is not None or not any(c.urls for c in list_competitors()):
+        return
+    try:
+        add_item(AgendaItem(
+            id=ITEM_ID,
+            title="Concurrentenwebsites controleren",
+            prompt="Controleer de gevolgde pagina's van concurrenten op inhoudelijke wijzigingen.",
+            type="recurring",
+            schedule=cron,
+            kind=KIND,
+        ))
+        print(f"[Concurrenten] Website-monitoring ingepland ({cron})")
+    except sqlite3.IntegrityError:
+        pass  # tegelijk door een ander proces aangemaakt
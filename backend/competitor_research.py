@@ -0,0 +1,121 @@
+"""
+Pipeline voor /analyze/competitors/stream: concurrenten parallel onderzoeken, daarna één synthese.
+
+1. Fan-out: per concurrent het opgeslagen of bijgewerkte onderzoek (research_competitor_cached: uit de opslag,
+   alleen nieuw nieuws, of volledig), max COMPETITOR_RESEARCH_CONCURRENCY tegelijk in threads. Elke afgeronde
+   concurrent verschijnt direct als denkstap. De doorlooptijd is daarmee ongeveer die van de traagste concurrent
+   in plaats van de som.
+2. Merge: bevindingen in de volgorde van het verzoek (niet van afronden), zodat dezelfde uitkomsten altijd
+   dezelfde synthese-prompt geven. Een mislukt onderzoek blijft als melding in het overzicht staan.
+3. Synthese: één Sonja-run over de gecombineerde bevindingen, zonder spy_competitor_research opnieuw aan te roepen.
+   Zijn alle bevindingen en de prompt gelijk aan een eerdere analyse, dan komt de synthese uit result_cache.
+
+Env: COMPETITOR_RESEARCH_CONCURRENCY (default 4).
+"""
+
+import asyncio
+import os
+import time
+
+import result_cache
+from sonja import create_sonja_ephemeral
+from tools.spy_competitor_research import research_competitor_cached
+
+_SYNTHESIS_VERSION = 1
+
+
+def _concurrency() -> int:
+    try:
+        return max(1, int(os.getenv("COMPETITOR_RESEARCH_CONCURRENCY", "4")))
+    except ValueError:
+        return 4
+
+
+def merge_findings(names: list[str], findings: dict[str, str], errors: dict[str, str]) -> str:
+    """Bevindingen per concurrent in de volgorde van names samenvoegen."""
+    blocks = []
+    for name in names:
+        if name in findings:
+            blocks.append(f"### {name}\n{findings[name].strip()}")
+        else:
+            blocks.append(f"### {name}\n(Onderzoek mislukt: {errors.get(name, 'onbekende fout')})")
+    return "\n\n".join(blocks)
+
+
+def _synthesis_prompt(names: list[str], merged: str, custom_prompt: str | None) -> str:
+    instruction = (custom_prompt or "").strip() or (
+        "Geef per concurrent een samenvatting (recente ontwikkelingen, sterke punten, marktpositie) "
+        "en sluit af met concrete actiepunten voor AFAS marketing op basis van de gecombineerde analyse."
+    )
+    return (
+        f"Hieronder staan de onderzoeksresultaten van spy_competitor_research voor: {', '.join(names)}. "
+        "Het onderzoek is al gedaan; roep spy_competitor_research niet opnieuw aan en gebruik de bronnen hieronder.\n\n"
+        f"{instruction}\n\n"
+        f"Onderzoeksresultaten:\n\n{merged}"
+    )
+
+
+def _research_label(name: str, mode: str, new: int, checked_at: str) -> str:
+    if mode == "cached":
+        return f"{name}: bekende bevindingen (gecontroleerd {checked_at[:16].replace('T', ' ')} UTC)"
+    if mode == "unchanged":
+        return f"{name}: geen nieuw nieuws sinds de vorige keer"
+    if mode == "delta":
+        return f"{name}: {new} nieuw{'e' if new != 1 else ''} bericht{'en' if new != 1 else ''} verwerkt"
+    return f"{name} onderzocht"
+
+
+async def run_competitor_pipeline(
+    names: list[str], custom_prompt: str | None, steps_list: list[dict], bypass_cache: bool = False
+) -> str:
+    """Fan-out over de concurrenten, deterministische merge, één synthese; stappen komen in steps_list.
+    bypass_cache: alle concurrenten volledig opnieuw onderzoeken en de synthese opnieuw laten schrijven."""
+    names = list(dict.fromkeys(names))  # dubbele namen één keer onderzoeken
+    total = len(names)
+    concurrency = _concurrency()
+    steps_list.append({
+        "tool": "competitor_pipeline",
+        "summary": f"concurrenten={total}, parallel={concurrency}",
+        "display_label": f"{total} concurrenten onderzoeken, max {concurrency} tegelijk.",
+    })
+    semaphore = asyncio.Semaphore(concurrency)
+    findings: dict[str, str] = {}
+    errors: dict[str, str] = {}
+
+    async def _research(name: str) -> None:
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                research, mode, new = await asyncio.to_thread(research_competitor_cached, name, bypass_cache)
+                findings[name] = research.summary
+                label = _research_label(name, mode, new, research.checked_at)
+            except Exception as e:
+                errors[name] = str(e)
+                label = f"{name}: onderzoek mislukt ({e})"
+            done = len(findings) + len(errors)
+            steps_list.append({
+                "tool": "spy_competitor_research",
+                "summary": f"competitor_name={name}",
+                "display_label": f"{label} ({done}/{total}, {time.monotonic() - started:.0f}s).",
+            })
+
+    await asyncio.gather(*(_research(name) for name in names))
+    steps_list.append({
+        "tool": "competitor_merge",
+        "summary": f"gelukt={len(findings)}, mislukt={len(errors)}",
+        "display_label": f"Bevindingen van {len(findings)}/{total} concurrenten samengevoegd.",
+    })
+    prompt = _synthesis_prompt(names, merge_findings(names, findings, errors), custom_prompt)
+    key = result_cache.cache_key("competitors/synthesis", _SYNTHESIS_VERSION, {"prompt": prompt})
+    hit = None if bypass_cache or errors else result_cache.get(key)
+    if hit is not None:
+        steps_list.append({
+            "tool": "competitor_synthesis",
+            "summary": "cache",
+            "display_label": "Geen nieuwe bevindingen: eerdere analyse hergebruikt.",
+        })
+        return hit["response"]
+    response = await create_sonja_ephemeral().chat_async_with_list(prompt, "", steps_list)
+    if not errors:
+        result_cache.put(key, [], response)
+    return response
@@ -1,77 +1,136 @@
 """
 Lijst van concurrenten voor het tabblad Concurrenten.
-Opslag in JSON (backend/data/competitors.json); frontend kan GET/POST/DELETE/PATCH gebruiken.
+Opslag in SQLite (data/sonja.db, tabel competitors; zie db.py); frontend kan GET/POST/DELETE/PATCH gebruiken.
+
+Per concurrent (op genormaliseerde naam) het laatste onderzoek in competitor_research: samenvatting, bronnen en
+tijdstempels (UTC), zodat een volgende analyse alleen nieuw nieuws hoeft op te halen (zie spy_competitor_research).
 """
 
 import json
 import uuid
-from pathlib import Path
 
 from pydantic import BaseModel, Field
 
-_DATA_DIR = Path(__file__).resolve().parent / "data"
-_COMPETITORS_FILE = _DATA_DIR / "competitors.json"
+import db
 
 
 class Competitor(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str = Field(description="Naam van de concurrent (bijv. Exact, Visma)")
+    urls: list[str] = Field(default_factory=list, description="Gevolgde pagina's (bijv. prijzen), zie competitor_monitor.py")
+
+
+class CompetitorResearch(BaseModel):
+    name: str
+    summary: str
+    sources: list[dict] = Field(default_factory=list, description="[{title, link, date, seen_at}], nieuwste eerst")
+    researched_at: str = Field(description="Laatste volledige onderzoek (UTC)")
+    checked_at: str = Field(description="Laatste controle op nieuw nieuws (UTC)")
+    updated_at: str = Field(description="Laatste wijziging van de samenvatting (UTC)")
+
+
+def research_key(name: str) -> str:
+    return " ".join((name or "").lower().split())
+
+
+def _research_from_row(row) -> CompetitorResearch:
+    return CompetitorResearch(
+        name=row["name"],
+        summary=row["summary"],
+        sources=json.loads(row["sources"] or "[]"),
+        researched_at=row["researched_at"],
+        checked_at=row["checked_at"],
+        updated_at=row["updated_at"],
+    )
 
 
-def _load() -> list[dict]:
-    _DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if not _COMPETITORS_FILE.exists():
+def get_research(name: str) -> CompetitorResearch | None:
+    row = db.connect().execute("SELECT * FROM competitor_research WHERE name_key = ?", (research_key(name),)).fetchone()
+    return _research_from_row(row) if row else None
+
+
+def list_research(names: list[str]) -> list[CompetitorResearch]:
+    """Opgeslagen onderzoek voor deze namen (namen zonder onderzoek ontbreken)."""
+    keys = list(dict.fromkeys(research_key(n) for n in names if research_key(n)))
+    if not keys:
         return []
-    raw = _COMPETITORS_FILE.read_text(encoding="utf-8")
-    return json.loads(raw) if raw.strip() else []
+    rows = db.connect().execute(
+        f"SELECT * FROM competitor_research WHERE name_key IN ({', '.join('?' for _ in keys)})", keys
+    ).fetchall()
+    by_key = {r["name_key"]: r for r in rows}
+    return [_research_from_row(by_key[k]) for k in keys if k in by_key]
+
+
+def save_research(research: CompetitorResearch) -> None:
+    with db.transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO competitor_research "
+            "(name_key, name, summary, sources, researched_at, checked_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                research_key(research.name), research.name, research.summary,
+                json.dumps(research.sources, ensure_ascii=False),
+                research.researched_at, research.checked_at, research.updated_at,
+            ),
+        )
+
+
+def _from_row(row) -> Competitor:
+    return Competitor(id=row["id"], name=row["name"], urls=json.loads(row["urls"] or "[]"))
 
 
-def _save(items: list[dict]) -> None:
-    _DATA_DIR.mkdir(parents=True, exist_ok=True)
-    _COMPETITORS_FILE.write_text(json.dumps(items, indent=2, ensure_ascii=False), encoding="utf-8")
+def _clean_urls(urls: list[str]) -> list[str]:
+    cleaned = [u.strip() for u in urls or [] if u and u.strip()]
+    for u in cleaned:
+        if not u.startswith(("http://", "https://")):
+            raise ValueError(f"Ongeldige URL (http(s):// verwacht): {u}")
+    return list(dict.fromkeys(cleaned))
 
 
 def list_competitors() -> list[Competitor]:
     """Alle concurrenten."""
-    data = _load()
-    return [Competitor.model_validate(d) for d in data]
+    rows = db.connect().execute("SELECT id, name, urls FROM competitors ORDER BY seq").fetchall()
+    return [_from_row(r) for r in rows]
 
 
 def get_competitor(competitor_id: str) -> Competitor | None:
-    data = _load()
-    for d in data:
-        if d.get("id") == competitor_id:
-            return Competitor.model_validate(d)
-    return None
+    row = db.connect().execute("SELECT id, name, urls FROM competitors WHERE id = ?", (competitor_id,)).fetchone()
+    return _from_row(row) if row else None
 
 
-def add_competitor(name: str) -> Competitor:
+def add_competitor(name: str, urls: list[str] | None = None) -> Competitor:
     name = (name or "").strip()
     if not name:
         raise ValueError("Naam is verplicht.")
-    data = _load()
-    item = Competitor(name=name)
-    data.append(item.model_dump())
-    _save(data)
+    item = Competitor(name=name, urls=_clean_urls(urls or []))
+    with db.transaction() as conn:
+        conn.execute(
+            "INSERT INTO competitors (id, name, urls) VALUES (?, ?, ?)", (item.id, item.name, json.dumps(item.urls))
+        )
     return item
 
 
-def update_competitor(competitor_id: str, name: str | None = None) -> Competitor | None:
-    data = _load()
-    for i, d in enumerate(data):
-        if d.get("id") == competitor_id:
-            if name is not None:
-                data[i]["name"] = name.strip()
-            _save(data)
-            return Competitor.model_validate(data[i])
-    return None
+def update_competitor(competitor_id: str, name: str | None = None, urls: list[str] | None = None) -> Competitor | None:
+    urls = _clean_urls(urls) if urls is not None else None
+    with db.transaction() as conn:
+        if name is not None:
+            conn.execute("UPDATE competitors SET name = ? WHERE id = ?", (name.strip(), competitor_id))
+        if urls is not None:
+            conn.execute("UPDATE competitors SET urls = ? WHERE id = ?", (json.dumps(urls), competitor_id))
+        row = conn.execute("SELECT id, name, urls FROM competitors WHERE id = ?", (competitor_id,)).fetchone()
+    return _from_row(row) if row else None
 
 
 def delete_competitor(competitor_id: str) -> bool:
-    data = _load()
-    for i, d in enumerate(data):
-        if d.get("id") == competitor_id:
-            data.pop(i)
-            _save(data)
-            return True
-    return False
+    """Verwijdert de concurrent, de snapshots van zijn pagina's en zijn opgeslagen onderzoek (als geen andere
+    concurrent dezelfde naam heeft)."""
+    with db.transaction() as conn:
+        row = conn.execute("SELECT name FROM competitors WHERE id = ?", (competitor_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute("DELETE FROM competitors WHERE id = ?", (competitor_id,))
+        conn.execute("DELETE FROM competitor_pages WHERE competitor_id = ?", (competitor_id,))
+        conn.execute("DELETE FROM competitor_page_changes WHERE competitor_id = ?", (competitor_id,))
+        key = research_key(row["name"])
+        if not any(research_key(r["name"]) == key for r in conn.execute("SELECT name FROM competitors")):
+            conn.execute("DELETE FROM competitor_research WHERE name_key = ?", (key,))
+        return True
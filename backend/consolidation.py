@@ -0,0 +1,245 @@
+"""
+Consolidatie van herinneringen: kleine, overlappende notities in memory/ samenvoegen tot één dense herinnering.
+
+1. Clusteren: herinneringen (ouder dan _MIN_AGE_DAYS) op embedding-similarity (vectoren uit de RAG-index)
+   én datum: een herinnering komt bij een cluster als de cosine-similarity met het clustergemiddelde
+   >= MEMORY_CONSOLIDATE_SIMILARITY is en de datum binnen MEMORY_CONSOLIDATE_WINDOW_DAYS van de oudste ligt.
+2. Samenvoegen: per cluster (>= 2 herinneringen) één LLM-pass zonder tools die één titel + inhoud teruggeeft.
+3. Bijwerken: de nieuwe herinnering wordt weggeschreven (datum van de nieuwste in het cluster) en geïndexeerd;
+   de originelen gaan naar memory/.archive/ (niet verwijderd) en worden uit de index gehaald.
+
+Draait periodiek vanuit main.py (MEMORY_CONSOLIDATE_INTERVAL_HOURS, 0 = uit) en handmatig via POST /memory/consolidate.
+"""
+
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from crewai import Agent
+
+from tools.rag_tool import rag_add_file, rag_memory_vectors, rag_remove_file
+from tools.write_to_memory import write_memory_file
+
+_MEMORY_DIR = Path(__file__).resolve().parent / "memory"
+_ARCHIVE_DIR = _MEMORY_DIR / ".archive"  # map met punt: wordt niet geïndexeerd en niet getoond als herinnering
+
+_MIN_AGE_DAYS = 2  # verse herinneringen niet samenvoegen (kunnen nog in een lopend gesprek gebruikt worden)
+_MAX_CLUSTER_SIZE = 8  # begrenst de LLM-invoer per samenvoeging
+_MAX_CHARS_PER_MEMORY = 6000
+
+_run_lock = threading.Lock()
+_last_result: dict | None = None
+
+
+def _similarity_threshold() -> float:
+    try:
+        return min(1.0, max(0.5, float(os.getenv("MEMORY_CONSOLIDATE_SIMILARITY", "0.85"))))
+    except ValueError:
+        return 0.85
+
+
+def _window_days() -> int:
+    try:
+        return max(1, int(os.getenv("MEMORY_CONSOLIDATE_WINDOW_DAYS", "14")))
+    except ValueError:
+        return 14
+
+
+def interval_hours() -> float:
+    """Interval van de geplande consolidatie in uren; 0 = uit."""
+    try:
+        return max(0.0, float(os.getenv("MEMORY_CONSOLIDATE_INTERVAL_HOURS", "24")))
+    except ValueError:
+        return 24.0
+
+
+def _memory_datetime(filename: str) -> datetime | None:
+    """Datum en tijd uit DD-MM-YYYY_HH-MM_slug.md; None als de naam dat formaat niet heeft."""
+    m = re.match(r"(\d{2})-(\d{2})-(\d{4})_(\d{2})-(\d{2})_", filename)
+    if not m:
+        return None
+    d, mo, y, h, mi = (int(x) for x in m.groups())
+    try:
+        return datetime(y, mo, d, h, mi)
+    except ValueError:
+        return None
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def cluster_memories(memories: list[dict], threshold: float, window_days: int) -> list[list[dict]]:
+    """memories: [{filename, date, vector}], gesorteerd op datum. Greedy clustering op het clustergemiddelde
+    (centroid) binnen een datumvenster. Retourneert alleen clusters met minstens twee herinneringen."""
+    clusters: list[dict] = []
+    window = timedelta(days=window_days)
+    for mem in memories:
+        best, best_sim = None, threshold
+        for c in clusters:
+            if len(c["members"]) >= _MAX_CLUSTER_SIZE or mem["date"] - c["start"] > window:
+                continue
+            sim = _cosine(mem["vector"], c["centroid"])
+            if sim >= best_sim:
+                best, best_sim = c, sim
+        if best is None:
+            clusters.append({"start": mem["date"], "centroid": list(mem["vector"]), "members": [mem]})
+            continue
+        n = len(best["members"])
+        best["centroid"] = [(c * n + v) / (n + 1) for c, v in zip(best["centroid"], mem["vector"])]
+        best["members"].append(mem)
+    return [c["members"] for c in clusters if len(c["members"]) >= 2]
+
+
+def _build_merger() -> Agent:
+    return Agent(
+        role="Archivaris",
+        goal="Voeg overlappende herinneringen samen tot één dense herinnering zonder informatie te verliezen.",
+        backstory=(
+            "Je beheert het geheugen van Sonja, de digitale marketeer van AFAS. Je krijgt een paar herinneringen over "
+            "hetzelfde onderwerp en maakt er één heldere, compacte herinnering van. Je verzint niets, behoudt concrete "
+            "feiten, namen, cijfers en datums, en schrijft in het Nederlands."
+        ),
+        tools=[],
+        verbose=False,
+        allow_delegation=False,
+    )
+
+
+def _merge_prompt(members: list[dict]) -> str:
+    parts = []
+    for m in members:
+        parts.append(f"--- {m['filename']} ---\n{m['content'][:_MAX_CHARS_PER_MEMORY].strip()}")
+    return (
+        f"Hieronder staan {len(members)} herinneringen die over hetzelfde onderwerp gaan. "
+        "Voeg ze samen tot één herinnering: dubbele punten één keer, tegenstrijdige punten met de nieuwste als leidend "
+        "(noem de datum als dat relevant is).\n"
+        "Antwoord uitsluitend met JSON in dit formaat, zonder uitleg:\n"
+        '{"titel": "korte semantische titel zonder datum", "inhoud": "de samengevoegde herinnering (markdown)"}\n\n'
+        + "\n\n".join(parts)
+    )
+
+
+def _parse_merge(raw: str) -> tuple[str, str] | None:
+    m = re.search(r"\{.*\}", raw or "", re.S)
+    if not m:
+        return None
+    try:
+        data = json.loads(m.group(0))
+    except json.JSONDecodeError:
+        return None
+    title = str(data.get("titel") or "").strip()
+    content = str(data.get("inhoud") or "").strip()
+    if not title or not content:
+        return None
+    return title, content
+
+
+def _archive(path: Path) -> Path:
+    """Verplaats een origineel naar memory/.archive/ (bij een naamconflict met een volgnummer)."""
+    _ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    target = _ARCHIVE_DIR / path.name
+    counter = 0
+    while target.exists():
+        counter += 1
+        target = _ARCHIVE_DIR / f"{path.stem}-{counter}{path.suffix}"
+    shutil.move(str(path), target)
+    return target
+
+
+def _load_candidates() -> list[dict]:
+    cutoff = datetime.now() - timedelta(days=_MIN_AGE_DAYS)
+    candidates = []
+    if not _MEMORY_DIR.is_dir():
+        return candidates
+    for path in _MEMORY_DIR.glob("*.md"):
+        dt = _memory_datetime(path.name)
+        if not path.is_file() or dt is None or dt > cutoff:
+            continue
+        candidates.append({"filename": path.name, "path": path, "date": dt})
+    return sorted(candidates, key=lambda m: (m["date"], m["filename"]))
+
+
+def _clusters() -> list[list[dict]]:
+    candidates = _load_candidates()
+    if len(candidates) < 2:
+        return []
+    vectors = rag_memory_vectors([m["path"] for m in candidates])
+    memories = [{**m, "vector": vectors[m["filename"]]} for m in candidates if m["filename"] in vectors]
+    return cluster_memories(memories, _similarity_threshold(), _window_days())
+
+
+def plan_consolidation() -> list[list[str]]:
+    """Alleen clusteren (geen LLM, niets gewijzigd): lijst van clusters met bestandsnamen."""
+    return [[m["filename"] for m in cluster] for cluster in _clusters()]
+
+
+def _merge_cluster(members: list[dict]) -> dict:
+    for m in members:
+        m["content"] = m["path"].read_text(encoding="utf-8", errors="replace")
+    result = _build_merger().kickoff(_merge_prompt(members))
+    parsed = _parse_merge(result.raw if hasattr(result, "raw") else str(result))
+    if parsed is None:
+        raise ValueError("Samenvoeging gaf geen geldige titel en inhoud terug.")
+    title, content = parsed
+    sources = ", ".join(m["filename"] for m in members)
+    new_path = write_memory_file(title, f"{content}\n\n_Samengevoegd uit: {sources}_", when=members[-1]["date"])
+    rag_add_file(new_path)
+    for m in members:
+        _archive(m["path"])
+        rag_remove_file(m["path"])
+    return {"filename": new_path.name, "merged": [m["filename"] for m in members]}
+
+
+def consolidate_memories() -> dict:
+    """Eén consolidatieronde. Retourneert {status, clusters, merged: [{filename, merged}], errors}.
+    Loopt er al een ronde, dan status 'busy'."""
+    global _last_result
+    if not _run_lock.acquire(blocking=False):
+        return {"status": "busy"}
+    started = datetime.now()
+    try:
+        print("[Geheugen] Consolidatie gestart")
+        try:
+            clusters = _clusters()
+        except Exception as e:
+            print(f"[Geheugen] Consolidatie overgeslagen: {e}")
+            _last_result = {"status": "error", "started_at": started.isoformat(), "error": str(e)}
+            return _last_result
+        merged, errors = [], []
+        for members in clusters:
+            try:
+                merged.append(_merge_cluster(members))
+                print(f"[Geheugen] {len(members)} herinneringen samengevoegd → {merged[-1]['filename']}")
+            except Exception as e:
+                errors.append({"files": [m["filename"] for m in members], "error": str(e)})
+                print(f"[Geheugen] Samenvoegen mislukt ({len(members)} herinneringen): {e}")
+        _last_result = {
+            "status": "done",
+            "started_at": started.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "clusters": len(clusters),
+            "merged": merged,
+            "errors": errors,
+        }
+        print(f"[Geheugen] Consolidatie klaar: {len(merged)} van {len(clusters)} clusters samengevoegd")
+        return _last_result
+    finally:
+        _run_lock.release()
+
+
+def last_result() -> dict | None:
+    """Resultaat van de laatste consolidatieronde (of None)."""
+    return _last_result
+
+
+def is_running() -> bool:
+    return _run_lock.locked()
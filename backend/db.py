@@ -0,0 +1,313 @@
+"""
+Gedeelde SQLite-opslag (backend/data/sonja.db) voor agenda, run-historie en leases van de agenda, concurrenten,
+hun laatste onderzoeksresultaten en snapshots/wijzigingen van hun gevolgde webpagina's.
+
+WAL-modus: lezers blokkeren schrijvers niet en meerdere threads/processen kunnen veilig tegelijk schrijven
+(busy_timeout in plaats van "database is locked"). Eén verbinding per thread; schrijfacties in een
+transactie met BEGIN IMMEDIATE, zodat lezen-aanpassen-schrijven van één rij atomair is.
+
+Bij de eerste start worden bestaande data/agenda.json en data/competitors.json eenmalig geïmporteerd;
+de JSON-bestanden blijven staan als *.json.migrated. Oude last_run_response/last_run_steps op agenda-items
+worden eenmalig naar agenda_runs verplaatst.
+"""
+
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from contextlib import contextmanager
+from pathlib import Path
+
+_DATA_DIR = Path(__file__).resolve().parent / "data"
+_DB_FILE = _DATA_DIR / "sonja.db"
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agenda_items (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_agenda_items_created ON agenda_items(created_at);
+CREATE TABLE IF NOT EXISTS agenda_runs (
+    id TEXT PRIMARY KEY,
+    item_id TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL,
+    duration_ms INTEGER,
+    tokens TEXT,
+    step_count INTEGER NOT NULL DEFAULT 0,
+    steps TEXT,
+    response TEXT,
+    error TEXT,
+    scheduled_for TEXT,
+    queue_wait_ms INTEGER,
+    attempt INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_agenda_runs_item ON agenda_runs(item_id, started_at DESC);
+CREATE TABLE IF NOT EXISTS agenda_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO agenda_version (id, version) VALUES (1, 0);
+CREATE TABLE IF NOT EXISTS agenda_leases (
+    item_id TEXT NOT NULL,
+    scheduled_for TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    state TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (item_id, scheduled_for)
+);
+CREATE INDEX IF NOT EXISTS idx_agenda_leases_state ON agenda_leases(state, expires_at);
+CREATE TABLE IF NOT EXISTS competitors (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS competitor_research (
+    name_key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    researched_at TEXT NOT NULL,
+    checked_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS competitor_pages (
+    url TEXT NOT NULL,
+    competitor_id TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    snapshot TEXT,
+    checked_at TEXT,
+    changed_at TEXT,
+    status TEXT,
+    error TEXT,
+    PRIMARY KEY (competitor_id, url)
+);
+CREATE TABLE IF NOT EXISTS competitor_page_changes (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    competitor_id TEXT NOT NULL,
+    detected_at TEXT NOT NULL,
+    diff TEXT NOT NULL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_competitor_page_changes ON competitor_page_changes(competitor_id, detected_at DESC);
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+
+def _open() -> sqlite3.Connection:
+    _DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(_DB_FILE, timeout=30, isolation_level=None)  # autocommit; transacties expliciet
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+# Kolommen die later aan bestaande tabellen zijn toegevoegd (CREATE TABLE IF NOT EXISTS voegt ze niet toe)
+_ADDED_COLUMNS = {
+    "agenda_runs": {"scheduled_for": "TEXT", "queue_wait_ms": "INTEGER", "attempt": "INTEGER NOT NULL DEFAULT 1"},
+    "competitors": {"urls": "TEXT"},
+}
+
+
+def _add_columns(conn: sqlite3.Connection) -> None:
+    for table, columns in _ADDED_COLUMNS.items():
+        existing = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+        for name, sql_type in columns.items():
+            if name not in existing:
+                try:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+                except sqlite3.OperationalError:
+                    pass  # tegelijk door een ander proces toegevoegd
+
+
+def _load_json_list(path: Path) -> list[dict]:
+    if not path.is_file():
+        return []
+    raw = path.read_text(encoding="utf-8")
+    data = json.loads(raw) if raw.strip() else []
+    return [d for d in data if isinstance(d, dict) and d.get("id")]
+
+
+def _import_agenda(conn: sqlite3.Connection, items: list[dict]) -> None:
+    for d in items:
+        d.pop("mail_to", None)
+        conn.execute(
+            "INSERT OR IGNORE INTO agenda_items (id, created_at, data) VALUES (?, ?, ?)",
+            (d["id"], d.get("created_at") or "", json.dumps(d, ensure_ascii=False)),
+        )
+
+
+def _import_competitors(conn: sqlite3.Connection, items: list[dict]) -> None:
+    for d in items:
+        if d.get("name"):
+            conn.execute("INSERT OR IGNORE INTO competitors (id, name) VALUES (?, ?)", (d["id"], d["name"]))
+
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    """Eenmalige import van de oude JSON-opslag. De check zit binnen de schrijftransactie, zodat bij meerdere
+    processen precies één de import doet."""
+    for name, filename, importer in (
+        ("agenda_json", "agenda.json", _import_agenda),
+        ("competitors_json", "competitors.json", _import_competitors),
+    ):
+        path = _DATA_DIR / filename
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (name,)).fetchone():
+                conn.execute("ROLLBACK")
+                continue
+            importer(conn, _load_json_list(path))
+            conn.execute("INSERT INTO migrations (name) VALUES (?)", (name,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if path.is_file():
+            path.rename(path.with_name(filename + ".migrated"))
+            print(f"[Opslag] data/{filename} geïmporteerd in data/sonja.db")
+
+
+def _utc_iso(value: str) -> str:
+    """ISO-tijd als UTC-ISO, zoals record_run ze in agenda_runs zet (naive = Amsterdam, Z = UTC); agenda_runs wordt
+    op tekst gesorteerd en opgeschoond, dus alle tijden daar moeten dezelfde offset hebben. Ongeldig: ongewijzigd."""
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=ZoneInfo("Europe/Amsterdam"))
+    return dt.astimezone(timezone.utc).isoformat()
+
+
+def _migrate_run_history(conn: sqlite3.Connection) -> None:
+    """Eenmalig: last_run_response/last_run_steps van bestaande items als run in agenda_runs; het item houdt
+    alleen de samenvatting."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM migrations WHERE name = 'agenda_run_history'").fetchone():
+            conn.execute("ROLLBACK")
+            return
+        moved = 0
+        for row in conn.execute("SELECT id, data FROM agenda_items").fetchall():
+            d = json.loads(row["data"])
+            response = d.pop("last_run_response", None)
+            steps = d.pop("last_run_steps", None) or []
+            if not d.get("last_run_at") or (response is None and not steps):
+                continue
+            run_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO agenda_runs (id, item_id, started_at, finished_at, status, step_count, steps, response) "
+                "VALUES (?, ?, ?, ?, 'done', ?, ?, ?)",
+                (run_id, row["id"], _utc_iso(d["last_run_at"]), _utc_iso(d["last_run_at"]), len(steps),
+                 json.dumps(steps, ensure_ascii=False), response or ""),
+            )
+            d.update(last_run_id=run_id, last_run_status="done", last_run_summary=(response or "")[:280] or None)
+            conn.execute("UPDATE agenda_items SET data = ? WHERE id = ?", (json.dumps(d, ensure_ascii=False), row["id"]))
+            moved += 1
+        conn.execute("INSERT INTO migrations (name) VALUES ('agenda_run_history')")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if moved:
+        print(f"[Opslag] Laatste run van {moved} agenda-item(s) verplaatst naar agenda_runs")
+
+
+def _migrate_competitor_pages_key(conn: sqlite3.Connection) -> None:
+    """Eenmalig: competitor_pages van sleutel url naar (competitor_id, url), zodat twee concurrenten dezelfde URL
+    kunnen volgen zonder elkaars snapshot te overschrijven. Bestaande rijen gaan mee."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        pk = {r["name"] for r in conn.execute("PRAGMA table_info(competitor_pages)") if r["pk"]}
+        if pk != {"url"}:
+            conn.execute("ROLLBACK")
+            return
+        conn.execute("ALTER TABLE competitor_pages RENAME TO competitor_pages_old")
+        conn.execute(
+            "CREATE TABLE competitor_pages (url TEXT NOT NULL, competitor_id TEXT NOT NULL, etag TEXT, "
+            "last_modified TEXT, content_hash TEXT, snapshot TEXT, checked_at TEXT, changed_at TEXT, status TEXT, "
+            "error TEXT, PRIMARY KEY (competitor_id, url))"
+        )
+        conn.execute(
+            "INSERT INTO competitor_pages (url, competitor_id, etag, last_modified, content_hash, snapshot, checked_at, "
+            "changed_at, status, error) SELECT url, competitor_id, etag, last_modified, content_hash, snapshot, "
+            "checked_at, changed_at, status, error FROM competitor_pages_old"
+        )
+        conn.execute("DROP TABLE competitor_pages_old")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _migrate_run_times_utc(conn: sqlite3.Connection) -> None:
+    """Eenmalig: runs die _migrate_run_history met de Amsterdam-offset van last_run_at heeft weggeschreven naar UTC."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM migrations WHERE name = 'agenda_run_times_utc'").fetchone():
+            conn.execute("ROLLBACK")
+            return
+        rows = conn.execute(
+            "SELECT id, started_at, finished_at FROM agenda_runs "
+            "WHERE started_at NOT LIKE '%+00:00' OR finished_at NOT LIKE '%+00:00'"
+        ).fetchall()
+        for row in rows:
+            conn.execute(
+                "UPDATE agenda_runs SET started_at = ?, finished_at = ? WHERE id = ?",
+                (_utc_iso(row["started_at"]), _utc_iso(row["finished_at"]) if row["finished_at"] else None, row["id"]),
+            )
+        conn.execute("INSERT INTO migrations (name) VALUES ('agenda_run_times_utc')")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def connect() -> sqlite3.Connection:
+    """Verbinding voor de huidige thread; schema en migratie worden één keer per proces uitgevoerd."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _open()
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(_SCHEMA)
+                _add_columns(conn)
+                _migrate_json(conn)
+                _migrate_run_history(conn)
+                _migrate_run_times_utc(conn)
+                _migrate_competitor_pages_key(conn)
+                _initialized = True
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Schrijftransactie (BEGIN IMMEDIATE): neemt direct de schrijflock, dus geen lost updates tussen threads/processen."""
+    conn = connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
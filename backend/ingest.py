@@ -0,0 +1,319 @@
+"""
+Ingestie van documenten (PDF, DOCX, HTML) naar knowledge/ als markdown.
+
+Tekstextractie draait in een process pool (CPU-werk, niet op de API-worker en niet op één core);
+bestanden die klaar zijn gaan in batches door naar het chunk/embed/upsert-pad (rag_add_files),
+zodat een bulk-upload één gebatchte indexeerjob is. Voortgang per bestand staat in een job (in-memory),
+op te vragen via get_job(job_id).
+
+Optionele dependencies: pypdf (PDF) en python-docx (DOCX). HTML gaat via de standaardbibliotheek.
+Env: INGEST_WORKERS (aantal processen, default aantal CPU's).
+"""
+
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from html.parser import HTMLParser
+from pathlib import Path
+
+_KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge"
+
+# Bestanden die als .md/.txt direct in knowledge/ kunnen; de rest wordt eerst omgezet naar markdown
+TEXT_EXTENSIONS = (".md", ".txt")
+CONVERT_EXTENSIONS = (".pdf", ".docx", ".html", ".htm")
+
+_JOBS: dict[str, dict] = {}
+_JOBS_LOCK = threading.Lock()
+_MAX_JOBS = 200  # oudste afgeronde jobs vallen eruit
+_INDEX_BATCH_FILES = 32  # zoveel weggeschreven bestanden samen in één embed/upsert-batch
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+# ─── Extractie (draait in de process pool; alleen standaardbibliotheek op module-niveau) ─────
+
+
+def _extract_pdf(path: Path) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("pypdf niet geïnstalleerd")
+    reader = PdfReader(str(path))
+    parts = []
+    for i, page in enumerate(reader.pages, 1):
+        text = (page.extract_text() or "").strip()
+        if text:
+            parts.append(f"## Pagina {i}\n\n{text}")
+    return "\n\n".join(parts)
+
+
+def _docx_table_to_markdown(table) -> str:
+    rows = [[(cell.text or "").strip().replace("|", "\\|").replace("\n", " ") for cell in row.cells] for row in table.rows]
+    if not rows:
+        return ""
+    lines = ["| " + " | ".join(rows[0]) + " |", "| " + " | ".join("---" for _ in rows[0]) + " |"]
+    lines.extend("| " + " | ".join(r) + " |" for r in rows[1:])
+    return "\n".join(lines)
+
+
+def _extract_docx(path: Path) -> str:
+    try:
+        import docx
+    except ImportError:
+        raise RuntimeError("python-docx niet geïnstalleerd")
+    document = docx.Document(str(path))
+    parts = []
+    for p in document.paragraphs:
+        text = (p.text or "").strip()
+        if not text:
+            continue
+        style = (p.style.name if p.style is not None else "") or ""
+        m = re.match(r"Heading (\d)", style)
+        if m:
+            parts.append("#" * min(int(m.group(1)), 6) + " " + text)
+        elif style == "Title":
+            parts.append("# " + text)
+        elif style.startswith("List"):
+            parts.append("- " + text)
+        else:
+            parts.append(text)
+    for table in document.tables:
+        md = _docx_table_to_markdown(table)
+        if md:
+            parts.append(md)
+    return "\n\n".join(parts)
+
+
+class _HtmlToMarkdown(HTMLParser):
+    """Eenvoudige HTML → markdown: koppen, alinea's, lijstjes; script/style/nav worden overgeslagen."""
+
+    _SKIP = {"script", "style", "noscript", "nav", "footer", "header", "svg"}
+    _BLOCK = {"p", "div", "section", "article", "br", "tr", "table", "ul", "ol"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: list[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif self._skip_depth:
+            return
+        elif re.fullmatch(r"h[1-6]", tag):
+            self.out.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "li":
+            self.out.append("\n- ")
+        elif tag in self._BLOCK:
+            self.out.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif not self._skip_depth and (re.fullmatch(r"h[1-6]", tag) or tag in self._BLOCK):
+            self.out.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.out.append(re.sub(r"\s+", " ", data))
+
+
+def html_to_markdown(html: str) -> str:
+    """HTML-tekst → markdown (koppen, alinea's, lijstjes); ook gebruikt voor snapshots van concurrentenpagina's."""
+    parser = _HtmlToMarkdown()
+    parser.feed(html)
+    parser.close()
+    return _normalize_markdown("".join(parser.out))
+
+
+def _extract_html(path: Path) -> str:
+    return html_to_markdown(path.read_text(encoding="utf-8", errors="replace"))
+
+
+def _normalize_markdown(text: str) -> str:
+    lines = [line.rstrip() for line in (text or "").replace("\r\n", "\n").split("\n")]
+    out = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+    return out + "\n" if out else ""
+
+
+def extract_to_markdown(path: str) -> str:
+    """Zet één PDF/DOCX/HTML-bestand om naar markdown. Top-level zodat de process pool het kan picklen."""
+    p = Path(path)
+    suffix = p.suffix.lower()
+    if suffix == ".pdf":
+        text = _extract_pdf(p)
+    elif suffix == ".docx":
+        text = _extract_docx(p)
+    elif suffix in (".html", ".htm"):
+        text = _extract_html(p)
+    elif suffix in TEXT_EXTENSIONS:
+        text = p.read_text(encoding="utf-8", errors="replace")
+    else:
+        raise ValueError(f"Niet-ondersteund bestandstype: {suffix}")
+    return _normalize_markdown(text)
+
+
+# ─── Process pool ────────────────────────────────────────────────────────────
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Eén gedeelde pool; spawn i.p.v. fork omdat de API-server threads heeft."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                workers = int(os.getenv("INGEST_WORKERS", "0")) or None
+            except ValueError:
+                workers = None
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+# ─── Jobs ────────────────────────────────────────────────────────────────────
+
+
+def target_name(filename: str) -> str:
+    """Bestandsnaam in knowledge/ na omzetting: .pdf/.docx/.html → .md; .md/.txt blijven gelijk."""
+    p = Path(filename)
+    if p.suffix.lower() in CONVERT_EXTENSIONS:
+        return p.stem + ".md"
+    return p.name
+
+
+def _new_job(filenames: list[str]) -> dict:
+    job = {
+        "job_id": str(uuid.uuid4()),
+        "status": "queued",
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "finished_at": None,
+        "total": len(filenames),
+        "done": 0,
+        "failed": 0,
+        "indexed_points": 0,
+        "files": [
+            {"filename": name, "target": target_name(name), "status": "queued", "error": None}
+            for name in filenames
+        ],
+    }
+    with _JOBS_LOCK:
+        _JOBS[job["job_id"]] = job
+        if len(_JOBS) > _MAX_JOBS:
+            finished = [j for j in _JOBS.values() if j["status"] in ("done", "error")]
+            for old in sorted(finished, key=lambda j: j["created_at"])[: len(_JOBS) - _MAX_JOBS]:
+                _JOBS.pop(old["job_id"], None)
+    return job
+
+
+def _set_file(job: dict, index: int, **fields) -> None:
+    with _JOBS_LOCK:
+        job["files"][index].update(fields)
+        status = fields.get("status")
+        if status == "done":
+            job["done"] += 1
+        elif status == "error":
+            job["failed"] += 1
+
+
+def get_job(job_id: str) -> dict | None:
+    """Kopie van de job (status + voortgang per bestand), of None."""
+    with _JOBS_LOCK:
+        job = _JOBS.get(job_id)
+        if job is None:
+            return None
+        return {**job, "files": [dict(f) for f in job["files"]]}
+
+
+def _flush_index(job: dict, pending: list[tuple[int, Path]]) -> None:
+    """Indexeer een batch weggeschreven bestanden in één keer (één embed/upsert-job) en markeer ze als klaar."""
+    if not pending:
+        return
+    from tools.rag_tool import rag_add_files
+    for i, _ in pending:
+        _set_file(job, i, status="indexing")
+    try:
+        points = rag_add_files([path for _, path in pending])
+    except Exception as e:
+        for i, _ in pending:
+            _set_file(job, i, status="error", error=f"Indexeren mislukt: {e}")
+        print(f"[Ingest] Indexeren mislukt ({len(pending)} bestanden): {e}")
+    else:
+        with _JOBS_LOCK:
+            job["indexed_points"] += points
+        for i, _ in pending:
+            _set_file(job, i, status="done")
+    pending.clear()
+
+
+def _run_job(job: dict, staged: list[Path], staging_dir: Path | None, dest_dir: Path, index: bool) -> None:
+    """Draait in een thread. .md/.txt worden direct verplaatst; PDF/DOCX/HTML parallel omgezet in de pool.
+    Weggeschreven bestanden worden per _INDEX_BATCH_FILES als één batch geïndexeerd (als index=True)."""
+    from prompt_header import invalidate_manifest
+
+    with _JOBS_LOCK:
+        job["status"] = "running"
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    pending: list[tuple[int, Path]] = []
+
+    def _written(i: int, target: Path) -> None:
+        invalidate_manifest()  # een vervangen bestand verandert de map-mtime niet
+        if not index:
+            _set_file(job, i, status="done")
+            return
+        pending.append((i, target))
+        if len(pending) >= _INDEX_BATCH_FILES:
+            _flush_index(job, pending)
+
+    try:
+        futures = {}
+        for i, src in enumerate(staged):
+            target = dest_dir / job["files"][i]["target"]
+            if src.suffix.lower() in TEXT_EXTENSIONS:
+                try:
+                    shutil.move(str(src), target)
+                    _written(i, target)
+                except Exception as e:
+                    _set_file(job, i, status="error", error=str(e))
+                continue
+            _set_file(job, i, status="extracting")
+            futures[_get_pool().submit(extract_to_markdown, str(src))] = i
+        for fut in as_completed(futures):
+            i = futures[fut]
+            entry = job["files"][i]
+            try:
+                markdown = fut.result()
+                if not markdown.strip():
+                    raise ValueError("Geen tekst gevonden in document.")
+                target = dest_dir / entry["target"]
+                target.write_text(markdown, encoding="utf-8")
+                print(f"[Ingest] {entry['filename']} → {entry['target']}")
+                _written(i, target)
+            except Exception as e:
+                _set_file(job, i, status="error", error=str(e))
+                print(f"[Ingest] {entry['filename']} fout: {e}")
+        _flush_index(job, pending)
+    finally:
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        with _JOBS_LOCK:
+            job["status"] = "error" if job["failed"] and not job["done"] else "done"
+            job["finished_at"] = datetime.utcnow().isoformat() + "Z"
+
+
+def start_ingest_job(
+    staged: list[Path],
+    staging_dir: Path | None = None,
+    dest_dir: Path = _KNOWLEDGE_DIR,
+    index: bool = True,
+) -> dict:
+    """Start een ingestiejob op de achtergrond voor reeds opgeslagen bronbestanden. Retourneert de job (met job_id).
+    dest_dir: doelmap (default knowledge/); index=False voor mappen buiten de RAG-index (bijv. call_transcripts/).
+    staging_dir wordt na afloop verwijderd."""
+    job = _new_job([p.name for p in staged])
+    threading.Thread(target=_run_job, args=(job, staged, staging_dir, dest_dir, index), daemon=True).start()
+    return get_job(job["job_id"])
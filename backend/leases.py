@@ -0,0 +1,111 @@
+"""
+Leases voor geplande agenda-uitvoeringen, zodat elke uitvoering precies één keer draait, ook met meerdere
+uvicorn-workers of backend-containers op dezelfde data/sonja.db.
+
+Elke scheduler (per proces) vuurt dezelfde uitvoering af; een uitvoering is (item_id, gepland moment). Alleen het
+proces dat de lease claimt voert hem uit. De eigenaar verlengt de lease zolang de run wacht of loopt (heartbeat);
+crasht het proces, dan verloopt de lease na AGENDA_LEASE_TTL_SEC (default 120) en neemt een ander proces hem over.
+
+Toestanden: claimed (wacht of loopt), done (afgerond), skipped (niet uitgevoerd, bijv. item verwijderd).
+"""
+
+import os
+import socket
+import time
+import uuid
+
+import db
+
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+_KEEP_DAYS = 7  # afgeronde leases zo lang bewaren (zelfde uitvoering niet opnieuw claimen na een resync)
+
+
+def owner() -> str:
+    """Id van dit proces als lease-eigenaar."""
+    return _OWNER
+
+
+def ttl_sec() -> float:
+    try:
+        return max(10.0, float(os.getenv("AGENDA_LEASE_TTL_SEC", "120")))
+    except ValueError:
+        return 120.0
+
+
+def claim(item_id: str, scheduled_for: str) -> bool:
+    """Claim een uitvoering. True als dit proces hem moet uitvoeren: nieuw, of een verlopen lease van een ander."""
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute(
+            "SELECT state, expires_at FROM agenda_leases WHERE item_id = ? AND scheduled_for = ?",
+            (item_id, scheduled_for),
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO agenda_leases (item_id, scheduled_for, owner, state, expires_at, updated_at) "
+                "VALUES (?, ?, ?, 'claimed', ?, ?)",
+                (item_id, scheduled_for, _OWNER, now + ttl_sec(), now),
+            )
+            return True
+        if row["state"] == "claimed" and row["expires_at"] < now:
+            _take_over(conn, item_id, scheduled_for, now)
+            return True
+        return False
+
+
+def _take_over(conn, item_id: str, scheduled_for: str, now: float) -> None:
+    conn.execute(
+        "UPDATE agenda_leases SET owner = ?, expires_at = ?, attempts = attempts + 1, updated_at = ? "
+        "WHERE item_id = ? AND scheduled_for = ?",
+        (_OWNER, now + ttl_sec(), now, item_id, scheduled_for),
+    )
+
+
+def renew(keys: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """Verleng de leases van dit proces; retourneert de keys die niet (meer) van ons zijn."""
+    if not keys:
+        return []
+    now = time.time()
+    lost = []
+    with db.transaction() as conn:
+        for item_id, scheduled_for in keys:
+            cur = conn.execute(
+                "UPDATE agenda_leases SET expires_at = ?, updated_at = ? "
+                "WHERE item_id = ? AND scheduled_for = ? AND owner = ? AND state = 'claimed'",
+                (now + ttl_sec(), now, item_id, scheduled_for, _OWNER),
+            )
+            if cur.rowcount == 0:
+                lost.append((item_id, scheduled_for))
+    return lost
+
+
+def finish(item_id: str, scheduled_for: str, state: str = "done") -> None:
+    """Lease afsluiten (done of skipped); alleen als hij nog van ons is."""
+    now = time.time()
+    with db.transaction() as conn:
+        conn.execute(
+            "UPDATE agenda_leases SET state = ?, updated_at = ? WHERE item_id = ? AND scheduled_for = ? AND owner = ?",
+            (state, now, item_id, scheduled_for, _OWNER),
+        )
+
+
+def take_expired(limit: int = 20) -> list[tuple[str, str]]:
+    """Neem verlopen leases van gecrashte processen over; retourneert [(item_id, scheduled_for)] die nu van ons zijn."""
+    now = time.time()
+    with db.transaction() as conn:
+        rows = conn.execute(
+            "SELECT item_id, scheduled_for FROM agenda_leases WHERE state = 'claimed' AND expires_at < ? LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        for r in rows:
+            _take_over(conn, r["item_id"], r["scheduled_for"], now)
+    return [(r["item_id"], r["scheduled_for"]) for r in rows]
+
+
+def prune() -> int:
+    """Afgeronde leases ouder dan _KEEP_DAYS verwijderen."""
+    cutoff = time.time() - _KEEP_DAYS * 86400
+    with db.transaction() as conn:
+        return conn.execute(
+            "DELETE FROM agenda_leases WHERE state != 'claimed' AND updated_at < ?", (cutoff,)
+        ).rowcount
@@ -7,26 +7,41 @@ import asyncio
 import calendar
 import json
 import re
+import shutil
+import tempfile
 import threading
 import time
+import zipfile
 from datetime import datetime, timezone
 from pathlib import Path
 
 import feedparser
-from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi import FastAPI, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 from agenda import (
     AgendaItem,
+    AgendaRun,
+    get_run as agenda_get_run,
+    list_dead_letters as agenda_dead_letters,
+    list_runs as agenda_list_runs,
+    count_items as agenda_count,
     list_items as agenda_list,
     get_item as agenda_get,
     add_item as agenda_add,
     update_item as agenda_update,
     delete_item as agenda_delete,
-    get_due_items,
     get_next_run,
+    parse_time,
+)
+from consolidation import (
+    consolidate_memories,
+    interval_hours as memory_consolidate_interval_hours,
+    is_running as memory_consolidation_running,
+    last_result as memory_consolidation_last_result,
+    plan_consolidation as plan_memory_consolidation,
 )
 from competitors import (
     Competitor,
@@ -35,7 +50,23 @@ from competitors import (
     add_competitor,
     update_competitor,
     delete_competitor,
+    list_research,
+    research_key,
+)
+from ingest import (
+    CONVERT_EXTENSIONS as INGEST_CONVERT_EXTENSIONS,
+    TEXT_EXTENSIONS as INGEST_TEXT_EXTENSIONS,
+    get_job as get_ingest_job,
+    start_ingest_job,
+    target_name as ingest_target_name,
 )
+from meetings import needs_pipeline as needs_meeting_pipeline, run_meeting_pipeline
+from competitor_research import run_competitor_pipeline
+import agenda_runner
+import competitor_monitor
+import result_cache
+import scheduler as agenda_scheduler
+from prompt_header import invalidate_manifest as invalidate_prompt_manifest
 from sonja import get_sonja, create_sonja_ephemeral
 from tools.rag_tool import rag_add_file, rag_remove_file, refresh_rag_tool
 
@@ -47,6 +78,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count"],
 )
 
 
@@ -72,16 +104,74 @@ async def _chat_stream_generator(message: str, context: str):
             yield f"event: step\ndata: {json.dumps(step)}\n\n"
             sent_count += 1
     response = await task
+    for step in steps_list[sent_count:]:  # stappen van na de laatste poll (bijv. rag_prefetch_result)
+        yield f"event: step\ndata: {json.dumps(step)}\n\n"
     yield f"event: done\ndata: {json.dumps({'response': response})}\n\n"
 
 
-async def _stream_prompt_generator(prompt: str):
-    """SSE-generator voor één prompt (meetings, website, competitors, news). Eigen Sonja per run, veilig parallel."""
-    sonja = create_sonja_ephemeral()
+async def _stream_prompt_generator(prompt: str, cache_key: str | None = None, bypass_cache: bool = False):
+    """SSE-generator voor één prompt (meetings, website, news). Eigen Sonja per run, veilig parallel.
+    Identieke prompts die tegelijk lopen delen één run (sleutel: de genormaliseerde prompt)."""
+    async for event in _stream_run_generator(
+        lambda steps_list: create_sonja_ephemeral().chat_async_with_list(prompt, "", steps_list),
+        flight_key=result_cache.cache_key("prompt", 0, {"prompt": prompt}),
+        cache_key=cache_key,
+        bypass_cache=bypass_cache,
+    ):
+        yield event
+
+
+# Lopende runs per sleutel (single-flight): {"task": asyncio.Task, "steps": list[dict]}
+_INFLIGHT: dict[str, dict] = {}
+
+
+def _join_or_start_run(run, flight_key: str | None, cache_key: str | None) -> dict:
+    """Sluit aan bij een lopende run met dezelfde flight_key, of start een nieuwe. Een gedeelde run draait door
+    als een subscriber afhaakt; het resultaat gaat één keer de cache in."""
+    if flight_key and flight_key in _INFLIGHT:
+        return _INFLIGHT[flight_key]
     steps_list: list[dict] = []
-    task = asyncio.create_task(
-        sonja.chat_async_with_list(prompt, "", steps_list)
-    )
+
+    async def _run_and_store():
+        response = await run(steps_list)
+        if cache_key:
+            result_cache.put(cache_key, steps_list, response)
+        return response
+
+    flight = {"task": asyncio.create_task(_run_and_store()), "steps": steps_list}
+    if flight_key:
+        _INFLIGHT[flight_key] = flight
+
+        def _forget(_task):
+            if _INFLIGHT.get(flight_key) is flight:
+                del _INFLIGHT[flight_key]
+
+        flight["task"].add_done_callback(_forget)
+    return flight
+
+
+async def _stream_run_generator(
+    run,
+    flight_key: str | None = None,
+    cache_key: str | None = None,
+    bypass_cache: bool = False,
+):
+    """SSE-generator voor een willekeurige run: run(steps_list) is een coroutine die het antwoord retourneert
+    en onderweg stappen aan steps_list toevoegt (bijv. een pipeline met meerdere agent-aanroepen).
+    Met flight_key: identieke verzoeken die tegelijk binnenkomen delen één run; elke subscriber krijgt alle
+    stappen (ook die van vóór het aansluiten) en hetzelfde done-event. Zonder flight_key geldt cache_key als sleutel.
+    Met cache_key: bij een hit in result_cache worden de opgeslagen stappen en het antwoord direct afgespeeld
+    (done met cached=true); anders wordt het resultaat van een geslaagde run opgeslagen. bypass_cache forceert
+    een nieuwe run (en ververst de cache)."""
+    if cache_key and not bypass_cache:
+        hit = result_cache.get(cache_key)
+        if hit is not None:
+            for step in hit["steps"]:
+                yield f"event: step\ndata: {json.dumps(step)}\n\n"
+            yield f"event: done\ndata: {json.dumps({'response': hit['response'], 'cached': True})}\n\n"
+            return
+    flight = _join_or_start_run(run, flight_key or cache_key, cache_key)
+    task, steps_list = flight["task"], flight["steps"]
     sent_count = 0
     while not task.done():
         await asyncio.sleep(0.2)
@@ -90,9 +180,16 @@ async def _stream_prompt_generator(prompt: str):
             yield f"event: step\ndata: {json.dumps(step)}\n\n"
             sent_count += 1
     response = await task
+    for step in steps_list[sent_count:]:
+        yield f"event: step\ndata: {json.dumps(step)}\n\n"
     yield f"event: done\ndata: {json.dumps({'response': response})}\n\n"
 
 
+# Ophogen bij een inhoudelijke wijziging van de prompttemplate, zodat oude cacheresultaten niet meer matchen.
+# (De nieuwsprompts uit data/news_prompts.json zitten al in de prompt zelf en dus in de cachesleutel.)
+_PROMPT_VERSIONS = {"meetings": 1, "website": 1, "news": 1, "competitors": 1}
+
+
 def _sse_headers():
     """Headers voor Server-Sent Events (geen buffering, keep-alive)."""
     return {
@@ -117,6 +214,11 @@ async def chat_stream(request: ChatRequest):
 class MeetingsExtractRequest(BaseModel):
     transcript: str = Field(description="Vergadertranscript om actiepunten en leerpunten uit te halen.")
     custom_prompt: str | None = Field(default=None, description="Optioneel: eigen prompt voor de extractie.")
+    pipeline: bool | None = Field(
+        default=None,
+        description="Map-reduce over segmenten (voor lange transcripts). Leeg = automatisch als het transcript niet in één segment past.",
+    )
+    bypass_cache: bool = Field(default=False, description="True = altijd een nieuwe run, ook als dit transcript al verwerkt is.")
 
 
 def _meetings_prompt(transcript: str, custom_prompt: str | None) -> str:
@@ -133,11 +235,24 @@ def _meetings_prompt(transcript: str, custom_prompt: str | None) -> str:
 
 @app.post("/meetings/extract/stream")
 async def meetings_extract_stream(request: MeetingsExtractRequest):
-    """Vergadering extract met SSE: stappen dynamisch, daarna antwoord."""
+    """Vergadering extract met SSE: stappen dynamisch, daarna antwoord. Lange transcripts via de map-reduce-pipeline
+    (segmenten parallel, voortgang per segment als stap, één write_to_memory aan het eind)."""
     transcript = request.transcript or ""
+    use_pipeline = request.pipeline if request.pipeline is not None else needs_meeting_pipeline(transcript)
     prompt = _meetings_prompt(transcript, request.custom_prompt)
+    key = result_cache.cache_key(
+        "meetings/extract", _PROMPT_VERSIONS["meetings"], {"prompt": prompt, "pipeline": use_pipeline}
+    )
+    if use_pipeline:
+        generator = _stream_run_generator(
+            lambda steps_list: run_meeting_pipeline(transcript, request.custom_prompt, steps_list),
+            cache_key=key,
+            bypass_cache=request.bypass_cache,
+        )
+    else:
+        generator = _stream_prompt_generator(prompt, cache_key=key, bypass_cache=request.bypass_cache)
     return StreamingResponse(
-        _stream_prompt_generator(prompt),
+        generator,
         media_type="text/event-stream",
         headers=_sse_headers(),
     )
@@ -148,6 +263,7 @@ async def meetings_extract_stream(request: MeetingsExtractRequest):
 class AnalyzeWebsiteRequest(BaseModel):
     url: str = Field(description="URL van de te analyseren website (bijv. https://www.afas.nl).")
     custom_prompt: str | None = Field(default=None, description="Optioneel: eigen prompt voor de analyse.")
+    bypass_cache: bool = Field(default=False, description="True = altijd een nieuwe analyse, ook als deze URL recent is geanalyseerd.")
 
 
 def _website_prompt(url: str, custom_prompt: str | None) -> str:
@@ -166,8 +282,9 @@ async def analyze_website_stream(request: AnalyzeWebsiteRequest):
     if not url:
         raise HTTPException(status_code=400, detail="URL is verplicht.")
     prompt = _website_prompt(url, request.custom_prompt)
+    key = result_cache.cache_key("analyze/website", _PROMPT_VERSIONS["website"], {"prompt": prompt})
     return StreamingResponse(
-        _stream_prompt_generator(prompt),
+        _stream_prompt_generator(prompt, cache_key=key, bypass_cache=request.bypass_cache),
         media_type="text/event-stream",
         headers=_sse_headers(),
     )
@@ -178,31 +295,29 @@ async def analyze_website_stream(request: AnalyzeWebsiteRequest):
 class AnalyzeCompetitorsRequest(BaseModel):
     competitor_names: list[str] = Field(description="Lijst met namen van concurrenten om te analyseren.")
     custom_prompt: str | None = Field(default=None, description="Optioneel: eigen prompt voor de analyse.")
-
-
-def _competitors_prompt(names: list[str], custom_prompt: str | None) -> str:
-    if custom_prompt and custom_prompt.strip():
-        return custom_prompt.strip() + f"\n\nConcurrenten: {', '.join(names)}"
-    return (
-        f"Gebruik de spy_competitor_research tool voor elk van de volgende concurrenten: {', '.join(names)}.\n\n"
-        "Voor elke concurrent:\n"
-        "- Roep spy_competitor_research aan met de naam van de concurrent\n"
-        "- Sla de belangrijkste bevindingen op\n\n"
-        "Geef daarna per concurrent een samenvatting (recente ontwikkelingen, sterke punten, marktpositie) "
-        "en sluit af met concrete actiepunten voor AFAS marketing op basis van de gecombineerde analyse."
-        "Extra instructie/Focus op: Algemeen"
+    bypass_cache: bool = Field(
+        default=False, description="True = alle concurrenten volledig opnieuw onderzoeken, ook als er recente bevindingen zijn."
     )
 
 
 @app.post("/analyze/competitors/stream")
 async def analyze_competitors_stream(request: AnalyzeCompetitorsRequest):
-    """Concurrenten-analyse met SSE: stappen dynamisch, daarna antwoord."""
+    """Concurrenten-analyse met SSE: alle concurrenten parallel onderzocht (voortgang per concurrent als stap),
+    daarna één synthese over de gecombineerde bevindingen. Recente bevindingen komen uit de opslag; daarna wordt
+    alleen nieuw nieuws opgehaald en verwerkt."""
     names = [n.strip() for n in (request.competitor_names or []) if n.strip()]
     if not names:
         raise HTTPException(status_code=400, detail="Minimaal één concurrent opgeven.")
-    prompt = _competitors_prompt(names, request.custom_prompt)
+    flight_key = result_cache.cache_key(
+        "analyze/competitors",
+        _PROMPT_VERSIONS["competitors"],
+        {"names": names, "prompt": request.custom_prompt or "", "bypass_cache": request.bypass_cache},
+    )
     return StreamingResponse(
-        _stream_prompt_generator(prompt),
+        _stream_run_generator(
+            lambda steps_list: run_competitor_pipeline(names, request.custom_prompt, steps_list, request.bypass_cache),
+            flight_key=flight_key,
+        ),
         media_type="text/event-stream",
         headers=_sse_headers(),
     )
@@ -212,10 +327,12 @@ async def analyze_competitors_stream(request: AnalyzeCompetitorsRequest):
 
 class CompetitorCreate(BaseModel):
     name: str = Field(description="Naam van de concurrent")
+    urls: list[str] = Field(default_factory=list, description="Optioneel: te volgen pagina's (bijv. prijzen)")
 
 
 class CompetitorUpdate(BaseModel):
     name: str | None = None
+    urls: list[str] | None = None
 
 
 @app.get("/competitors")
@@ -228,10 +345,25 @@ def competitors_list():
 def competitors_create(body: CompetitorCreate):
     """Voeg een concurrent toe."""
     try:
-        c = add_competitor(name=body.name)
-        return c.model_dump()
+        c = add_competitor(name=body.name, urls=body.urls)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    competitor_monitor.ensure_agenda_item()
+    return c.model_dump()
+
+
+@app.get("/competitors/research")
+def competitors_research():
+    """Opgeslagen onderzoek per concurrent (samenvatting, bronnen, tijdstempels), direct bij het openen van het tabblad."""
+    competitors = list_competitors()
+    by_key = {research_key(r.name): r for r in list_research([c.name for c in competitors])}
+    return {
+        "research": [
+            {"competitor_id": c.id, **by_key[research_key(c.name)].model_dump()}
+            for c in competitors
+            if research_key(c.name) in by_key
+        ]
+    }
 
 
 @app.get("/competitors/{competitor_id}")
@@ -245,13 +377,29 @@ def competitors_get(competitor_id: str):
 
 @app.patch("/competitors/{competitor_id}")
 def competitors_update(competitor_id: str, body: CompetitorUpdate):
-    """Werk naam bij."""
-    c = update_competitor(competitor_id, name=body.name)
+    """Werk naam en/of gevolgde pagina's bij."""
+    try:
+        c = update_competitor(competitor_id, name=body.name, urls=body.urls)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not c:
         raise HTTPException(status_code=404, detail="Concurrent niet gevonden.")
+    competitor_monitor.ensure_agenda_item()
     return c.model_dump()
 
 
+@app.get("/competitors/{competitor_id}/pages")
+def competitors_pages(competitor_id: str, limit: int = 20):
+    """Gevolgde pagina's met de laatste controle, en de recentste inhoudelijke wijzigingen (diff + samenvatting)."""
+    if not get_competitor(competitor_id):
+        raise HTTPException(status_code=404, detail="Concurrent niet gevonden.")
+    limit = min(max(1, limit), 100)
+    return {
+        "pages": competitor_monitor.list_pages(competitor_id),
+        "changes": competitor_monitor.list_changes(competitor_id, limit),
+    }
+
+
 @app.delete("/competitors/{competitor_id}", status_code=204)
 def competitors_delete(competitor_id: str):
     """Verwijder een concurrent uit de lijst."""
@@ -505,6 +653,7 @@ class NewsGenerateRequest(BaseModel):
     news_item: dict = Field(description="Nieuwsitem: title, url, summary, source.")
     task: str = Field(description="inhaker | linkedin | afas_betekenis | custom")
     custom_prompt: str | None = Field(default=None, description="Bij task=custom: wat moet Sonja doen?")
+    bypass_cache: bool = Field(default=False, description="True = altijd opnieuw genereren, ook als dit item/deze taak al gegenereerd is.")
 
 
 class NewsGenerateResponse(BaseModel):
@@ -555,8 +704,9 @@ async def news_generate_stream(body: NewsGenerateRequest):
             detail="task moet zijn: inhaker, linkedin, afas_betekenis of custom.",
         )
     prompt = _news_generate_prompt(body)
+    key = result_cache.cache_key("news/generate", _PROMPT_VERSIONS["news"], {"prompt": prompt})
     return StreamingResponse(
-        _stream_prompt_generator(prompt),
+        _stream_prompt_generator(prompt, cache_key=key, bypass_cache=body.bypass_cache),
         media_type="text/event-stream",
         headers=_sse_headers(),
     )
@@ -603,6 +753,95 @@ def _safe_filename(name: str) -> bool:
     return p.name == name and "/" not in name and "\\" not in name and ".." not in name
 
 
+_BULK_MAX_FILES = 500  # max aantal bestanden per bulk-upload (incl. inhoud van zip-archieven)
+_BULK_ZIP_MAX_MEMBER_BYTES = 100 * 1024 * 1024  # max uitgepakte grootte per bestand in een zip-archief
+_BULK_ZIP_MAX_TOTAL_BYTES = 1024 * 1024 * 1024  # max uitgepakte grootte van alle zip-archieven in één upload
+
+
+def _stage_bulk_upload(
+    files: list[UploadFile], allowed: tuple[str, ...], dest_dir: Path, replace: bool = False
+) -> tuple[Path, list[Path], list[dict]]:
+    """Schrijf uploads (en de inhoud van .zip-archieven) gestreamd naar een tijdelijke map.
+    Dubbel is per doelbestand in dest_dir (report.pdf en report.md worden allebei report.md); een bestaand doelbestand
+    wordt alleen vervangen met replace=True. Zip-inhoud is begrensd per bestand en in totaal (zip-bommen).
+    Retourneert (staging_dir, opgeslagen paden, overgeslagen bestanden met reden)."""
+    staging_dir = Path(tempfile.mkdtemp(prefix="sonja_bulk_"))
+    staged: list[Path] = []
+    skipped: list[dict] = []
+    seen: dict[str, str] = {}  # doelbestand → bestandsnaam in de upload
+    zip_bytes = 0
+
+    def _accept(name: str) -> Path | None:
+        if not name or not _safe_filename(name):
+            skipped.append({"filename": name, "reason": "Ongeldige bestandsnaam."})
+            return None
+        if Path(name).suffix.lower() not in allowed:
+            skipped.append({"filename": name, "reason": f"Alleen {', '.join(allowed)} toegestaan."})
+            return None
+        target = ingest_target_name(name)
+        if target in seen:
+            reason = "Dubbele bestandsnaam." if seen[target] == name else f"Wordt ook {target}, net als {seen[target]}."
+            skipped.append({"filename": name, "reason": reason})
+            return None
+        if not replace and (dest_dir / target).exists():
+            skipped.append({"filename": name, "reason": f"{target} bestaat al; gebruik replace=true om te vervangen."})
+            return None
+        if len(staged) >= _BULK_MAX_FILES:
+            skipped.append({"filename": name, "reason": f"Maximaal {_BULK_MAX_FILES} bestanden per upload."})
+            return None
+        seen[target] = name
+        return staging_dir / name
+
+    try:
+        for upload in files:
+            name = (upload.filename or "").strip()
+            if name.lower().endswith(".zip") and _safe_filename(name):
+                try:
+                    with zipfile.ZipFile(upload.file) as zf:
+                        for member in zf.infolist():
+                            if member.is_dir():
+                                continue
+                            member_name = member.filename.replace("\\", "/").rsplit("/", 1)[-1]
+                            if member_name.startswith(".") or "__MACOSX" in member.filename:
+                                continue
+                            # zf.open levert nooit meer dan member.file_size bytes, dus de grootte uit het archief telt
+                            if member.file_size > _BULK_ZIP_MAX_MEMBER_BYTES:
+                                skipped.append({
+                                    "filename": member_name,
+                                    "reason": f"Uitgepakt groter dan {_BULK_ZIP_MAX_MEMBER_BYTES // (1024 * 1024)} MB.",
+                                })
+                                continue
+                            if zip_bytes + member.file_size > _BULK_ZIP_MAX_TOTAL_BYTES:
+                                skipped.append({
+                                    "filename": member_name,
+                                    "reason": f"Zip-inhoud samen groter dan {_BULK_ZIP_MAX_TOTAL_BYTES // (1024 * 1024)} MB.",
+                                })
+                                continue
+                            target = _accept(member_name)
+                            if target is None:
+                                continue
+                            with zf.open(member) as src, target.open("wb") as dst:
+                                shutil.copyfileobj(src, dst)
+                            zip_bytes += member.file_size
+                            staged.append(target)
+                except zipfile.BadZipFile:
+                    skipped.append({"filename": name, "reason": "Ongeldig zip-archief."})
+                continue
+            target = _accept(name)
+            if target is None:
+                continue
+            with target.open("wb") as dst:
+                shutil.copyfileobj(upload.file, dst)
+            staged.append(target)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    if not staged:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail={"message": "Geen geldige bestanden in upload.", "skipped": skipped})
+    return staging_dir, staged, skipped
+
+
 class KnowledgeListResponse(BaseModel):
     files: list[str] = Field(description="Bestandsnamen in knowledge/.")
 
@@ -642,6 +881,7 @@ def knowledge_update(filename: str, body: KnowledgeUpdateRequest):
         raise HTTPException(status_code=404, detail="Bestand niet gevonden.")
     path.write_text(body.content or "", encoding="utf-8")
     rag_add_file(path)
+    invalidate_prompt_manifest()
     return {"status": "ok", "filename": filename}
 
 
@@ -664,27 +904,59 @@ def knowledge_create(request: KnowledgeCreateRequest):
     path = _KNOWLEDGE_DIR / name
     path.write_text(request.content or "", encoding="utf-8")
     rag_add_file(path)
+    invalidate_prompt_manifest()  # kan een bestaand bestand overschrijven; de map-mtime verandert dan niet
     return {"status": "ok", "filename": name}
 
 
 @app.post("/knowledge/upload")
 def knowledge_upload(file: UploadFile):
-    """Upload een bestand naar knowledge/. Alleen .md en .txt. RAG-index wordt daarna ververst."""
+    """Upload een bestand naar knowledge/. .md en .txt direct (RAG-index wordt daarna ververst);
+    .pdf, .docx en .html worden op de achtergrond omgezet naar markdown en geïndexeerd (job_id om voortgang op te vragen)."""
     name = (file.filename or "").strip()
     if not name:
         raise HTTPException(status_code=400, detail="Geen bestandsnaam.")
     if not _safe_filename(name):
         raise HTTPException(status_code=400, detail="Ongeldige bestandsnaam.")
-    if not (name.endswith(".md") or name.endswith(".txt")):
-        raise HTTPException(status_code=400, detail="Alleen .md en .txt zijn toegestaan.")
+    suffix = Path(name).suffix.lower()
+    if suffix in INGEST_CONVERT_EXTENSIONS:
+        staging_dir = Path(tempfile.mkdtemp(prefix="sonja_ingest_"))
+        staged = staging_dir / name
+        with staged.open("wb") as f:
+            shutil.copyfileobj(file.file, f)
+        job = start_ingest_job([staged], staging_dir=staging_dir)
+        return {"status": "accepted", "filename": ingest_target_name(name), "job_id": job["job_id"]}
+    if suffix not in INGEST_TEXT_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Alleen .md, .txt, .pdf, .docx en .html zijn toegestaan.")
     _KNOWLEDGE_DIR.mkdir(parents=True, exist_ok=True)
     path = _KNOWLEDGE_DIR / name
-    content = file.file.read()
-    path.write_bytes(content)
+    with path.open("wb") as f:
+        shutil.copyfileobj(file.file, f)
     rag_add_file(path)
+    invalidate_prompt_manifest()  # kan een bestaand bestand overschrijven; de map-mtime verandert dan niet
     return {"status": "ok", "filename": name}
 
 
+@app.post("/knowledge/upload/bulk", status_code=202)
+def knowledge_upload_bulk(files: list[UploadFile], replace: bool = False):
+    """Upload meerdere bestanden en/of .zip-archieven naar knowledge/ in één request (.md, .txt, .pdf, .docx, .html).
+    Alles wordt gestreamd naar schijf en als één gebatchte indexeerjob verwerkt; voortgang via GET /knowledge/ingest/{job_id}.
+    Bestaande bestanden in knowledge/ worden overgeslagen (zie skipped), tenzij replace=true."""
+    staging_dir, staged, skipped = _stage_bulk_upload(
+        files, INGEST_TEXT_EXTENSIONS + INGEST_CONVERT_EXTENSIONS, _KNOWLEDGE_DIR, replace
+    )
+    job = start_ingest_job(staged, staging_dir=staging_dir)
+    return {"status": "accepted", "job_id": job["job_id"], "files": [f["target"] for f in job["files"]], "skipped": skipped}
+
+
+@app.get("/knowledge/ingest/{job_id}")
+def knowledge_ingest_status(job_id: str):
+    """Voortgang van een ingestiejob (PDF/DOCX/HTML → markdown → RAG), per bestand."""
+    job = get_ingest_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job niet gevonden.")
+    return job
+
+
 @app.delete("/knowledge/{filename}")
 def knowledge_delete(filename: str):
     """Verwijder een bestand uit knowledge/. RAG-index wordt voor dit bestand bijgewerkt."""
@@ -748,6 +1020,7 @@ def memory_update(filename: str, body: MemoryUpdateRequest):
         raise HTTPException(status_code=404, detail="Bestand niet gevonden.")
     path.write_text(body.content or "", encoding="utf-8")
     rag_add_file(path)
+    invalidate_prompt_manifest()
     return {"status": "ok", "filename": filename}
 
 
@@ -764,6 +1037,22 @@ def memory_delete(filename: str):
     return {"status": "ok", "filename": filename}
 
 
+@app.post("/memory/consolidate", status_code=202)
+def memory_consolidate(dry_run: bool = False):
+    """Voeg overlappende herinneringen samen (clusters op embedding + datum, één LLM-pass per cluster).
+    dry_run=true: alleen de clusters tonen. Anders start een ronde op de achtergrond; originelen gaan naar memory/.archive/."""
+    if memory_consolidation_running():
+        raise HTTPException(status_code=409, detail="Consolidatie loopt al.")
+    if dry_run:
+        try:
+            clusters = plan_memory_consolidation()
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Clusteren mislukt (RAG niet bereikbaar?): {e}")
+        return {"status": "dry_run", "clusters": clusters, "last_result": memory_consolidation_last_result()}
+    threading.Thread(target=consolidate_memories, daemon=True).start()
+    return {"status": "started", "last_result": memory_consolidation_last_result()}
+
+
 # --- Call transcripts – lijst + upload (voor Docker / frontend) ---
 
 class CallTranscriptsListResponse(BaseModel):
@@ -788,11 +1077,29 @@ def call_transcripts_upload(file: UploadFile):
         raise HTTPException(status_code=400, detail="Alleen .md en .txt zijn toegestaan.")
     _CALL_TRANSCRIPTS_DIR.mkdir(parents=True, exist_ok=True)
     path = _CALL_TRANSCRIPTS_DIR / name
-    content = file.file.read()
-    path.write_bytes(content)
+    with path.open("wb") as f:
+        shutil.copyfileobj(file.file, f)
     return {"status": "ok", "filename": name}
 
 
+@app.post("/call_transcripts/upload/bulk", status_code=202)
+def call_transcripts_upload_bulk(files: list[UploadFile], replace: bool = False):
+    """Upload meerdere .md/.txt transcripts en/of .zip-archieven in één request. Retourneert job_id; voortgang via GET /call_transcripts/upload/{job_id}.
+    Bestaande transcripts worden overgeslagen (zie skipped), tenzij replace=true."""
+    staging_dir, staged, skipped = _stage_bulk_upload(files, INGEST_TEXT_EXTENSIONS, _CALL_TRANSCRIPTS_DIR, replace)
+    job = start_ingest_job(staged, staging_dir=staging_dir, dest_dir=_CALL_TRANSCRIPTS_DIR, index=False)
+    return {"status": "accepted", "job_id": job["job_id"], "files": [f["target"] for f in job["files"]], "skipped": skipped}
+
+
+@app.get("/call_transcripts/upload/{job_id}")
+def call_transcripts_upload_status(job_id: str):
+    """Voortgang van een bulk-upload van transcripts, per bestand."""
+    job = get_ingest_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job niet gevonden.")
+    return job
+
+
 # --- Agenda CRUD ---
 
 class AgendaItemCreate(BaseModel):
@@ -800,6 +1107,7 @@ class AgendaItemCreate(BaseModel):
     prompt: str
     type: str = Field(description="once of recurring")
     schedule: str = Field(description="ISO datetime (once) of cron (recurring)")
+    priority: int = Field(default=0, description="Hoger = eerder bij drukte in de worker-pool")
 
 
 class AgendaItemUpdate(BaseModel):
@@ -807,6 +1115,7 @@ class AgendaItemUpdate(BaseModel):
     prompt: str | None = None
     type: str | None = None
     schedule: str | None = None
+    priority: int | None = None
 
 
 class AgendaItemWithNextRun(AgendaItem):
@@ -814,22 +1123,40 @@ class AgendaItemWithNextRun(AgendaItem):
     next_run_at: str | None = None
 
 
-@app.get("/agenda", response_model=list[AgendaItemWithNextRun])
-def agenda_list_endpoint():
-    """Lijst van alle agenda-items met next_run_at (volgende geplande uitvoering, Amsterdam)."""
-    items = agenda_list()
+_AGENDA_LIST_FIELDS = set(AgendaItemWithNextRun.model_fields)
+
+
+@app.get("/agenda", response_model=list[dict])
+def agenda_list_endpoint(response: Response, fields: str | None = None, limit: int | None = None, offset: int = 0):
+    """Lijst van agenda-items met next_run_at (volgende geplande uitvoering, Amsterdam; gememoiseerd per item).
+    fields=id,title,next_run_at: alleen die velden (id altijd); limit/offset: één pagina, totaal in X-Total-Count."""
+    wanted = None
+    if fields:
+        wanted = {f.strip() for f in fields.split(",") if f.strip()} | {"id"}
+        unknown = wanted - _AGENDA_LIST_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Onbekende velden: {', '.join(sorted(unknown))}")
+    offset = max(0, offset)
+    if limit is not None:
+        limit = min(max(1, limit), 500)
+    items = agenda_list(limit=limit, offset=offset)
+    response.headers["X-Total-Count"] = str(agenda_count() if limit is not None or offset else len(items))
     result = []
     for item in items:
-        n = get_next_run(item)
-        result.append(
-            AgendaItemWithNextRun(
-                **item.model_dump(),
-                next_run_at=n.isoformat() if n else None,
-            )
-        )
+        d = item.model_dump()
+        if wanted is None or "next_run_at" in wanted:
+            n = get_next_run(item)
+            d["next_run_at"] = n.isoformat() if n else None
+        result.append(d if wanted is None else {k: v for k, v in d.items() if k in wanted})
     return result
 
 
+@app.get("/agenda/dead-letters", response_model=list[AgendaItem])
+def agenda_dead_letters_endpoint():
+    """Items waarvan een uitvoering is opgegeven (fout, timeout of geen retries meer); zie het veld dead_letter."""
+    return agenda_dead_letters()
+
+
 @app.get("/agenda/{item_id}", response_model=AgendaItem)
 def agenda_get_one(item_id: str):
     """Eén agenda-item op id."""
@@ -847,6 +1174,7 @@ def agenda_create(body: AgendaItemCreate):
         prompt=body.prompt,
         type=body.type,
         schedule=body.schedule,
+        priority=body.priority,
     )
     agenda_add(item)
     return item
@@ -865,78 +1193,124 @@ def agenda_update_one(item_id: str, body: AgendaItemUpdate):
 
 @app.delete("/agenda/{item_id}")
 def agenda_delete_one(item_id: str):
-    """Agenda-item verwijderen."""
+    """Agenda-item verwijderen (inclusief run-historie)."""
     if not agenda_delete(item_id):
         raise HTTPException(status_code=404, detail="Agenda-item niet gevonden")
     return {"status": "ok"}
 
 
-# --- Scheduler: elke minuut due items; per item parallel een eigen Sonja-instantie (geen queue) ---
+@app.post("/agenda/{item_id}/retry", status_code=202)
+def agenda_retry(item_id: str):
+    """Opgegeven uitvoering (dead_letter) opnieuw in de worker-pool zetten."""
+    item = agenda_get(item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Agenda-item niet gevonden")
+    if not item.dead_letter:
+        raise HTTPException(status_code=409, detail="Geen opgegeven uitvoering voor dit item.")
+    agenda_update(item_id, dead_letter=None)  # vóór submit: een nieuwe mislukking zet hem opnieuw
+    if not agenda_runner.submit(item_id, parse_time(item.dead_letter.get("scheduled_for"))):
+        agenda_update(item_id, dead_letter=item.dead_letter)
+        raise HTTPException(status_code=409, detail="Dit item wacht of draait al.")
+    return {"status": "queued"}
+
+
+@app.delete("/agenda/{item_id}/dead-letter")
+def agenda_dismiss_dead_letter(item_id: str):
+    """Opgegeven uitvoering negeren (dead_letter wissen zonder nieuwe run)."""
+    if not agenda_update(item_id, dead_letter=None):
+        raise HTTPException(status_code=404, detail="Agenda-item niet gevonden")
+    return {"status": "ok"}
+
 
-_agenda_running_ids: set[str] = set()
-_agenda_running_lock = threading.Lock()
+@app.post("/agenda/{item_id}/run", status_code=202)
+def agenda_run_now(item_id: str):
+    """Item direct uitvoeren via dezelfde worker-pool (zonder stagger); volgen via /agenda/{id}/runs/current/stream."""
+    if not agenda_get(item_id):
+        raise HTTPException(status_code=404, detail="Agenda-item niet gevonden")
+    if not agenda_runner.submit(item_id):
+        raise HTTPException(status_code=409, detail="Dit item wacht of draait al.")
+    return {"status": "queued"}
 
 
-def _run_agenda_item(item_id: str) -> None:
-    """Draait in een thread; voert één agenda-item uit met een ephemeral Sonja (sync chat). Na afloop: id uit _agenda_running_ids."""
-    from zoneinfo import ZoneInfo
-    item = agenda_get(item_id)
-    if item is None:
-        with _agenda_running_lock:
-            _agenda_running_ids.discard(item_id)
-        return
-    now = datetime.now(ZoneInfo("Europe/Amsterdam"))
-    print(f"[Agenda] Start taak: {item.title}")
-    sonja = create_sonja_ephemeral()
-    message = (
-        f"Geplande taak: [{item.title}].\n\n"
-        f"Voer de volgende opdracht uit: {item.prompt}\n\n"
+async def _agenda_run_stream_generator(live: dict):
+    """SSE voor een lopende agenda-run: event status bij elke statuswijziging (queued/running/retrying), stappen
+    zodra ze binnenkomen (ook die van vóór het aansluiten), daarna done met status, run_id en antwoord."""
+    sent_count = 0
+    last_status = None
+    while live["result"] is None:
+        if live["status"] != last_status:
+            last_status = live["status"]
+            yield f"event: status\ndata: {json.dumps({'status': last_status, 'attempt': live['attempt']})}\n\n"
+        steps_list = live["steps"]
+        while sent_count < len(steps_list):
+            yield f"event: step\ndata: {json.dumps(steps_list[sent_count])}\n\n"
+            sent_count += 1
+        await asyncio.sleep(0.2)
+    for step in live["steps"][sent_count:]:
+        yield f"event: step\ndata: {json.dumps(step)}\n\n"
+    yield f"event: done\ndata: {json.dumps(live['result'])}\n\n"
+
+
+@app.get("/agenda/{item_id}/runs/current/stream")
+async def agenda_run_current_stream(item_id: str):
+    """Volg de wachtende of lopende uitvoering van een item live (SSE). 404 als er in dit proces niets loopt;
+    de afgeronde run staat dan in /agenda/{id}/runs."""
+    live = agenda_runner.current(item_id)
+    if live is None:
+        raise HTTPException(status_code=404, detail="Geen lopende uitvoering voor dit item.")
+    return StreamingResponse(
+        _agenda_run_stream_generator(live),
+        media_type="text/event-stream",
+        headers=_sse_headers(),
     )
-    try:
-        response, steps = sonja.chat(message)
-        agenda_update(
-            item.id,
-            last_run_at=now.isoformat(),
-            last_run_response=response or "",
-            last_run_steps=steps,
-        )
-        print(f"[Agenda] Taak uitgevoerd: {item.title}")
-    except Exception as e:
-        print(f"[Agenda] Item {item.id} fout: {e}")
-    finally:
-        with _agenda_running_lock:
-            _agenda_running_ids.discard(item.id)
 
 
-def _scheduler_loop():
-    """Elke 60 seconden: get_due_items(); voor elk item dat nog niet draait, start een thread met eigen Sonja."""
-    time.sleep(5)
+@app.get("/agenda/{item_id}/runs")
+def agenda_runs(item_id: str, limit: int = 20, offset: int = 0):
+    """Run-historie van een item, nieuwste eerst; per run status, duur, tokens, aantal stappen en samenvatting."""
+    if not agenda_get(item_id):
+        raise HTTPException(status_code=404, detail="Agenda-item niet gevonden")
+    limit = min(max(1, limit), 100)
+    offset = max(0, offset)
+    total, runs = agenda_list_runs(item_id, limit=limit, offset=offset)
+    return {"total": total, "limit": limit, "offset": offset, "runs": runs}
+
+
+@app.get("/agenda/{item_id}/runs/{run_id}", response_model=AgendaRun)
+def agenda_run_detail(item_id: str, run_id: str):
+    """Eén run met denkstappen en volledig antwoord."""
+    run = agenda_get_run(item_id, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Run niet gevonden")
+    return run
+
+
+# --- Scheduler (scheduler.py) vuurt af; agenda_runner.py voert uit in een begrensde worker-pool ---
+
+
+def _memory_consolidation_loop():
+    """Elke MEMORY_CONSOLIDATE_INTERVAL_HOURS: één consolidatieronde over memory/ (0 = uit)."""
+    hours = memory_consolidate_interval_hours()
+    if not hours:
+        return
     while True:
+        time.sleep(hours * 3600)
         try:
-            from zoneinfo import ZoneInfo
-            now = datetime.now(ZoneInfo("Europe/Amsterdam"))
-            due = get_due_items(now)
-            for item in due:
-                with _agenda_running_lock:
-                    if item.id in _agenda_running_ids:
-                        continue
-                    _agenda_running_ids.add(item.id)
-                t = threading.Thread(target=_run_agenda_item, args=(item.id,), daemon=True)
-                t.start()
-            if due:
-                print(f"[Agenda] {len(due)} due item(s) gestart (om {now.strftime('%H:%M')} Amsterdam)")
+            consolidate_memories()
         except Exception as e:
-            print(f"Scheduler fout: {e}")
-        time.sleep(60)
+            print(f"[Geheugen] Consolidatie fout: {e}")
 
 
 @app.on_event("startup")
 def start_scheduler():
-    threading.Thread(target=_scheduler_loop, daemon=True).start()
+    competitor_monitor.ensure_agenda_item()
+    agenda_runner.start()
+    agenda_scheduler.start(agenda_runner.fire)
+    threading.Thread(target=_memory_consolidation_loop, daemon=True).start()
 
 
 # --- Health ---
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "agenda_pool": agenda_runner.stats()}
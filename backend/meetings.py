@@ -0,0 +1,227 @@
+"""
+Pipeline voor lange vergadertranscripts (map-reduce) voor /meetings/extract/stream.
+
+1. Segmenteren: transcript opdelen in stukken van max ~_SEGMENT_CHARS tekens, bij voorkeur op een
+   sprekerwissel; tijdstempels ([00:12:33] of 00:12) worden per segment als tijdsbereik bewaard.
+2. Map: per segment parallel (max _MAP_CONCURRENCY tegelijk) actiepunten en leerpunten extraheren met een
+   lichte agent zonder tools. Elk afgerond segment verschijnt als denkstap.
+3. Reduce: resultaten samenvoegen en dedupliceren; daarna één Sonja-run die de lijst opschoont,
+   precies één keer write_to_memory aanroept en het overzicht geeft.
+
+Env: MEETING_SEGMENT_CHARS (default 12000), MEETING_MAP_CONCURRENCY (default 4).
+"""
+
+import asyncio
+import json
+import os
+import re
+
+from crewai import Agent
+
+from sonja import create_sonja_ephemeral
+
+_SPEAKER_LINE = re.compile(r"^\s*(?:\[?\d{1,2}:\d{2}(?::\d{2})?\]?\s*)?[A-ZÀ-Ý][\w .'\-]{0,40}:\s")
+_TIMESTAMP = re.compile(r"\[?(\d{1,2}:\d{2}(?::\d{2})?)\]?")
+
+
+def _segment_chars() -> int:
+    try:
+        return max(2000, int(os.getenv("MEETING_SEGMENT_CHARS", "12000")))
+    except ValueError:
+        return 12000
+
+
+def _map_concurrency() -> int:
+    try:
+        return max(1, int(os.getenv("MEETING_MAP_CONCURRENCY", "4")))
+    except ValueError:
+        return 4
+
+
+def segment_transcript(transcript: str, max_chars: int | None = None) -> list[dict]:
+    """Splits in segmenten [{index, text, start, end}]; knipt bij voorkeur op een sprekerwissel, anders op een regel."""
+    max_chars = max_chars or _segment_chars()
+    lines: list[str] = []
+    for line in (transcript or "").strip().splitlines():
+        # Transcripts zonder regeleinden: lange regels op woordgrens opknippen
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            lines.append(line[:cut])
+            line = line[cut:].lstrip()
+        lines.append(line)
+    segments: list[dict] = []
+    current: list[str] = []
+    size = 0
+    last_turn = 0  # index in current waar de laatste sprekerbeurt begon
+
+    def _flush(upto: int) -> None:
+        nonlocal current, size, last_turn
+        part = current[:upto]
+        text = "\n".join(part).strip()
+        if text:
+            stamps = _TIMESTAMP.findall(text[:200]) + _TIMESTAMP.findall(text[-200:])
+            segments.append({
+                "index": len(segments) + 1,
+                "text": text,
+                "start": stamps[0] if stamps else None,
+                "end": stamps[-1] if stamps else None,
+            })
+        current = current[upto:]
+        size = sum(len(line) + 1 for line in current)
+        last_turn = 0
+
+    for line in lines:
+        if _SPEAKER_LINE.match(line):
+            last_turn = len(current)
+        if size + len(line) + 1 > max_chars and current:
+            # Knip bij de laatste sprekerwissel als die niet te vroeg in het segment zit
+            cut = last_turn if last_turn > len(current) // 2 else len(current)
+            _flush(cut)
+        current.append(line)
+        size += len(line) + 1
+    _flush(len(current))
+    return segments
+
+
+def _map_prompt(segment: dict, total: int) -> str:
+    when = f" (tijd {segment['start']}–{segment['end']})" if segment.get("start") else ""
+    return (
+        f"Dit is segment {segment['index']} van {total}{when} van een vergadertranscript.\n"
+        "Haal hieruit alleen wat in dit segment staat: actiepunten/to-do's (met eigenaar en deadline als die genoemd worden) "
+        "en leerpunten/kennis die de moeite waard zijn om te onthouden.\n"
+        "Antwoord uitsluitend met JSON in dit formaat, zonder uitleg:\n"
+        '{"actiepunten": [{"wat": "...", "wie": "...", "wanneer": "..."}], "leerpunten": ["..."]}\n\n'
+        f"Segment:\n{segment['text']}"
+    )
+
+
+def _parse_extraction(raw: str) -> dict:
+    """JSON uit het agent-antwoord halen; bij een fout een lege extractie (segment telt dan niet mee)."""
+    m = re.search(r"\{.*\}", raw or "", re.S)
+    if not m:
+        return {"actiepunten": [], "leerpunten": []}
+    try:
+        data = json.loads(m.group(0))
+    except json.JSONDecodeError:
+        return {"actiepunten": [], "leerpunten": []}
+    actions = []
+    for a in data.get("actiepunten") or []:
+        if isinstance(a, str):
+            a = {"wat": a}
+        if isinstance(a, dict) and str(a.get("wat") or "").strip():
+            actions.append({k: str(a.get(k) or "").strip() for k in ("wat", "wie", "wanneer")})
+    learnings = [str(x).strip() for x in data.get("leerpunten") or [] if str(x).strip()]
+    return {"actiepunten": actions, "leerpunten": learnings}
+
+
+def _build_extractor() -> Agent:
+    return Agent(
+        role="Notulist",
+        goal="Haal actiepunten en leerpunten uit een stuk vergadertranscript en geef ze als JSON terug.",
+        backstory=(
+            "Je ondersteunt Sonja, de digitale marketeer van AFAS, bij het verwerken van lange vergaderingen. "
+            "Je krijgt telkens één segment; je verzint niets en geeft alleen JSON terug, in het Nederlands."
+        ),
+        tools=[],
+        verbose=False,
+        allow_delegation=False,
+    )
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"[^\w]+", " ", (text or "").lower()).strip()
+
+
+def merge_extractions(extractions: list[dict]) -> dict:
+    """Reduce: samenvoegen in segmentvolgorde; dubbele actiepunten/leerpunten (genormaliseerde tekst) één keer."""
+    actions: list[dict] = []
+    learnings: list[str] = []
+    seen_actions: dict[str, dict] = {}
+    seen_learnings: set[str] = set()
+    for ex in extractions:
+        for a in ex.get("actiepunten", []):
+            key = _norm(a["wat"])
+            if key in seen_actions:
+                kept = seen_actions[key]
+                for field in ("wie", "wanneer"):
+                    if not kept.get(field) and a.get(field):
+                        kept[field] = a[field]
+                continue
+            seen_actions[key] = dict(a)
+            actions.append(seen_actions[key])
+        for item in ex.get("leerpunten", []):
+            key = _norm(item)
+            if key and key not in seen_learnings:
+                seen_learnings.add(key)
+                learnings.append(item)
+    return {"actiepunten": actions, "leerpunten": learnings}
+
+
+def _reduce_prompt(merged: dict, custom_prompt: str | None, segments: int) -> str:
+    action_lines = []
+    for a in merged["actiepunten"]:
+        extra = ", ".join(x for x in (a.get("wie"), a.get("wanneer")) if x)
+        action_lines.append(f"- {a['wat']}" + (f" ({extra})" if extra else ""))
+    learning_lines = [f"- {x}" for x in merged["leerpunten"]]
+    instruction = (custom_prompt or "").strip() or (
+        "Hieronder staan de actiepunten en leerpunten die per segment uit een lang vergadertranscript zijn gehaald. "
+        "Voeg overlappende punten samen en verwijder wat dubbel is. "
+        "Sla de leerpunten en relevante kennis op met precies één write_to_memory-aanroep (één dense entry). "
+        "Geef daarna een kort overzicht van wat je hebt opgeslagen en de actiepunten."
+    )
+    return (
+        f"{instruction}\n\n"
+        f"(Geëxtraheerd uit {segments} segmenten.)\n\n"
+        "Actiepunten:\n" + ("\n".join(action_lines) or "- (geen)") + "\n\n"
+        "Leerpunten:\n" + ("\n".join(learning_lines) or "- (geen)")
+    )
+
+
+async def run_meeting_pipeline(transcript: str, custom_prompt: str | None, steps_list: list[dict]) -> str:
+    """Map-reduce over de segmenten; stappen (per segment en van de slot-run) komen in steps_list."""
+    segments = segment_transcript(transcript)
+    total = len(segments)
+    steps_list.append({
+        "tool": "meeting_pipeline",
+        "summary": f"segments={total}",
+        "display_label": f"Transcript opgedeeld in {total} segmenten.",
+    })
+    semaphore = asyncio.Semaphore(_map_concurrency())
+
+    async def _map(segment: dict) -> dict:
+        async with semaphore:
+            try:
+                result = await _build_extractor().kickoff_async(_map_prompt(segment, total))
+                extraction = _parse_extraction(result.raw if hasattr(result, "raw") else str(result))
+                label = (
+                    f"Segment {segment['index']}/{total} verwerkt: "
+                    f"{len(extraction['actiepunten'])} actiepunten, {len(extraction['leerpunten'])} leerpunten."
+                )
+            except Exception as e:
+                extraction = {"actiepunten": [], "leerpunten": []}
+                label = f"Segment {segment['index']}/{total} mislukt: {e}"
+            when = f"{segment['start']}–{segment['end']}" if segment.get("start") else None
+            steps_list.append({
+                "tool": "meeting_segment",
+                "summary": f"segment={segment['index']}" + (f", tijd={when}" if when else ""),
+                "display_label": label,
+            })
+            return extraction
+
+    extractions = await asyncio.gather(*(_map(seg) for seg in segments))
+    merged = merge_extractions(list(extractions))
+    steps_list.append({
+        "tool": "meeting_merge",
+        "summary": f"actiepunten={len(merged['actiepunten'])}, leerpunten={len(merged['leerpunten'])}",
+        "display_label": (
+            f"Samengevoegd: {len(merged['actiepunten'])} unieke actiepunten, {len(merged['leerpunten'])} unieke leerpunten."
+        ),
+    })
+    sonja = create_sonja_ephemeral()
+    return await sonja.chat_async_with_list(_reduce_prompt(merged, custom_prompt, total), "", steps_list)
+
+
+def needs_pipeline(transcript: str) -> bool:
+    """Automatische keuze: pipeline alleen als het transcript niet in één segment past."""
+    return len(transcript or "") > _segment_chars()
@@ -0,0 +1,176 @@
+"""
+Begrensde prompt-header voor Sonja: datum, aantallen, recente herinneringen en de bestanden die het meest
+relevant lijken voor het huidige bericht — in plaats van alle bestandsnamen bij elk bericht.
+
+Het manifest (bestandsnamen, datums en een klein lokaal termenindex over bestandsnaam + begin van de inhoud)
+wordt gecachet en alleen opnieuw opgebouwd als knowledge/ of memory/ wijzigt (mtime van de map: bestand
+toegevoegd, verwijderd of hernoemd) of na invalidate_manifest(). Die moet elk schrijfpad aanroepen dat een bestaand
+bestand kan overschrijven (bewerken, aanmaken, upload, ingestiejobs): dan verandert de map-mtime niet.
+Per bericht kost de header dus twee stat-calls en een lookup in het index, los van het aantal bestanden.
+
+Env: PROMPT_HEADER_MAX_TOKENS (default 400; schatting ~4 tekens per token).
+"""
+
+import bisect
+import math
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_BACKEND_DIR = Path(__file__).resolve().parent
+_KNOWLEDGE_DIR = _BACKEND_DIR / "knowledge"
+_MEMORY_DIR = _BACKEND_DIR / "memory"
+
+_RECENT_MEMORIES = 8  # zoveel nieuwste herinneringen bij naam
+_RELEVANT_FILES = 5  # top-k relevante bestanden (knowledge + memory samen)
+_RECENT_DAYS = 30
+_HEAD_CHARS = 500  # begin van elk bestand dat meegaat in het termenindex
+_TERM_LEN = 6  # termen afkappen: goedkope stemming (vergadering/vergaderingen → vergad)
+_CHARS_PER_TOKEN = 4
+_WEEKDAYS_NL = ["Maandag", "Dinsdag", "Woensdag", "Donderdag", "Vrijdag", "Zaterdag", "Zondag"]
+_STOPWORDS = {
+    "een", "het", "van", "voor", "met", "die", "dat", "wat", "hoe", "zijn", "naar", "ook", "over", "niet",
+    "kan", "kun", "kunnen", "mijn", "jij", "jou", "onze", "ons", "deze", "dit", "welke", "waar", "wie",
+    "and", "the", "for", "with", "bij", "aan", "als", "maar", "nog", "wel", "dan", "heb", "hebben", "wordt",
+    "worden", "maak", "graag", "please", "sonja",
+}
+
+_lock = threading.Lock()
+_cache: dict = {"key": None, "manifest": None}
+
+
+def _max_tokens() -> int:
+    try:
+        return max(100, int(os.getenv("PROMPT_HEADER_MAX_TOKENS", "400")))
+    except ValueError:
+        return 400
+
+
+def _terms(text: str) -> set[str]:
+    """Lowercase, zonder accenten, woorden van >= 3 tekens zonder stopwoorden, afgekapt op _TERM_LEN."""
+    plain = unicodedata.normalize("NFKD", (text or "").lower()).encode("ascii", "ignore").decode("ascii")
+    return {w[:_TERM_LEN] for w in re.findall(r"[a-z0-9]{3,}", plain) if w not in _STOPWORDS}
+
+
+def memory_datetime(filename: str) -> datetime | None:
+    """Datum (en tijd) uit DD-MM-YYYY_HH-MM_slug.md; None als de naam geen datum heeft."""
+    m = re.match(r"(\d{2})-(\d{2})-(\d{4})(?:_(\d{2})-(\d{2}))?", filename or "")
+    if not m:
+        return None
+    d, mo, y = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    h, mi = int(m.group(4) or 0), int(m.group(5) or 0)
+    try:
+        return datetime(y, mo, d, h, mi)
+    except ValueError:
+        return None
+
+
+def _dir_key(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _head(path: Path) -> str:
+    try:
+        with path.open(encoding="utf-8", errors="replace") as f:
+            return f.read(_HEAD_CHARS)
+    except OSError:
+        return ""
+
+
+def _build_manifest() -> dict:
+    knowledge = []
+    if _KNOWLEDGE_DIR.is_dir():
+        knowledge = sorted(f.name for f in _KNOWLEDGE_DIR.iterdir() if f.is_file() and f.suffix.lower() in (".md", ".txt"))
+    memories = []
+    if _MEMORY_DIR.is_dir():
+        memories = [f.name for f in _MEMORY_DIR.glob("*.md") if f.is_file()]
+    memories.sort(key=lambda n: (memory_datetime(n) or datetime.min, n), reverse=True)
+    # Termenindex: term → {label}; label = knowledge-bestandsnaam of memory/bestandsnaam (zoals read_file ze verwacht)
+    postings: dict[str, set[str]] = {}
+    docs = [(name, _KNOWLEDGE_DIR / name) for name in knowledge]
+    docs += [(f"memory/{name}", _MEMORY_DIR / name) for name in memories]
+    for label, path in docs:
+        for term in _terms(path.stem.replace("_", " ").replace("-", " ") + " " + _head(path)):
+            postings.setdefault(term, set()).add(label)
+    # Oplopende timestamps: aantal herinneringen in de laatste maand via bisect i.p.v. alle namen te parsen
+    stamps = sorted(dt.timestamp() for dt in map(memory_datetime, memories) if dt is not None)
+    return {"knowledge": knowledge, "memories": memories, "memory_stamps": stamps, "postings": postings, "docs": len(docs)}
+
+
+def get_manifest() -> dict:
+    """Gecachet manifest; opnieuw opgebouwd als een van beide mappen gewijzigd is."""
+    key = (_dir_key(_KNOWLEDGE_DIR), _dir_key(_MEMORY_DIR))
+    with _lock:
+        if _cache["key"] != key or _cache["manifest"] is None:
+            _cache["manifest"] = _build_manifest()
+            _cache["key"] = key
+        return _cache["manifest"]
+
+
+def invalidate_manifest() -> None:
+    """Forceer een rebuild bij het volgende bericht (na het bewerken van een bestand; de map-mtime verandert dan niet)."""
+    with _lock:
+        _cache["key"] = None
+
+
+def relevant_files(manifest: dict, message: str, k: int = _RELEVANT_FILES) -> list[str]:
+    """Top-k bestanden op idf-gewogen termoverlap met het bericht."""
+    scores: dict[str, float] = {}
+    n = max(1, manifest["docs"])
+    for term in _terms(message):
+        labels = manifest["postings"].get(term)
+        if not labels:
+            continue
+        idf = math.log(1 + n / len(labels))
+        for label in labels:
+            scores[label] = scores.get(label, 0.0) + idf
+    return [label for label, _ in sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:k]]
+
+
+def _now_with_weekday() -> str:
+    """Huidige datum en tijd met weekdag ervoor, bijv. Woensdag 2025-02-12 14:30:00."""
+    dt = datetime.now()
+    return f"{_WEEKDAYS_NL[dt.weekday()]} {dt.strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def _render(manifest: dict, last_month: int, recent: list[str], relevant: list[str]) -> str:
+    lines = [f"[Huidige datum en tijd: {_now_with_weekday()}.]"]
+    knowledge, memories = manifest["knowledge"], manifest["memories"]
+    if knowledge or memories:
+        lines.append(
+            f"[Bestanden: {len(knowledge)} in knowledge/, {len(memories)} herinneringen in memory/ "
+            f"({last_month} in de laatste maand). Gebruik rag_search om semantisch te zoeken en read_file met de "
+            "bestandsnaam (knowledge) of memory/bestandsnaam (herinnering) om een bestand te lezen.]"
+        )
+    if relevant:
+        lines.append(f"[Mogelijk relevant voor dit bericht: {', '.join(relevant)}.]")
+    if recent:
+        lines.append(f"[Recentste herinneringen: {', '.join(recent)}.]")
+    return "\n\n".join(lines)
+
+
+def build_header(message: str) -> str:
+    """Header met aantallen, de nieuwste herinneringen en relevante bestanden, binnen PROMPT_HEADER_MAX_TOKENS.
+    Bij overschrijding vallen eerst recente herinneringen, dan de minst relevante bestanden weg."""
+    manifest = get_manifest()
+    recent = list(manifest["memories"][:_RECENT_MEMORIES])
+    relevant = relevant_files(manifest, message)
+    recent = [n for n in recent if f"memory/{n}" not in relevant]
+    cutoff = (datetime.now() - timedelta(days=_RECENT_DAYS)).timestamp()
+    stamps = manifest["memory_stamps"]
+    last_month = len(stamps) - bisect.bisect_left(stamps, cutoff)
+    budget = _max_tokens() * _CHARS_PER_TOKEN
+    header = _render(manifest, last_month, recent, relevant)
+    while len(header) > budget and (recent or relevant):
+        if recent:
+            recent.pop()
+        else:
+            relevant.pop()
+        header = _render(manifest, last_month, recent, relevant)
+    return header
@@ -0,0 +1,82 @@
+"""
+Resultaatcache voor eenmalige generaties (vergaderingen, website-analyse, nieuws).
+
+Zelfde endpoint + promptversie + (genormaliseerde) invoer → zelfde sleutel. Een hit geeft de opgeslagen
+denkstappen en het antwoord terug zonder nieuwe agent-run (en dus zonder dubbele write_to_memory).
+In-memory per proces, met TTL en een maximum aantal entries (oudste gebruikte eerst eruit).
+
+Env: RESULT_CACHE_TTL_SEC (default 86400, 0 = uit), RESULT_CACHE_MAX_ENTRIES (default 256).
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _ttl_sec() -> int:
+    try:
+        return max(0, int(os.getenv("RESULT_CACHE_TTL_SEC", "86400")))
+    except ValueError:
+        return 86400
+
+
+def _max_entries() -> int:
+    try:
+        return max(1, int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")))
+    except ValueError:
+        return 256
+
+
+def _normalise(value):
+    """Witruimte in strings samenvouwen (herhaalde klikken met een extra spatie/regel zijn hetzelfde verzoek)."""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): _normalise(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    return value
+
+
+def cache_key(endpoint: str, version: int, inputs: dict) -> str:
+    """Sleutel op endpoint, versie van de prompttemplate en genormaliseerde invoer."""
+    payload = json.dumps(
+        {"endpoint": endpoint, "version": version, "inputs": _normalise(inputs)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> dict | None:
+    """Opgeslagen resultaat {steps, response, stored_at} of None (niet gevonden of verlopen)."""
+    ttl = _ttl_sec()
+    if not ttl:
+        return None
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > ttl:
+            _entries.pop(key, None)
+            return None
+        _entries.move_to_end(key)
+        return {**entry, "steps": [dict(s) for s in entry["steps"]]}
+
+
+def put(key: str, steps: list[dict], response: str) -> None:
+    """Resultaat van een geslaagde run opslaan; bij een volle cache valt de langst niet gebruikte entry eruit."""
+    if not _ttl_sec():
+        return
+    with _lock:
+        _entries[key] = {"steps": [dict(s) for s in steps], "response": response, "stored_at": time.time()}
+        _entries.move_to_end(key)
+        while len(_entries) > _max_entries():
+            _entries.popitem(last=False)
@@ -0,0 +1,213 @@
+"""
+Scheduler voor de agenda: een heap met het eerstvolgende uitvoeringsmoment per item, in plaats van elke minuut alle
+items te laden en croniter op elk item te draaien.
+
+- De thread slaapt precies tot het vroegste moment in de heap (of tot de volgende resync-check) en wordt direct
+  gewekt bij add/update/delete van een item (agenda.subscribe, dus ook via Sonja's agenda-tools).
+- Na een uitvoering wordt alleen het volgende moment van dát item berekend; tussen twee uitvoeringen kosten
+  duizenden items niets.
+- Wijzigingen door andere processen leiden tot een volledige resync van de heap, hooguit eens per
+  AGENDA_SCHEDULER_RESYNC_SEC. Daarvoor telt alleen de agendaversie (agenda_version, opgehoogd door add/update/delete
+  in dezelfde transactie): vastgelegde runs of andere tabellen, en wijzigingen van dit proces zelf, tellen niet mee.
+
+Misfire-beleid (een uitvoering die te laat is, bijv. na een herstart of een slapende machine):
+- Tot AGENDA_MISFIRE_GRACE_SEC (default 300) te laat: gewoon uitvoeren.
+- Later: AGENDA_MISFIRE_POLICY=run_once (default) voert de gemiste uitvoeringen samen één keer uit, mits de laatste
+  gemiste niet ouder is dan AGENDA_CATCHUP_MAX_HOURS (default 24); skip slaat ze over. Overgeslagen uitvoeringen
+  worden altijd gelogd, nooit stil gemist, en als skipped_for op het item vastgelegd: na een herstart of in een
+  ander proces volgt er dan geen inhaalrun meer voor.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from agenda import (
+    AgendaItem,
+    TZ_AMSTERDAM,
+    changes_since,
+    get_item,
+    list_items,
+    mark_skipped,
+    next_fire_after,
+    parse_time,
+    subscribe,
+)
+
+_MAX_MISSED_COUNT = 1000  # gemiste cron-momenten tellen we tot hier (minuut-cron na een week uit)
+
+_cond = threading.Condition()
+_heap: list[tuple[float, int, str, datetime]] = []  # (timestamp, seq, item_id, gepland moment)
+_planned: dict[str, int] = {}  # item_id → seq van de geldige heap-entry (oudere entries zijn verouderd)
+_last_fired: dict[str, datetime] = {}  # item_id → laatst afgevuurd gepland moment (in dit proces)
+_seq = itertools.count()
+_started = False
+
+
+def _grace_sec() -> int:
+    try:
+        return max(0, int(os.getenv("AGENDA_MISFIRE_GRACE_SEC", "300")))
+    except ValueError:
+        return 300
+
+
+def _catch_up_enabled() -> bool:
+    return os.getenv("AGENDA_MISFIRE_POLICY", "run_once").strip().lower() != "skip"
+
+
+def _catch_up_max() -> timedelta:
+    try:
+        return timedelta(hours=max(0.0, float(os.getenv("AGENDA_CATCHUP_MAX_HOURS", "24"))))
+    except ValueError:
+        return timedelta(hours=24)
+
+
+def _resync_sec() -> float:
+    try:
+        return max(5.0, float(os.getenv("AGENDA_SCHEDULER_RESYNC_SEC", "30")))
+    except ValueError:
+        return 30.0
+
+
+def _base_time(item: AgendaItem) -> datetime:
+    """Vanaf wanneer het volgende moment telt: laatst afgevuurd of overgeslagen, laatste run of aanmaakmoment."""
+    candidates = [
+        _last_fired.get(item.id), parse_time(item.skipped_for), parse_time(item.last_run_at), parse_time(item.created_at),
+    ]
+    candidates = [c for c in candidates if c is not None]
+    return max(candidates) if candidates else datetime.now(TZ_AMSTERDAM)
+
+
+def _plan(item: AgendaItem, now: datetime, catch_up: bool) -> tuple[datetime, datetime] | None:
+    """(wanneer afvuren, gepland moment) of None. Past het misfire-beleid toe op een te laat moment."""
+    if item.type == "once":
+        # Dit moment al afgevuurd of overgeslagen (skipped_for ook door een ander proces); last_run_at volgt zodra de
+        # run klaar is. Vergelijken met de schedule-datum, zodat een nieuwe datum wel weer wordt ingepland.
+        schedule_at = parse_time(item.schedule)
+        if schedule_at is not None and schedule_at in (_last_fired.get(item.id), parse_time(item.skipped_for)):
+            return None
+    fire_at = next_fire_after(item, _base_time(item))
+    if fire_at is None:
+        return None
+    if fire_at >= now - timedelta(seconds=_grace_sec()):
+        return fire_at, fire_at
+    # Misfire: tel de gemiste momenten en bepaal het laatste
+    missed, latest = 1, fire_at
+    if item.type == "recurring":
+        while missed < _MAX_MISSED_COUNT:
+            nxt = next_fire_after(item, latest)
+            if nxt is None or nxt > now:
+                break
+            missed, latest = missed + 1, nxt
+    label = f"{missed}{'+' if missed >= _MAX_MISSED_COUNT else ''} gemiste uitvoering(en), laatste {latest.isoformat()}"
+    if catch_up and _catch_up_enabled() and now - latest <= _catch_up_max():
+        print(f"[Agenda] {item.title}: {label}; één inhaalrun")
+        return now, latest
+    print(f"[Agenda] {item.title}: {label} overgeslagen (misfire-beleid)")
+    _last_fired[item.id] = latest  # niet bij elke resync opnieuw melden
+    try:
+        mark_skipped(item.id, latest)  # ook na een herstart en in andere processen geen inhaalrun
+    except Exception as e:
+        print(f"[Agenda] Overslaan van {item.id} vastleggen mislukt: {e}")
+    if item.type == "recurring":
+        nxt = next_fire_after(item, now)
+        return (nxt, nxt) if nxt else None
+    return None
+
+
+def _push(item: AgendaItem, now: datetime, catch_up: bool) -> None:
+    """Plan item opnieuw in (aanroepen met _cond vastgehouden); een eerdere entry wordt daarmee verouderd."""
+    _planned.pop(item.id, None)
+    planned = _plan(item, now, catch_up)
+    if planned is None:
+        return
+    fire_at, scheduled_for = planned
+    seq = next(_seq)
+    _planned[item.id] = seq
+    heapq.heappush(_heap, (fire_at.timestamp(), seq, item.id, scheduled_for))
+
+
+def _drop_stale() -> None:
+    while _heap and _planned.get(_heap[0][2]) != _heap[0][1]:
+        heapq.heappop(_heap)
+
+
+def _resync(catch_up: bool) -> None:
+    """Heap volledig opnieuw opbouwen uit de database."""
+    items = list_items()
+    now = datetime.now(TZ_AMSTERDAM)
+    with _cond:
+        _heap.clear()
+        _planned.clear()
+        for item in items:
+            _push(item, now, catch_up)
+        _cond.notify()
+
+
+def reschedule(item_id: str) -> None:
+    """Item is aangemaakt, gewijzigd of verwijderd: volgende moment herberekenen en de thread wekken.
+    Geen inhaalrun voor een moment dat al voorbij was toen het item werd opgeslagen."""
+    item = get_item(item_id)
+    with _cond:
+        if item is None:
+            _planned.pop(item_id, None)
+            _last_fired.pop(item_id, None)
+        else:
+            _push(item, datetime.now(TZ_AMSTERDAM), catch_up=False)
+        _cond.notify()
+
+
+def _loop(fire: Callable[[str, datetime], None]) -> None:
+    version, _ = changes_since(0)
+    _resync(catch_up=True)
+    next_check = time.monotonic() + _resync_sec()
+    while True:
+        due: list[tuple[str, datetime]] = []
+        with _cond:
+            _drop_stale()
+            now = time.time()
+            while _heap and _heap[0][0] <= now:
+                _, seq, item_id, scheduled_for = heapq.heappop(_heap)
+                if _planned.get(item_id) == seq:
+                    del _planned[item_id]
+                    _last_fired[item_id] = scheduled_for
+                    due.append((item_id, scheduled_for))
+            if not due:
+                timeout = max(0.0, next_check - time.monotonic())
+                if _heap:
+                    timeout = min(timeout, _heap[0][0] - now)
+                _cond.wait(max(0.0, timeout))
+        for item_id, scheduled_for in due:
+            try:
+                fire(item_id, scheduled_for)
+            except Exception as e:
+                print(f"[Agenda] Afvuren van {item_id} mislukt: {e}")
+            item = get_item(item_id)
+            if item is not None:
+                with _cond:
+                    _push(item, datetime.now(TZ_AMSTERDAM), catch_up=True)
+        if time.monotonic() >= next_check:
+            next_check = time.monotonic() + _resync_sec()
+            try:
+                version, external = changes_since(version)
+                if external:
+                    _resync(catch_up=True)
+            except Exception as e:
+                print(f"Scheduler fout: {e}")
+
+
+def start(fire: Callable[[str, datetime], None]) -> None:
+    """Start de scheduler-thread (één keer per proces). fire(item_id, gepland moment) wordt aangeroepen als een
+    item aan de beurt is en moet snel terugkeren (de uitvoering zelf hoort in een eigen thread)."""
+    global _started
+    with _cond:
+        if _started:
+            return
+        _started = True
+    subscribe(reschedule)
+    threading.Thread(target=_loop, args=(fire,), daemon=True).start()
+
@@ -17,23 +17,32 @@ Huidige tools (tools/):
 - add_agenda_item_tool: voeg taak/afspraak toe (eenmalig of recurring)
 - update_agenda_item_tool: werk agenda-item bij
 - delete_agenda_item_tool: verwijder agenda-item
-- get_call_transcripts_tool: haal alle klantgesprek-transcripts op (lokaal uit call_transcripts/; later API)
+- get_call_transcripts_tool: doorzoek klantgesprek-transcripts (query, klant, datum, paginering; lokaal uit call_transcripts/; later API)
 
 RAG: we gebruiken RagTool als tool (niet knowledge_sources op de Agent), zodat Sonja
 expliciet zoekt wanneer nodig en de index na upload/verwijderen/write_to_memory ververst kan worden.
+CrewAI voert tools sync uit (ook bij kickoff_async, in een worker-thread), dus rag_search gebruikt de sync
+Qdrant/Voyage-clients. chat_async_with_list doet daarnaast een speculatieve prefetch op het bericht (RAG_PREFETCH)
+via de async clients, parallel aan het opbouwen van agent en prompt.
 
 Denkstappen: tools worden gewrapped in RecordingTool zodat elke tool-aanroep wordt vastgelegd
 voor de API-response (Sonja denkstappen in de frontend).
+
+Stoppen: chat_async_with_list(stop=threading.Event) stopt de run coöperatief. De kickoff draait in een thread die
+niet van buitenaf te annuleren is; daarom controleren RecordingTool en de step_callback van de agent het stopsignaal
+en breken ze de run af met RunCancelled. Een LLM-aanroep of tool die al loopt wordt nog afgemaakt.
 """
 
+import asyncio
+import os
+import threading
 from contextvars import ContextVar
-from pathlib import Path
-from datetime import datetime, timedelta
 from typing import Any
 
 from crewai import Agent
 from crewai.tools import BaseTool
 
+from prompt_header import build_header
 from tools import (
     serper_search_tool,
     scrape_website_tool,
@@ -49,10 +58,37 @@ from tools import (
     delete_agenda_item_tool,
     get_call_transcripts_tool,
 )
+from tools.rag_tool import rag_search_async
+from tools.write_to_memory import begin_memory_batch, end_memory_batch, index_memory_files
 
 
 _MAX_DISPLAY_LEN = 56  # lengte voor afkappen van waarden in display_label
 
+# Stopsignaal van de lopende run (chat_async_with_list); ContextVars gaan mee naar de kickoff-thread
+_stop_ctx: ContextVar[threading.Event | None] = ContextVar("sonja_stop", default=None)
+
+
+class RunCancelled(BaseException):
+    """De run is gestopt via het stopsignaal. BaseException, zodat de foutafhandeling van CrewAI rond tools en
+    agent-stappen (except Exception) hem niet als gewone toolfout aan het LLM teruggeeft."""
+
+
+def check_stop(stop: threading.Event | None = None) -> None:
+    """RunCancelled als het stopsignaal (meegegeven of van de lopende run) is gezet."""
+    stop = stop if stop is not None else _stop_ctx.get()
+    if stop is not None and stop.is_set():
+        raise RunCancelled()
+
+
+def _stop_step_callback(_step: Any) -> None:
+    check_stop()
+
+# Speculatieve RAG-prefetch (chat_async_with_list): zoeken op het bericht terwijl de agent wordt opgebouwd
+_PREFETCH_LIMIT = 3
+_PREFETCH_CHARS_PER_RESULT = 1200
+_PREFETCH_TIMEOUT_SEC = 3.0  # langer wachten kost meer dan een rag_search-beurt van de agent zou besparen
+_PREFETCH_MAX_QUERY_CHARS = 2000  # langere berichten zijn taakprompts (transcripts e.d.), geen zoekvraag
+
 
 def _trunc(s: str, max_len: int = _MAX_DISPLAY_LEN) -> str:
     s = (s or "").strip()
@@ -73,6 +109,10 @@ def _step_display_label(tool_name: str, kwargs: dict[str, Any]) -> str:
         return f"Pagina-inhoud ophalen van: {url}" if url else "Website-inhoud ophalen."
     if tool_name == "read_file":
         path = get("file_path")
+        if path and k.get("toc"):
+            return f"Inhoudsopgave bekijken van: {path}"
+        if path and get("section"):
+            return f"Lezen van sectie «{_trunc(str(k.get('section')), 30)}» uit: {path}"
         if path:
             return f"Lezen van kennis of herinnering: {path}"
         return "Bestand uit kennis of geheugen lezen."
@@ -108,7 +148,10 @@ def _step_display_label(tool_name: str, kwargs: dict[str, Any]) -> str:
         iid = get("item_id")
         return f"Agenda-item verwijderen: {iid}" if iid else "Agenda-item verwijderen."
     if tool_name == "get_call_transcripts":
-        return "Gesprekstranscripts ophalen."
+        fn, q = get("filename"), get("query")
+        if fn:
+            return f"Gesprekstranscript lezen: {fn}"
+        return f"Gesprekstranscripts doorzoeken op: {q}" if q else "Gesprekstranscripts ophalen."
     for key, val in kwargs.items():
         v = _trunc(str(val))
         if v:
@@ -129,7 +172,7 @@ def _make_recording_tool(inner_tool: Any, steps_ctx: ContextVar) -> BaseTool:
         description: str = tool_description
         args_schema: type = tool_schema
 
-        def _run(self, **kwargs: Any) -> str:
+        def _record(self, kwargs: dict[str, Any]) -> None:
             steps = ctx.get()
             if isinstance(steps, list):
                 summary = ", ".join(f"{k}={str(v)}" for k, v in kwargs.items())
@@ -139,66 +182,15 @@ def _make_recording_tool(inner_tool: Any, steps_ctx: ContextVar) -> BaseTool:
                     "summary": summary or None,
                     "display_label": display_label,
                 })
+
+        def _run(self, **kwargs: Any) -> str:
+            check_stop()  # geen nieuwe tool-aanroepen (mails, herinneringen, …) meer na het stopsignaal
+            self._record(kwargs)
             return inner._run(**kwargs)
 
     return RecordingTool()
 
 
-_KNOWLEDGE_DIR = Path(__file__).resolve().parent / "knowledge"
-_MEMORY_DIR = Path(__file__).resolve().parent / "memory"
-_WEEKDAYS_NL = ["Maandag", "Dinsdag", "Woensdag", "Donderdag", "Vrijdag", "Zaterdag", "Zondag"]
-
-
-def _now_with_weekday() -> str:
-    """Huidige datum en tijd met weekdag ervoor, bijv. Woensdag 2025-02-12 14:30:00."""
-    dt = datetime.now()
-    return f"{_WEEKDAYS_NL[dt.weekday()]} {dt.strftime('%Y-%m-%d %H:%M:%S')}"
-
-
-def _get_knowledge_filenames() -> list[str]:
-    """Lijst van .md en .txt bestandsnamen in knowledge/."""
-    if not _KNOWLEDGE_DIR.is_dir():
-        return []
-    names = []
-    for ext in ("*.md", "*.txt"):
-        names.extend(f.name for f in _KNOWLEDGE_DIR.glob(ext) if f.is_file())
-    return sorted(names)
-
-
-def _get_memory_filenames() -> list[str]:
-    """Lijst van .md bestandsnamen in memory/."""
-    if not _MEMORY_DIR.is_dir():
-        return []
-    return sorted(f.name for f in _MEMORY_DIR.glob("*.md") if f.is_file())
-
-
-def _memory_filename_date(filename: str) -> datetime | None:
-    """Parse datum uit bestandsnaam DD-MM-YYYY_HH-MM_slug.md. Retourneert datetime op 0:00 of None."""
-    if not filename or len(filename) < 10:
-        return None
-    try:
-        part = filename[:10]  # DD-MM-YYYY
-        d, m, y = int(part[0:2]), int(part[3:5]), int(part[6:10])
-        return datetime(y, m, d)
-    except (ValueError, IndexError):
-        return None
-
-
-def _get_memory_filenames_last_month() -> list[str]:
-    """Lijst van .md herinneringen met datum in de bestandsnaam binnen de laatste 30 dagen (voor context aan Sonja)."""
-    if not _MEMORY_DIR.is_dir():
-        return []
-    cutoff = datetime.now() - timedelta(days=30)
-    names = []
-    for f in _MEMORY_DIR.glob("*.md"):
-        if not f.is_file():
-            continue
-        dt = _memory_filename_date(f.name)
-        if dt is not None and dt >= cutoff:
-            names.append(f.name)
-    return sorted(names)
-
-
 def _build_sonja_agent(steps_ctx: ContextVar | None = None) -> Agent:
     all_tools = [
         serper_search_tool,
@@ -242,70 +234,159 @@ def _build_sonja_agent(steps_ctx: ContextVar | None = None) -> Agent:
             "sociaal (informeel, humor, aandacht voor de persoon — Familie), leergierig (feedback opslaan en beter worden). "
             "Hoe je werkt: (1) Eerst vragen stellen — wat wil iemand bereiken, voor wie? (2) Met die context aan de slag; Doen, niet lullen. "
             "(3) Feedback en leerpunten opslaan als herinnering met write_to_memory (titel + inhoud; één bestand per herinnering). "
-            "Tools: read_file voor knowledge/ of memory/ (memory/bestandsnaam), rag_search voor knowledge en herinneringen, write_to_memory om een nieuw bestand in memory/ aan te maken. "
+            "Tools: read_file voor knowledge/ of memory/ (memory/bestandsnaam; bij grote documenten eerst toc=true en dan section), rag_search voor knowledge en herinneringen, write_to_memory om een nieuw bestand in memory/ aan te maken. "
             "Agenda: list_agenda_items, get_agenda_item (laatste run/antwoord bekijken), add_agenda_item, update_agenda_item, delete_agenda_item; bij geplande taken send_email voor het resultaat. get_call_transcripts voor klantgesprek-transcripts. "
             "Subagents roep je aan via tools (bijv. spy_competitor_research). Antwoord altijd in het Nederlands."
         ),
         tools=all_tools,
+        step_callback=_stop_step_callback,
         verbose=True,
         allow_delegation=False,
     )
 
 
 def _build_prompt(message: str, context: str) -> str:
-    """Bouwt de prompt met datum, knowledge-hint en optioneel chatcontext."""
+    """Bouwt de prompt met een begrensde header (datum, aantallen, recente en relevante bestanden) en optioneel chatcontext."""
     prompt = message
     if context and context.strip():
         prompt = (
             f"Chatgeschiedenis (eerdere berichten in dit gesprek):\n\n{context.strip()}\n\n"
             f"Nieuw bericht van de gebruiker: {message}"
         )
-    now = _now_with_weekday()
-    knowledge_files = _get_knowledge_filenames()
-    memory_files_recent = _get_memory_filenames_last_month()
-    context_lines = [f"[Huidige datum en tijd: {now}.]"]
-    if knowledge_files:
-        context_lines.append(
-            f"[Kennis: er zijn knowledge-bestanden beschikbaar (bestanden: {', '.join(knowledge_files)}). "
-            "Gebruik read_file met de bestandsnaam of rag_search om semantisch te zoeken.]"
-        )
-    if memory_files_recent:
-        context_lines.append(
-            f"[Geheugen: recente herinneringen (laatste maand, bestanden: {', '.join(memory_files_recent)}). "
-            "Gebruik read_file met memory/bestandsnaam om een herinnering te lezen, of rag_search om in alle herinneringen te zoeken.]"
-        )
-    return "\n\n".join(context_lines) + "\n\n" + prompt
+    return build_header(message) + "\n\n" + prompt
+
+
+def _prefetch_enabled() -> bool:
+    return os.getenv("RAG_PREFETCH", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+async def _rag_prefetch(message: str) -> list[dict] | None:
+    """Zoek op het bericht binnen _PREFETCH_TIMEOUT_SEC; None bij timeout of fout (de agent zoekt dan zelf)."""
+    try:
+        return await asyncio.wait_for(rag_search_async(message, limit=_PREFETCH_LIMIT), _PREFETCH_TIMEOUT_SEC)
+    except Exception:
+        return None
+
+
+def _prefetch_block(results: list[dict]) -> str:
+    parts = []
+    for r in results:
+        content = (r.get("content") or "").strip()
+        if len(content) > _PREFETCH_CHARS_PER_RESULT:
+            content = content[:_PREFETCH_CHARS_PER_RESULT].rstrip() + " …"
+        parts.append(f"[Bestand: {r.get('filename', '')}]\n{content}")
+    return (
+        "[Vooraf opgehaald uit kennis en geheugen (rag_search op dit bericht). Gebruik dit als het volstaat; "
+        "roep rag_search alleen aan voor iets anders of als je meer nodig hebt. Lees een volledig bestand met read_file.]\n\n"
+        + "\n\n---\n\n".join(parts)
+    )
+
+
+def _usage_metrics(result) -> dict | None:
+    """Tokengebruik uit een kickoff-resultaat (usage_metrics of token_usage, dict of pydantic-model)."""
+    usage = getattr(result, "usage_metrics", None) or getattr(result, "token_usage", None)
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    return dict(usage) if isinstance(usage, dict) else None
 
 
 class SonjaAssistant:
-    """Eén CrewAI-agent met alle tools. chat = sync (agenda-thread); chat_async_with_list = async + gedeelde steps (streaming)."""
+    """Eén CrewAI-agent met alle tools. chat = sync (threads); chat_async_with_list = async + gedeelde steps (streaming, agenda-runs)."""
 
     def __init__(self):
         self._steps_ctx: ContextVar = ContextVar("sonja_steps", default=[])
-        self.agent = _build_sonja_agent(steps_ctx=self._steps_ctx)
-
-    def chat(self, message: str, context: str = "") -> tuple[str, list[dict]]:
-        """Sync run: één bericht, retourneert (antwoord, denkstappen). Voor gebruik in threads (bijv. agenda-scheduler), waar async niet nodig is."""
+        self._agent: Agent | None = None
+        self._agent_lock = threading.Lock()
+
+    @property
+    def agent(self) -> Agent:
+        """De agent wordt bij het eerste gebruik opgebouwd; bij de async chat parallel aan de RAG-prefetch."""
+        with self._agent_lock:
+            if self._agent is None:
+                self._agent = _build_sonja_agent(steps_ctx=self._steps_ctx)
+            return self._agent
+
+    def chat(self, message: str, context: str = "", usage: dict | None = None) -> tuple[str, list[dict]]:
+        """Sync run: één bericht, retourneert (antwoord, denkstappen). Voor gebruik in threads (bijv. agenda-scheduler), waar async niet nodig is.
+        usage: optionele dict die het tokengebruik van deze run krijgt (per run, niet op de gedeelde instantie)."""
         steps_list: list[dict] = []
         token = self._steps_ctx.set(steps_list)
+        batch = begin_memory_batch()
         try:
             prompt = _build_prompt(message, context)
             result = self.agent.kickoff(messages=prompt)
+            if usage is not None:
+                usage.update(_usage_metrics(result) or {})
             response = result.raw if hasattr(result, "raw") else str(result)
             return response, list(steps_list)
         finally:
+            index_memory_files(end_memory_batch(batch))
             self._steps_ctx.reset(token)
 
     async def chat_async_with_list(
-        self, message: str, context: str, steps_list: list[dict]
+        self,
+        message: str,
+        context: str,
+        steps_list: list[dict],
+        prefetch: bool | None = None,
+        stop: threading.Event | None = None,
+        usage: dict | None = None,
     ) -> str:
-        """Async run waarbij de caller een gedeelde steps_list meegeeft; stappen verschijnen erin tijdens de run. Nodig voor SSE-streaming (stappen live naar de client). Retourneert alleen het antwoord."""
+        """Async run waarbij de caller een gedeelde steps_list meegeeft; stappen verschijnen erin tijdens de run. Nodig voor SSE-streaming (stappen live naar de client). Retourneert alleen het antwoord.
+        prefetch (default RAG_PREFETCH): zoek op het bericht terwijl agent en prompt worden opgebouwd en geef de
+        beste resultaten mee als context, zodat de agent vaak geen aparte rag_search-beurt nodig heeft.
+        De stap rag_prefetch legt het aantal hits vast; na de run volgt een aparte stap rag_prefetch_result die vastlegt
+        of de agent toch rag_search aanriep (de eerste stap is dan al gestreamd en wordt niet meer gewijzigd).
+        stop: zodra gezet stopt de run bij de volgende tool-aanroep of agent-stap met RunCancelled.
+        usage: optionele dict die het tokengebruik van deze run krijgt (veilig bij gelijktijdige runs op de singleton).
+        Herinneringen (write_to_memory) worden na de run in één batch geïndexeerd."""
         token = self._steps_ctx.set(steps_list)
+        stop_token = _stop_ctx.set(stop)
+        batch = begin_memory_batch()
         try:
-            prompt = _build_prompt(message, context)
-            result = await self.agent.kickoff_async(messages=prompt)
+            use_prefetch = _prefetch_enabled() if prefetch is None else prefetch
+            use_prefetch = use_prefetch and 0 < len(message.strip()) <= _PREFETCH_MAX_QUERY_CHARS
+            prefetch_task = asyncio.create_task(_rag_prefetch(message)) if use_prefetch else None
+            agent, prompt = await asyncio.to_thread(lambda: (self.agent, _build_prompt(message, context)))
+            prefetch_at = None  # index van de rag_prefetch-stap
+            if prefetch_task is not None:
+                results = await prefetch_task
+                hits = len(results or [])
+                prefetch_at = len(steps_list)
+                steps_list.append({
+                    "tool": "rag_prefetch",
+                    "summary": f"hits={hits}" if results is not None else "timeout/fout",
+                    "display_label": (
+                        f"Vooraf gezocht in kennis en geheugen: {hits} resultaat{'en' if hits != 1 else ''}."
+                        if results is not None
+                        else "Vooraf zoeken in kennis en geheugen overgeslagen."
+                    ),
+                    "hits": hits,
+                })
+                if results:
+                    prompt = _prefetch_block(results) + "\n\n" + prompt
+            check_stop()
+            result = await agent.kickoff_async(messages=prompt)
+            if usage is not None:
+                usage.update(_usage_metrics(result) or {})
+            if prefetch_at is not None:
+                called = any(s.get("tool") == "rag_search" for s in steps_list[prefetch_at + 1:])
+                steps_list.append({
+                    "tool": "rag_prefetch_result",
+                    "summary": f"rag_search_called={str(called).lower()}",
+                    "display_label": (
+                        "Na het vooraf zoeken toch zelf in kennis en geheugen gezocht."
+                        if called
+                        else "Vooraf gezochte kennis volstond; geen extra zoekactie nodig."
+                    ),
+                    "rag_search_called": called,
+                })
             return result.raw if hasattr(result, "raw") else str(result)
         finally:
+            await asyncio.to_thread(index_memory_files, end_memory_batch(batch))
+            _stop_ctx.reset(stop_token)
             self._steps_ctx.reset(token)
 
 
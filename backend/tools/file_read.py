@@ -5,8 +5,14 @@ Lees een bestand uit de knowledge-directory of de memory-directory.
 - Pad memory/... (bijv. memory/12-02-2026_11-51_marketing-vergadering.md) → leest uit memory/
 
 Beperkt tot deze twee mappen voor security.
+
+Grote documenten: toc=True geeft de inhoudsopgave (koppen met positie en grootte), section leest één
+sectie (kop + subkoppen), offset/max_chars leest een stuk tekst. Inhoud en koppen komen uit een LRU-cache
+met sleutel (pad, mtime, grootte), zodat herhaald lezen niet opnieuw de schijf op gaat.
 """
 
+import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Type
 
@@ -16,12 +22,28 @@ from pydantic import BaseModel, Field
 _KNOWLEDGE_DIR = Path(__file__).resolve().parent.parent / "knowledge"
 _MEMORY_DIR = Path(__file__).resolve().parent.parent / "memory"
 
+_DEFAULT_MAX_CHARS = 20000  # zonder section/max_chars: maximaal zoveel tekens per aanroep (daarna offset gebruiken)
+_CACHE_SIZE = 64
+
 
 class ReadFileInput(BaseModel):
     """Input voor read_file."""
     file_path: str = Field(
         description="Bestandsnaam in knowledge/ (bijv. afas_info.md) of pad memory/bestandsnaam (bijv. memory/12-02-2026_11-51_titel.md) voor een herinnering."
     )
+    section: str | None = Field(
+        default=None,
+        description="Optioneel: kop (of deel van een kop) van de sectie die je wilt lezen; retourneert die sectie inclusief subkoppen.",
+    )
+    toc: bool = Field(
+        default=False,
+        description="Optioneel: true om alleen de inhoudsopgave (koppen met positie en lengte) te krijgen in plaats van de tekst.",
+    )
+    offset: int = Field(default=0, description="Optioneel: startpositie in tekens (voor het vervolg van een lang document).")
+    max_chars: int | None = Field(
+        default=None,
+        description=f"Optioneel: maximaal aantal tekens om te lezen (default {_DEFAULT_MAX_CHARS}).",
+    )
 
 
 def _resolve_path(file_path: str) -> Path | None:
@@ -37,29 +59,125 @@ def _resolve_path(file_path: str) -> Path | None:
     return None
 
 
+def _parse_headings(text: str) -> list[tuple[int, str, int, int]]:
+    """Markdown-koppen buiten code blocks → [(niveau, titel, start, eind)]; eind = begin volgende kop van gelijk of hoger niveau."""
+    found: list[tuple[int, str, int]] = []
+    in_code = False
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_code = not in_code
+        elif not in_code:
+            m = re.match(r"(#{1,6})\s+(.+?)\s*#*\s*$", stripped)
+            if m:
+                found.append((len(m.group(1)), m.group(2), pos))
+        pos += len(line)
+    headings = []
+    for i, (level, title, start) in enumerate(found):
+        end = len(text)
+        for next_level, _, next_start in found[i + 1:]:
+            if next_level <= level:
+                end = next_start
+                break
+        headings.append((level, title, start, end))
+    return headings
+
+
+@lru_cache(maxsize=_CACHE_SIZE)
+def _load(path_str: str, mtime_ns: int, size: int) -> tuple[str, tuple]:
+    """Inhoud + koppen; mtime en grootte zitten in de sleutel, dus een gewijzigd bestand is automatisch een cache-miss."""
+    text = Path(path_str).read_text(encoding="utf-8", errors="replace")
+    return text, tuple(_parse_headings(text))
+
+
+@lru_cache(maxsize=4)
+def _list_dir(dir_str: str, mtime_ns: int) -> str:
+    """Bestandsnamen in een map (voor de niet-gevonden-melding); opnieuw opgebouwd zodra de map wijzigt."""
+    return ", ".join(sorted(f.name for f in Path(dir_str).iterdir() if f.is_file())) or "geen"
+
+
+def _available(dir_path: Path) -> str:
+    if not dir_path.is_dir():
+        return "geen"
+    return _list_dir(str(dir_path), dir_path.stat().st_mtime_ns)
+
+
+def _format_toc(name: str, text: str, headings: tuple) -> str:
+    if not headings:
+        return f"{name}: geen koppen gevonden ({len(text)} tekens). Lees met offset/max_chars."
+    lines = [f"Inhoudsopgave {name} ({len(text)} tekens):"]
+    for level, title, start, end in headings:
+        lines.append(f"{'  ' * (level - 1)}- {title} (offset {start}, {end - start} tekens)")
+    lines.append("Gebruik section met een kop of offset/max_chars om een deel te lezen.")
+    return "\n".join(lines)
+
+
+def _find_section(headings: tuple, section: str) -> tuple | None:
+    wanted = section.strip().lower()
+    for h in headings:
+        if h[1].lower() == wanted:
+            return h
+    for h in headings:
+        if wanted in h[1].lower():
+            return h
+    return None
+
+
 class ReadFileTool(BaseTool):
     """Lees de inhoud van een bestand uit knowledge/ of memory/."""
     name: str = "read_file"
     description: str = (
-        "Lees de volledige inhoud van een bestand uit de knowledge base (knowledge/) of een herinnering (memory/). "
-        "Geef een bestandsnaam op voor knowledge (bijv. afas_info.md) of memory/bestandsnaam voor een herinnering (bijv. memory/12-02-2026_11-51_titel.md)."
+        "Lees een bestand uit de knowledge base (knowledge/) of een herinnering (memory/). "
+        "Geef een bestandsnaam op voor knowledge (bijv. afas_info.md) of memory/bestandsnaam voor een herinnering (bijv. memory/12-02-2026_11-51_titel.md). "
+        "Bij grote documenten: eerst toc=true voor de inhoudsopgave, daarna section (kop) of offset/max_chars om alleen het nodige deel te lezen."
     )
     args_schema: Type[BaseModel] = ReadFileInput
 
-    def _run(self, file_path: str) -> str:
+    def _run(
+        self,
+        file_path: str,
+        section: str | None = None,
+        toc: bool = False,
+        offset: int = 0,
+        max_chars: int | None = None,
+    ) -> str:
         full = _resolve_path(file_path)
         if full is None:
             return "Fout: gebruik een bestandsnaam (knowledge/) of memory/bestandsnaam (herinnering)."
         if not full.is_file():
             if str(_MEMORY_DIR) in str(full):
-                available = ", ".join(f.name for f in _MEMORY_DIR.iterdir() if f.is_file()) if _MEMORY_DIR.is_dir() else "geen"
-                return f"Bestand niet gevonden in memory/: {full.name}. Beschikbaar: {available}."
-            available = ", ".join(f.name for f in _KNOWLEDGE_DIR.iterdir() if f.is_file()) if _KNOWLEDGE_DIR.is_dir() else "geen"
-            return f"Bestand niet gevonden: {full.name}. Beschikbare bestanden in knowledge/: {available}."
+                return f"Bestand niet gevonden in memory/: {full.name}. Beschikbaar: {_available(_MEMORY_DIR)}."
+            return f"Bestand niet gevonden: {full.name}. Beschikbare bestanden in knowledge/: {_available(_KNOWLEDGE_DIR)}."
         try:
-            return full.read_text(encoding="utf-8", errors="replace")
+            st = full.stat()
+            text, headings = _load(str(full), st.st_mtime_ns, st.st_size)
         except Exception as e:
             return f"Kon bestand niet lezen: {e}"
+        if toc:
+            return _format_toc(full.name, text, headings)
+        base, end = 0, len(text)
+        prefix = ""
+        if section and section.strip():
+            found = _find_section(headings, section)
+            if found is None:
+                return f"Sectie '{section}' niet gevonden in {full.name}.\n\n" + _format_toc(full.name, text, headings)
+            _, title, base, end = found
+            prefix = f"[Sectie: {title}]\n"
+        # offset is relatief t.o.v. het begin van het bestand, of van de sectie als section is opgegeven
+        start = min(base + max(0, offset or 0), end)
+        limit = max_chars if max_chars and max_chars > 0 else _DEFAULT_MAX_CHARS
+        stop = min(end, start + limit)
+        chunk = text[start:stop]
+        if start == 0 and stop == len(text):
+            return chunk
+        suffix = ""
+        if stop < end:
+            suffix = (
+                f"\n\n[… afgekapt: tekens {start}-{stop} van {len(text)}. "
+                f"Lees verder met offset={stop - base}{' en dezelfde section' if prefix else ''}, of gebruik toc=true.]"
+            )
+        return prefix + chunk + suffix
 
 
 file_read_tool = ReadFileTool()
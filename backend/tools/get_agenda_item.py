@@ -1,5 +1,5 @@
 """
-Haal één agenda-item op op id. Sonja kan zo de last_run_ velden bekijken (laatste uitvoering, antwoord, denkstappen).
+Haal één agenda-item op op id. Sonja kan zo de laatste uitvoering bekijken (status, antwoord, denkstappen uit de run-historie).
 """
 
 import sys
@@ -12,7 +12,7 @@ from pydantic import BaseModel, Field
 _backend = Path(__file__).resolve().parent.parent
 if str(_backend) not in sys.path:
     sys.path.insert(0, str(_backend))
-from agenda import get_item as agenda_get_item  # noqa: E402
+from agenda import get_item as agenda_get_item, get_run as agenda_get_run  # noqa: E402
 
 
 class GetAgendaItemInput(BaseModel):
@@ -23,7 +23,7 @@ class GetAgendaItemTool(BaseTool):
     name: str = "get_agenda_item"
     description: str = (
         "Haal één agenda-item op op id. Retourneert titel, prompt, type, schedule en de laatste uitvoering: "
-        "last_run_at, last_run_response (antwoord van Sonja) en last_run_steps (denkstappen). "
+        "tijdstip, status, duur, het antwoord van Sonja en de denkstappen. "
         "Gebruik dit om te zien wat er bij de laatste run is gebeurd of welk antwoord/resultaat er is opgeslagen."
     )
     args_schema: Type[BaseModel] = GetAgendaItemInput
@@ -41,18 +41,23 @@ class GetAgendaItemTool(BaseTool):
             f"Created at: {item.created_at}",
         ]
         lines.append("--- Laatste uitvoering ---")
+        run = agenda_get_run(item.id, item.last_run_id) if item.last_run_id else None
         if item.last_run_at:
             lines.append(f"Last run at: {item.last_run_at}")
-            if item.last_run_response:
-                lines.append(f"Last run response:\n{item.last_run_response}")
+            if item.last_run_status:
+                lines.append(f"Status: {item.last_run_status}")
+            if run is None:
+                lines.append("Details van de laatste run: (niet meer beschikbaar)")
+            elif run.status == "error":
+                lines.append(f"Fout: {run.error}")
             else:
-                lines.append("Last run response: (geen)")
-            if item.last_run_steps:
+                lines.append(f"Last run response:\n{run.response}" if run.response else "Last run response: (geen)")
+            if run is not None and run.steps:
                 lines.append("Last run steps (denkstappen):")
-                for i, step in enumerate(item.last_run_steps, 1):
+                for i, step in enumerate(run.steps, 1):
                     label = step.get("display_label") or step.get("summary") or step.get("tool", "?")
                     lines.append(f"  {i}. {label}")
-            else:
+            elif run is not None:
                 lines.append("Last run steps: (geen)")
         else:
             lines.append("Nog niet uitgevoerd (geen last_run_at).")
@@ -1,49 +1,105 @@
 """
 Haal klantgesprek-transcripts op uit opslag.
 
-Momenteel: leest alle .txt- en .md-bestanden uit backend/call_transcripts/
-en retourneert de geconcateneerde inhoud aan Sonja.
+Momenteel: doorzoekt de .txt- en .md-bestanden in backend/call_transcripts/ via een metadata- en
+full-text-index (transcripts.py). Retourneert per pagina alleen metadata en relevante fragmenten, zodat de
+output begrensd blijft hoeveel transcripts er ook zijn; met filename lees je (een stuk van) één transcript.
 Later: ophalen via transcript-platform-API.
 """
 
+import sys
 from pathlib import Path
+from typing import Type
 
 from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
 
+_backend = Path(__file__).resolve().parent.parent
+if str(_backend) not in sys.path:
+    sys.path.insert(0, str(_backend))
+from transcripts import read_transcript, search_transcripts  # noqa: E402
 
-_CALL_TRANSCRIPTS_DIR = Path(__file__).resolve().parent.parent / "call_transcripts"
+_MAX_PAGE_SIZE = 10
+_MAX_READ_CHARS = 8000
 
 
-def _read_transcripts() -> str:
-    """Lees alle .txt en .md bestanden uit call_transcripts/; retourneer één string."""
-    if not _CALL_TRANSCRIPTS_DIR.is_dir():
-        return "Geen call_transcripts-map gevonden. Zet transcripts in backend/call_transcripts/ (.txt of .md)."
-    parts: list[str] = []
-    for ext in ("*.txt", "*.md"):
-        for path in sorted(_CALL_TRANSCRIPTS_DIR.glob(ext)):
-            if path.is_file():
-                try:
-                    parts.append(f"--- {path.name} ---\n{path.read_text(encoding='utf-8', errors='replace').strip()}")
-                except Exception as e:
-                    parts.append(f"--- {path.name} (fout: {e}) ---\n[kon niet lezen]")
-    if not parts:
-        return "Geen .txt of .md bestanden in call_transcripts/. Zet daar bestanden met transcripts om te testen."
-    return "\n\n".join(parts)
+class GetCallTranscriptsInput(BaseModel):
+    query: str | None = Field(default=None, description="Optioneel: zoektermen (bijv. 'prijs ontevreden' of een productnaam).")
+    customer: str | None = Field(default=None, description="Optioneel: (deel van de) klantnaam.")
+    date_from: str | None = Field(default=None, description="Optioneel: vanaf datum (YYYY-MM-DD).")
+    date_to: str | None = Field(default=None, description="Optioneel: tot en met datum (YYYY-MM-DD).")
+    page: int = Field(default=1, description="Paginanummer (1 = eerste pagina).")
+    page_size: int = Field(default=5, description=f"Aantal transcripts per pagina (max {_MAX_PAGE_SIZE}).")
+    filename: str | None = Field(
+        default=None,
+        description="Optioneel: lees één transcript (bestandsnaam uit de resultaten); gebruik offset voor het vervolg.",
+    )
+    offset: int = Field(default=0, description="Bij filename: startpositie in tekens.")
+
+
+def _read_one(filename: str, offset: int) -> str:
+    result = read_transcript(filename.strip(), offset=offset, max_chars=_MAX_READ_CHARS)
+    if result is None:
+        return f"Transcript niet gevonden: {filename}. Zoek eerst zonder filename om beschikbare transcripts te zien."
+    text, total = result
+    end = min(total, max(0, offset) + len(text))
+    out = f"--- {filename} (tekens {max(0, offset)}-{end} van {total}) ---\n{text.strip()}"
+    if end < total:
+        out += f"\n\n[… vervolg met filename={filename} en offset={end}]"
+    return out
 
 
 class GetCallTranscriptsTool(BaseTool):
-    """Fetch customer call transcripts from storage."""
+    """Search customer call transcripts in storage."""
 
     name: str = "get_call_transcripts"
     description: str = (
-        "Haal alle beschikbare klantgesprek-transcripts op. Retourneert de volledige tekst van alle transcripts. "
-        "Gebruik wanneer iemand vraagt om call-transcripts, gesprekken met klanten, of analyses daarop. "
-        "Momenteel: leest uit de lokale map call_transcripts/. Later: wordt vervangen door transcript-platform-API."
+        "Doorzoek klantgesprek-transcripts. Geef optioneel query (zoektermen), customer, date_from/date_to (YYYY-MM-DD) "
+        "en page/page_size; retourneert per transcript datum, klant, grootte en de relevante fragmenten (geen volledige teksten). "
+        "Met filename (en offset) lees je een specifiek transcript. "
+        "Gebruik wanneer iemand vraagt om call-transcripts, gesprekken met klanten, of analyses daarop."
     )
+    args_schema: Type[BaseModel] = GetCallTranscriptsInput
 
-    def _run(self, **kwargs: object) -> str:
-        """Returns string containing all transcripts. No arguments required."""
-        return _read_transcripts()
+    def _run(
+        self,
+        query: str | None = None,
+        customer: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        page: int = 1,
+        page_size: int = 5,
+        filename: str | None = None,
+        offset: int = 0,
+        **kwargs: object,
+    ) -> str:
+        if filename and filename.strip():
+            return _read_one(filename, offset)
+        page = max(1, page or 1)
+        page_size = min(max(1, page_size or 5), _MAX_PAGE_SIZE)
+        try:
+            total, rows = search_transcripts(
+                query=query,
+                date_from=(date_from or "").strip() or None,
+                date_to=(date_to or "").strip() or None,
+                customer=customer,
+                limit=page_size,
+                offset=(page - 1) * page_size,
+            )
+        except Exception as e:
+            return f"Kon transcripts niet doorzoeken: {e}"
+        if total == 0:
+            return "Geen transcripts gevonden voor deze zoekopdracht. Zet transcripts in backend/call_transcripts/ (.txt of .md) of verruim de filters."
+        pages = (total + page_size - 1) // page_size
+        lines = [f"{total} transcript(s) gevonden — pagina {page} van {pages}."]
+        for r in rows:
+            excerpt = " ".join((r.get("excerpt") or "").split())
+            lines.append(
+                f"--- {r['filename']} | datum: {r['date']} | klant: {r['customer'] or 'onbekend'} | {r['size']} bytes ---\n{excerpt}"
+            )
+        if page < pages:
+            lines.append(f"[Meer resultaten: page={page + 1}. Lees een volledig transcript met filename.]")
+        return "\n\n".join(lines)
 
 
 get_call_transcripts_tool = GetCallTranscriptsTool()
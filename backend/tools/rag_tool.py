@@ -1,7 +1,9 @@
 """
 Custom RAG: Qdrant (één collection) + Voyage embeddings.
 
-- Kennis (knowledge/): bestanden gechunkt (~3000 tekens, overlap 200), metadata = filename.
+- Kennis (knowledge/): bestanden gechunkt (~3000 tekens, overlap 200), metadata = filename(s).
+  Identieke en bijna-identieke chunks (boilerplate over bestanden heen) worden één keer opgeslagen
+  met een lijst bronbestanden (filenames); zoekresultaten worden ook gededupliceerd.
 - Geheugen (memory/): 1 vector per herinnering, metadata = filename, date (ISO), title (uit bestandsnaam).
 
 Qdrant moet draaien voordat je de zoekindex vernieuwt of RAG gebruikt. Start bijvoorbeeld in een terminal:
@@ -9,12 +11,20 @@ Qdrant moet draaien voordat je de zoekindex vernieuwt of RAG gebruikt. Start bij
 (Backend kan gewoon lokaal draaien; alleen de vectordb draait in de container.)
 
 Env: VOYAGEAI_API_KEY, QDRANT_URL (default http://localhost:6333).
+
+Indexeren en de rag_search-tool gebruiken de sync clients (CrewAI voert tools sync uit, in een worker-thread).
+rag_search_async (AsyncQdrantClient + voyageai.AsyncClient) is er voor zoeken vanuit de event loop zelf, zoals de
+speculatieve prefetch in sonja.chat_async_with_list, zodat die geen thread bezet.
 """
 
+import asyncio
+import hashlib
 import logging
 import os
+import random
 import re
 import uuid
+import weakref
 from pathlib import Path
 from typing import Iterator, Type
 
@@ -36,6 +46,20 @@ _RAG_EXTENSIONS = (".md", ".txt")
 _SEARCH_LIMIT = 10
 _SIMILARITY_THRESHOLD = 0.5
 
+# Batch-indexeren (rag_add_files): max teksten per Voyage-call en punten per Qdrant-upsert
+_EMBED_BATCH_SIZE = 128
+_UPSERT_BATCH_SIZE = 256
+
+# Deduplicatie kennis-chunks: exact via content hash, bijna-gelijk via MinHash (64 permutaties, 16 LSH-banden × 4)
+_SHINGLE_SIZE = 5
+_MINHASH_NUM_PERM = 64
+_LSH_BANDS = 16
+_NEAR_DUPLICATE_THRESHOLD = 0.85  # geschatte Jaccard-similarity vanaf waar een chunk als duplicaat telt
+_MERSENNE_PRIME = (1 << 61) - 1
+_MINHASH_SEED = 20240601  # vast, zodat signatures tussen processen en herstarts vergelijkbaar blijven
+_KEYWORD_INDEX_FIELDS = ("content_hash", "lsh", "filenames")
+_SEARCH_OVERFETCH = 2  # haal limit × dit op, zodat er na dedupliceren genoeg unieke resultaten overblijven
+
 # ─── Config ───────────────────────────────────────────────────────────────────
 
 
@@ -110,8 +134,15 @@ def _embed(texts: list[str], input_type: str = "document") -> list[list[float]]:
     if not api_key:
         raise RuntimeError("VOYAGEAI_API_KEY niet gezet")
     vo = voyageai.Client(api_key=api_key)
-    model = os.getenv("VOYAGEAI_EMBEDDING_MODEL", "voyage-4")
-    out = vo.embed(texts, model=model, input_type=input_type)
+    out = vo.embed(texts, model=_embedding_model(), input_type=input_type)
+    return _embeddings_from(out)
+
+
+def _embedding_model() -> str:
+    return os.getenv("VOYAGEAI_EMBEDDING_MODEL", "voyage-4")
+
+
+def _embeddings_from(out) -> list[list[float]]:
     return getattr(out, "embeddings", out) if hasattr(out, "embeddings") else list(out)
 
 
@@ -132,93 +163,302 @@ def _ensure_collection(client) -> None:
             collection_name=_COLLECTION_NAME,
             vectors_config=VectorParams(size=_VECTOR_SIZE, distance=Distance.COSINE),
         )
+        _create_payload_indexes(client)
         logger.info("RAG: Qdrant collection aangemaakt: %s", _COLLECTION_NAME)
 
 
-def _delete_by_filename_and_type(client, filename: str, doc_type: str) -> None:
+def _create_payload_indexes(client) -> None:
+    """Keyword-indexen voor de dedup-lookups (content_hash, lsh) en bronbestanden (filenames)."""
+    for field in _KEYWORD_INDEX_FIELDS:
+        client.create_payload_index(collection_name=_COLLECTION_NAME, field_name=field, field_schema="keyword")
+
+
+def _filename_type_selector(filename: str, doc_type: str):
     from qdrant_client.models import FieldCondition, Filter, MatchValue, FilterSelector
+    return FilterSelector(
+        filter=Filter(
+            must=[
+                FieldCondition(key="type", match=MatchValue(value=doc_type)),
+                FieldCondition(key="filename", match=MatchValue(value=filename)),
+            ]
+        )
+    )
+
+
+def _delete_by_filename_and_type(client, filename: str, doc_type: str) -> None:
     client.delete(
         collection_name=_COLLECTION_NAME,
-        points_selector=FilterSelector(
-            filter=Filter(
-                must=[
-                    FieldCondition(key="type", match=MatchValue(value=doc_type)),
-                    FieldCondition(key="filename", match=MatchValue(value=filename)),
-                ]
-            )
-        ),
+        points_selector=_filename_type_selector(filename, doc_type),
     )
 
 
+def _scroll_all(client, scroll_filter, with_vectors: bool = False) -> list:
+    """Alle punten (met payload, standaard zonder vectoren) die aan het filter voldoen."""
+    out = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=_COLLECTION_NAME,
+            scroll_filter=scroll_filter,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=with_vectors,
+        )
+        out.extend(points)
+        if offset is None:
+            return out
+
+
 def _memory_point_id(filename: str) -> str:
     """Stable UUID voor één herinnering zodat upsert overschrijft. Qdrant accepteert alleen UUID of integer."""
     return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"sonja.memory.{filename}"))
 
 
-def _knowledge_point_id(file_path: str, chunk_index: int) -> str:
-    """Stable UUID per kennis-chunk. Qdrant accepteert alleen UUID of integer."""
-    return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"sonja.knowledge.{file_path}:{chunk_index}"))
+def _knowledge_point_id(content_hash: str) -> str:
+    """Stable UUID per unieke kennis-chunk (op inhoud, niet op bestand): dezelfde tekst in twee bestanden is één punt."""
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, f"sonja.knowledge.{content_hash}"))
 
 
-# ─── Indexeren ───────────────────────────────────────────────────────────────
+# ─── Deduplicatie (exact: content hash; bijna-gelijk: MinHash over woord-shingles + LSH) ──
 
 
-def _index_knowledge_file(client, path: Path) -> int:
-    """Chunk bestand, embed, upsert. Retourneert aantal chunks."""
-    path_str = str(path.resolve())
-    filename = path.name
-    try:
-        text = path.read_text(encoding="utf-8", errors="replace")
-    except Exception as e:
-        logger.warning("RAG: kon kennisbestand niet lezen %s: %s", path, e)
-        return 0
-    chunks = _chunk_text(text)
-    if not chunks:
-        return 0
-    vectors = _embed(chunks, input_type="document")
-    from qdrant_client.models import PointStruct
-    points = [
-        PointStruct(
-            id=_knowledge_point_id(path_str, i),
-            vector=vec,
-            payload={
-                "type": "knowledge",
-                "filename": filename,
-                "content": chunk,
-                "chunk_index": i,
-            },
-        )
-        for i, (chunk, vec) in enumerate(zip(chunks, vectors))
+def _normalize_for_hash(text: str) -> str:
+    return re.sub(r"\s+", " ", (text or "").lower()).strip()
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha1(_normalize_for_hash(text).encode("utf-8")).hexdigest()
+
+
+def _make_minhash_perms() -> list[tuple[int, int]]:
+    rng = random.Random(_MINHASH_SEED)
+    return [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(_MINHASH_NUM_PERM)]
+
+
+_MINHASH_PERMS = _make_minhash_perms()
+
+
+def _minhash(text: str) -> list[int]:
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) <= _SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i : i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+    hashes = [int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big") for sh in shingles]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _MINHASH_PERMS]
+
+
+def _lsh_bands(signature: list[int]) -> list[str]:
+    rows = len(signature) // _LSH_BANDS
+    return [
+        f"{band}:" + hashlib.md5(",".join(map(str, signature[band * rows : (band + 1) * rows])).encode()).hexdigest()[:16]
+        for band in range(_LSH_BANDS)
     ]
-    client.upsert(collection_name=_COLLECTION_NAME, points=points)
-    logger.info("RAG: kennis geïndexeerd: %s (%d chunks)", filename, len(points))
-    return len(points)
 
 
-def _index_memory_file(client, path: Path) -> bool:
-    """Eén vector per herinnering; metadata date (ISO) en title uit bestandsnaam."""
-    filename = path.name
+def _minhash_similarity(a: list[int], b: list[int]) -> float:
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _chunk_signature(chunk: str) -> dict:
+    signature = _minhash(chunk)
+    return {"content_hash": _content_hash(chunk), "minhash": signature, "lsh": _lsh_bands(signature)}
+
+
+def _dedup_candidates_filter(signatures: list[dict]):
+    from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue
+    return Filter(
+        must=[FieldCondition(key="type", match=MatchValue(value="knowledge"))],
+        should=[
+            FieldCondition(key="content_hash", match=MatchAny(any=sorted({s["content_hash"] for s in signatures}))),
+            FieldCondition(key="lsh", match=MatchAny(any=sorted({b for s in signatures for b in s["lsh"]}))),
+        ],
+    )
+
+
+def _knowledge_file_filter(filename: str):
+    """Kennispunten met dit bestand als bron (filenames), inclusief oude punten met alleen filename."""
+    from qdrant_client.models import FieldCondition, Filter, MatchValue
+    return Filter(
+        must=[FieldCondition(key="type", match=MatchValue(value="knowledge"))],
+        should=[
+            FieldCondition(key="filenames", match=MatchValue(value=filename)),
+            FieldCondition(key="filename", match=MatchValue(value=filename)),
+        ],
+    )
+
+
+def _point_filenames(payload: dict) -> list[str]:
+    names = payload.get("filenames")
+    if isinstance(names, list) and names:
+        return list(names)
+    return [payload["filename"]] if payload.get("filename") else []
+
+
+class _DedupIndex:
+    """Bekende kennis-chunks (uit Qdrant of net gepland) op content hash en LSH-band, voor één indexeerjob."""
+
+    def __init__(self):
+        self._by_id: dict[str, dict] = {}
+        self._by_hash: dict[str, dict] = {}
+        self._by_band: dict[str, list[dict]] = {}
+
+    def add(self, point_id: str, payload: dict) -> None:
+        point_id = str(point_id)
+        if point_id in self._by_id:
+            return
+        entry = {"id": point_id, "payload": payload}
+        self._by_id[point_id] = entry
+        if payload.get("content_hash"):
+            self._by_hash.setdefault(payload["content_hash"], entry)
+        for band in payload.get("lsh") or []:
+            self._by_band.setdefault(band, []).append(entry)
+
+    def add_points(self, points) -> None:
+        for p in points:
+            self.add(p.id, dict(p.payload or {}))
+
+    def match(self, signature: dict) -> dict | None:
+        exact = self._by_hash.get(signature["content_hash"])
+        if exact is not None:
+            return exact
+        best, best_sim = None, _NEAR_DUPLICATE_THRESHOLD
+        for band in signature["lsh"]:
+            for entry in self._by_band.get(band, []):
+                sim = _minhash_similarity(signature["minhash"], entry["payload"].get("minhash") or [])
+                if sim >= best_sim:
+                    best, best_sim = entry, sim
+        return best
+
+
+def _plan_knowledge_chunks(
+    path: Path, chunks: list[str], signatures: list[dict], index: _DedupIndex
+) -> tuple[list[tuple[str, str, dict]], dict[str, list[str]]]:
+    """Bepaal per chunk: nieuw punt (embedden) of duplicaat van een bestaand punt (alleen bron toevoegen).
+    Retourneert (nieuw: [(point_id, chunk, payload)], bron-updates: {point_id: filenames})."""
+    new: list[tuple[str, str, dict]] = []
+    new_ids: set[str] = set()
+    attach: dict[str, list[str]] = {}
+    for i, (chunk, sig) in enumerate(zip(chunks, signatures)):
+        match = index.match(sig)
+        if match is not None:
+            names = _point_filenames(match["payload"])
+            if path.name not in names:
+                names.append(path.name)
+                match["payload"]["filenames"] = names
+                if match["id"] not in new_ids:
+                    attach[match["id"]] = names
+            continue
+        point_id = _knowledge_point_id(sig["content_hash"])
+        payload = {
+            "type": "knowledge",
+            "filename": path.name,
+            "filenames": [path.name],
+            "content": chunk,
+            "chunk_index": i,
+            **sig,
+        }
+        new.append((point_id, chunk, payload))
+        new_ids.add(point_id)
+        index.add(point_id, payload)
+    return new, attach
+
+
+def _plan_detach(points, filename: str) -> tuple[list[str], dict[str, list[str]]]:
+    """Bestand als bron weghalen: punten zonder andere bron verwijderen, gedeelde punten alleen bijwerken."""
+    delete_ids: list[str] = []
+    updates: dict[str, list[str]] = {}
+    for p in points:
+        rest = [n for n in _point_filenames(p.payload or {}) if n != filename]
+        if rest:
+            updates[str(p.id)] = rest
+        else:
+            delete_ids.append(str(p.id))
+    return delete_ids, updates
+
+
+def _detach_knowledge_file(client, filename: str) -> None:
+    delete_ids, updates = _plan_detach(_scroll_all(client, _knowledge_file_filter(filename)), filename)
+    if delete_ids:
+        client.delete(collection_name=_COLLECTION_NAME, points_selector=delete_ids)
+    for point_id, names in updates.items():
+        client.set_payload(
+            collection_name=_COLLECTION_NAME, payload={"filenames": names, "filename": names[0]}, points=[point_id]
+        )
+
+
+def _new_knowledge_points(new: list[tuple[str, str, dict]], vectors: list[list[float]]) -> list:
+    from qdrant_client.models import PointStruct
+    return [PointStruct(id=pid, vector=vec, payload=payload) for (pid, _, payload), vec in zip(new, vectors)]
+
+
+def _apply_attach(client, attach: dict[str, list[str]]) -> None:
+    for point_id, names in attach.items():
+        client.set_payload(collection_name=_COLLECTION_NAME, payload={"filenames": names}, points=[point_id])
+
+
+# ─── Indexeren ───────────────────────────────────────────────────────────────
+
+
+def _read_for_index(path: Path, label: str) -> str | None:
     try:
-        content = path.read_text(encoding="utf-8", errors="replace")
+        return path.read_text(encoding="utf-8", errors="replace")
     except Exception as e:
-        logger.warning("RAG: kon memory niet lezen %s: %s", path, e)
-        return False
-    date_iso, title = _parse_memory_filename(filename)
-    vectors = _embed([content], input_type="document")
+        logger.warning("RAG: kon %s niet lezen %s: %s", label, path, e)
+        return None
+
+
+def _memory_point(path: Path, content: str, vector: list[float]):
     from qdrant_client.models import PointStruct
-    point = PointStruct(
-        id=_memory_point_id(filename),
-        vector=vectors[0],
+    date_iso, title = _parse_memory_filename(path.name)
+    return PointStruct(
+        id=_memory_point_id(path.name),
+        vector=vector,
         payload={
             "type": "memory",
-            "filename": filename,
+            "filename": path.name,
             "date": date_iso,
             "title": title,
             "content": content,
         },
     )
+
+
+def _index_knowledge_file(client, path: Path) -> int:
+    """Chunk bestand, dedupliceer tegen de index, embed alleen nieuwe chunks, upsert. Retourneert aantal nieuwe chunks."""
+    text = _read_for_index(path, "kennisbestand")
+    if text is None:
+        return 0
+    chunks = _chunk_text(text)
+    if not chunks:
+        return 0
+    signatures = [_chunk_signature(c) for c in chunks]
+    index = _DedupIndex()
+    index.add_points(_scroll_all(client, _dedup_candidates_filter(signatures)))
+    new, attach = _plan_knowledge_chunks(path, chunks, signatures, index)
+    if new:
+        vectors = _embed([chunk for _, chunk, _ in new], input_type="document")
+        client.upsert(collection_name=_COLLECTION_NAME, points=_new_knowledge_points(new, vectors))
+    _apply_attach(client, attach)
+    logger.info(
+        "RAG: kennis geïndexeerd: %s (%d chunks, %d nieuw, %d duplicaat)",
+        path.name, len(chunks), len(new), len(chunks) - len(new),
+    )
+    return len(new)
+
+
+def _index_memory_file(client, path: Path) -> bool:
+    """Eén vector per herinnering; metadata date (ISO) en title uit bestandsnaam."""
+    content = _read_for_index(path, "memory")
+    if content is None:
+        return False
+    vectors = _embed([content], input_type="document")
+    point = _memory_point(path, content, vectors[0])
     client.upsert(collection_name=_COLLECTION_NAME, points=[point])
-    logger.info("RAG: herinnering geïndexeerd: %s (datum %s)", filename, date_iso)
+    logger.info("RAG: herinnering geïndexeerd: %s (datum %s)", path.name, point.payload["date"])
     return True
 
 
@@ -248,16 +488,40 @@ def _search(query: str, limit: int | None = None) -> list[dict]:
     hits = client.search(
         collection_name=_COLLECTION_NAME,
         query_vector=q_vecs[0],
-        limit=search_limit,
+        limit=search_limit * _SEARCH_OVERFETCH,
         score_threshold=_SIMILARITY_THRESHOLD,
         with_payload=True,
     )
-    out = []
+    return _hits_to_results(hits, search_limit)
+
+
+def _hits_to_results(hits, limit: int) -> list[dict]:
+    """Hits (gesorteerd op score) → resultaten; (bijna-)duplicaten worden samengevoegd met hun bronbestanden."""
+    out: list[dict] = []
+    signatures: list[tuple[str, list[int]]] = []
     for h in hits:
         p = h.payload or {}
+        content = p.get("content", "")
+        content_hash = p.get("content_hash") or _content_hash(content)
+        minhash = p.get("minhash") or _minhash(content)
+        filenames = _point_filenames(p)
+        duplicate_of = None
+        for i, (other_hash, other_minhash) in enumerate(signatures):
+            if other_hash == content_hash or _minhash_similarity(minhash, other_minhash) >= _NEAR_DUPLICATE_THRESHOLD:
+                duplicate_of = out[i]
+                break
+        if duplicate_of is not None:
+            for name in filenames:
+                if name not in duplicate_of["filenames"]:
+                    duplicate_of["filenames"].append(name)
+            continue
+        if len(out) >= limit:
+            continue
+        signatures.append((content_hash, minhash))
         out.append({
-            "content": p.get("content", ""),
+            "content": content,
             "filename": p.get("filename", ""),
+            "filenames": filenames,
             "date": p.get("date"),
             "title": p.get("title"),
             "type": p.get("type", ""),
@@ -271,9 +535,18 @@ def _format_search_result(r: dict) -> str:
     content = (r.get("content") or "").strip()
     if r.get("type") == "memory" and r.get("date"):
         return f"[Bestand: {fn} | datum: {r['date']}]\n{content}"
+    others = [n for n in r.get("filenames") or [] if n != fn]
+    if others:
+        return f"[Bestand: {fn} | ook in: {', '.join(others)}]\n{content}"
     return f"[Bestand: {fn}]\n{content}"
 
 
+def _format_search_results(results: list[dict]) -> str:
+    if not results:
+        return "Geen relevante stukken gevonden. Controleer of de zoekindex is ververst (knop bij Kennis/Geheugen)."
+    return "\n\n---\n\n".join(_format_search_result(r) for r in results)
+
+
 # ─── Publieke API (zelfde als voorheen) ──────────────────────────────────────
 
 
@@ -295,6 +568,7 @@ def refresh_rag_tool() -> tuple[bool, str]:
             collection_name=_COLLECTION_NAME,
             vectors_config=VectorParams(size=_VECTOR_SIZE, distance=Distance.COSINE),
         )
+        _create_payload_indexes(client)
         logger.info("RAG: collection geleegd, opnieuw opbouwen...")
         k_count, m_count = 0, 0
         for path in _iter_rag_files(_KNOWLEDGE_DIR):
@@ -332,10 +606,63 @@ def rag_add_file(path: Path | str) -> None:
         _delete_by_filename_and_type(client, filename, "memory")
         _index_memory_file(client, path)
     else:
-        _delete_by_filename_and_type(client, filename, "knowledge")
+        _detach_knowledge_file(client, filename)
         _index_knowledge_file(client, path)
 
 
+def rag_add_files(paths: list[Path | str]) -> int:
+    """Meerdere bestanden als één indexeerjob: alle chunks samen embedden (batches van _EMBED_BATCH_SIZE)
+    en in batches upserten. Retourneert het aantal geïndexeerde punten. Fouten bij embed/upsert gaan naar de caller."""
+    resolved = [Path(p).resolve() for p in paths]
+    resolved = [p for p in resolved if p.suffix.lower() in _RAG_EXTENSIONS]
+    if not resolved:
+        return 0
+    if not _is_configured():
+        logger.debug("RAG: batch-add overgeslagen (niet geconfigureerd)")
+        return 0
+    client = _get_client()
+    _ensure_collection(client)
+    for path in resolved:
+        if _path_is_memory(path):
+            _delete_by_filename_and_type(client, path.name, "memory")
+        else:
+            _detach_knowledge_file(client, path.name)
+    # Eén dedup-index voor de hele batch: boilerplate die in meerdere geüploade bestanden staat wordt één punt
+    index = _DedupIndex()
+    memories: list[tuple[Path, str]] = []
+    new: list[tuple[str, str, dict]] = []
+    attach: dict[str, list[str]] = {}
+    for path in resolved:
+        if _path_is_memory(path):
+            text = _read_for_index(path, "memory")
+            if text is not None:
+                memories.append((path, text))
+            continue
+        text = _read_for_index(path, "kennisbestand")
+        chunks = _chunk_text(text) if text else []
+        if not chunks:
+            continue
+        signatures = [_chunk_signature(c) for c in chunks]
+        index.add_points(_scroll_all(client, _dedup_candidates_filter(signatures)))
+        file_new, file_attach = _plan_knowledge_chunks(path, chunks, signatures, index)
+        new.extend(file_new)
+        attach.update(file_attach)
+    texts = [content for _, content in memories] + [chunk for _, chunk, _ in new]
+    vectors: list[list[float]] = []
+    for i in range(0, len(texts), _EMBED_BATCH_SIZE):
+        vectors.extend(_embed(texts[i : i + _EMBED_BATCH_SIZE], input_type="document"))
+    points = [_memory_point(path, content, vec) for (path, content), vec in zip(memories, vectors)]
+    points.extend(_new_knowledge_points(new, vectors[len(memories):]))
+    for i in range(0, len(points), _UPSERT_BATCH_SIZE):
+        client.upsert(collection_name=_COLLECTION_NAME, points=points[i : i + _UPSERT_BATCH_SIZE])
+    _apply_attach(client, attach)
+    logger.info(
+        "RAG: batch geïndexeerd: %d bestanden, %d punten (%d kennis-chunks als duplicaat gekoppeld)",
+        len(resolved), len(points), len(attach),
+    )
+    return len(points)
+
+
 def rag_remove_file(path: Path | str) -> None:
     """Eén bestand uit de vectordb verwijderen (incrementeel)."""
     path = Path(path).resolve()
@@ -352,10 +679,107 @@ def rag_remove_file(path: Path | str) -> None:
         _delete_by_filename_and_type(client, filename, "memory")
         logger.info("RAG: herinnering uit index verwijderd: %s", filename)
     else:
-        _delete_by_filename_and_type(client, filename, "knowledge")
+        _detach_knowledge_file(client, filename)
         logger.info("RAG: kennis uit index verwijderd: %s", filename)
 
 
+def rag_memory_vectors(paths: list[Path | str]) -> dict[str, list[float]]:
+    """Vectoren van herinneringen (filename → vector) uit de index; herinneringen die (nog) niet geïndexeerd zijn
+    worden alsnog ge-embed. Leeg als RAG niet geconfigureerd is. Fouten gaan naar de caller."""
+    resolved = {Path(p).name: Path(p) for p in paths}
+    if not resolved or not _is_configured():
+        return {}
+    from qdrant_client.models import FieldCondition, Filter, MatchValue
+    client = _get_client()
+    _ensure_collection(client)
+    points = _scroll_all(
+        client,
+        Filter(must=[FieldCondition(key="type", match=MatchValue(value="memory"))]),
+        with_vectors=True,
+    )
+    out = {
+        p.payload["filename"]: list(p.vector)
+        for p in points
+        if p.payload.get("filename") in resolved and p.vector is not None
+    }
+    missing = [(name, _read_for_index(path, "memory")) for name, path in resolved.items() if name not in out]
+    missing = [(name, text) for name, text in missing if text]
+    for i in range(0, len(missing), _EMBED_BATCH_SIZE):
+        batch = missing[i : i + _EMBED_BATCH_SIZE]
+        out.update(zip([name for name, _ in batch], _embed([text for _, text in batch], input_type="document")))
+    return out
+
+
+# ─── Async API (voor kickoff_async; sync API hierboven blijft voor threads) ──
+
+# Per event loop één AsyncQdrantClient + voyageai.AsyncClient: httpx-verbindingen zijn aan de loop gebonden.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+
+def _get_async_clients() -> tuple:
+    """(AsyncQdrantClient, voyageai.AsyncClient) voor de huidige event loop; hergebruikt tussen aanroepen."""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        try:
+            import voyageai
+        except ImportError:
+            raise RuntimeError("voyageai niet geïnstalleerd")
+        from qdrant_client import AsyncQdrantClient
+        clients = (
+            AsyncQdrantClient(url=_qdrant_url()),
+            voyageai.AsyncClient(api_key=_voyage_api_key()),
+        )
+        _async_clients[loop] = clients
+    return clients
+
+
+async def _embed_async(texts: list[str], input_type: str = "document") -> list[list[float]]:
+    if not texts:
+        return []
+    if not _voyage_api_key():
+        raise RuntimeError("VOYAGEAI_API_KEY niet gezet")
+    _, vo = _get_async_clients()
+    out = await vo.embed(texts, model=_embedding_model(), input_type=input_type)
+    return _embeddings_from(out)
+
+
+async def _ensure_collection_async(client) -> None:
+    from qdrant_client.models import Distance, VectorParams
+    if not await client.collection_exists(_COLLECTION_NAME):
+        await client.create_collection(
+            collection_name=_COLLECTION_NAME,
+            vectors_config=VectorParams(size=_VECTOR_SIZE, distance=Distance.COSINE),
+        )
+        for field in _KEYWORD_INDEX_FIELDS:
+            await client.create_payload_index(
+                collection_name=_COLLECTION_NAME, field_name=field, field_schema="keyword"
+            )
+        logger.info("RAG: Qdrant collection aangemaakt: %s", _COLLECTION_NAME)
+
+
+async def rag_search_async(query: str, limit: int | None = None) -> list[dict]:
+    """Async variant van _search: zelfde resultaten, zonder een thread te bezetten tijdens embed/search."""
+    if not _is_configured():
+        return []
+    try:
+        client, _ = _get_async_clients()
+        await _ensure_collection_async(client)
+    except Exception as e:
+        logger.warning("RAG: Qdrant niet bereikbaar: %s", e)
+        return []
+    q_vecs = await _embed_async([query], input_type="query")
+    search_limit = limit if limit is not None else _SEARCH_LIMIT
+    hits = await client.search(
+        collection_name=_COLLECTION_NAME,
+        query_vector=q_vecs[0],
+        limit=search_limit * _SEARCH_OVERFETCH,
+        score_threshold=_SIMILARITY_THRESHOLD,
+        with_payload=True,
+    )
+    return _hits_to_results(hits, search_limit)
+
+
 # ─── CrewAI-tool wrapper ────────────────────────────────────────────────────
 
 
@@ -374,10 +798,7 @@ class _RagTool(BaseTool):
     def _run(self, query: str) -> str:
         if not query or not query.strip():
             return "Geen zoekvraag opgegeven."
-        results = _search(query.strip())
-        if not results:
-            return "Geen relevante stukken gevonden. Controleer of de zoekindex is ververst (knop bij Kennis/Geheugen)."
-        return "\n\n---\n\n".join(_format_search_result(r) for r in results)
+        return _format_search_results(_search(query.strip()))
 
 
 rag_tool = _RagTool()
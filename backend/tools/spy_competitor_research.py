@@ -1,11 +1,24 @@
 """
-spy_competitor_research: wrapt een CrewAI-agent die concurrentie-onderzoek doet.
+spy_competitor_research: concurrentie-onderzoek voor Sonja (en de pipeline in competitor_research.py).
 
-Sonja roept deze tool aan om een concurrent te laten onderzoeken (web search).
-De agent roept SerperDevTool precies 2× aan, daarna genereert hij een samenvatting.
+De twee zoekopdrachten liggen vast, dus die gaan direct en tegelijk naar Serper (algemeen + nieuws) in plaats
+van via een agent die ze één voor één aanroept. Daarna volgt precies één LLM-aanroep die de resultaten samenvat.
+De Serper-client en de samenvattende agent worden één keer aangemaakt en hergebruikt.
+
+Resultaten worden per concurrent opgeslagen (competitors.save_research) met bronnen en tijdstempels:
+- Gecontroleerd binnen COMPETITOR_RESEARCH_TTL_HOURS (default 24): opgeslagen bevindingen, geen zoek- of LLM-aanroep.
+- Daarna delta-modus (COMPETITOR_RESEARCH_DELTA, default aan): alleen de nieuwszoekopdracht; berichten die nog niet
+  bekend zijn en niet ouder dan de vorige controle gaan met de bestaande samenvatting naar de LLM, die alleen het
+  verschil verwerkt. Geen nieuwe berichten = geen LLM-aanroep.
+- Volledig onderzoek als er nog niets is, na COMPETITOR_RESEARCH_FULL_DAYS (default 7) of met bypass_cache.
+Met custom_instructions (specifieke focus) wordt altijd vers onderzocht en niets opgeslagen.
 """
 
-from datetime import datetime
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import Type
 
 from crewai import Agent
@@ -13,6 +26,216 @@ from crewai.tools import BaseTool
 from crewai_tools import SerperDevTool
 from pydantic import BaseModel, Field
 
+from competitors import CompetitorResearch, get_research, research_key, save_research
+
+_SNIPPET_CHARS = 300  # per zoekresultaat in de samenvattingsprompt
+_MAX_SOURCES = 40  # bewaarde bronnen per concurrent (nieuwste eerst)
+_AGE = re.compile(
+    r"(\d+)\s*(minuten|minuut|minutes|minute|mins?|uur|uren|hours?|dagen|dag|days?|weken|week|weeks|maanden|maand|months?)\b"
+)
+_AGE_UNITS = {  # eerste drie letters van de eenheid → seconden
+    "min": 60, "uur": 3600, "ure": 3600, "hou": 3600, "dag": 86400, "day": 86400,
+    "wee": 604800, "wek": 604800, "maa": 2592000, "mon": 2592000,
+}
+
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="spy-search")
+_lock = threading.Lock()
+_search_tool: SerperDevTool | None = None
+_summarizer: Agent | None = None
+# Vaste set locks per concurrent (hash van research_key modulo het aantal): begrensd, ook bij vrije tekst uit de chat.
+# Twee namen op dezelfde lock wachten hooguit op elkaar.
+_NAME_LOCK_STRIPES = 64
+_name_locks = [threading.Lock() for _ in range(_NAME_LOCK_STRIPES)]
+
+
+def _ttl() -> timedelta:
+    try:
+        return timedelta(hours=max(0.0, float(os.getenv("COMPETITOR_RESEARCH_TTL_HOURS", "24"))))
+    except ValueError:
+        return timedelta(hours=24)
+
+
+def _full_refresh() -> timedelta:
+    try:
+        return timedelta(days=max(0.0, float(os.getenv("COMPETITOR_RESEARCH_FULL_DAYS", "7"))))
+    except ValueError:
+        return timedelta(days=7)
+
+
+def _delta_enabled() -> bool:
+    return os.getenv("COMPETITOR_RESEARCH_DELTA", "true").strip().lower() not in ("0", "false", "no", "off")
+
+
+def _get_search_tool() -> SerperDevTool:
+    global _search_tool
+    with _lock:
+        if _search_tool is None:
+            _search_tool = SerperDevTool(country="nl", locale="nl", n_results=5)
+        return _search_tool
+
+
+def _get_summarizer() -> Agent:
+    global _summarizer
+    with _lock:
+        if _summarizer is None:
+            _summarizer = Agent(
+                role="Competitive Intelligence Researcher",
+                goal="Vat zoekresultaten over een concurrent samen in het Nederlands, met bronnen (URLs).",
+                backstory=(
+                    "Je bent een gespecialiseerde research-agent binnen de spy_competitor_research-tool van Sonja, "
+                    "de AI Marketing Coordinator van AFAS. Je krijgt de resultaten van twee zoekopdrachten (algemeen en "
+                    "laatste nieuws) en schrijft daarover een korte, heldere samenvatting met bevindingen en bronnen, "
+                    "geschikt voor AFAS-marketeers. Je verzint niets dat niet in de resultaten staat."
+                ),
+                tools=[],
+                verbose=False,
+                allow_delegation=False,
+            )
+        return _summarizer
+
+
+def _search(query: str, search_type: str = "search") -> list[dict]:
+    """Eén Serper-zoekopdracht → [{title, link, snippet, date}] (organische resultaten en/of nieuws)."""
+    raw = _get_search_tool().run(search_query=query, search_type=search_type)
+    if not isinstance(raw, dict):
+        return [{"title": "", "link": "", "snippet": str(raw), "date": ""}] if raw else []  # oudere crewai_tools: tekst
+    results = []
+    for r in (raw.get("news") or []) + (raw.get("organic") or []):
+        results.append({
+            "title": str(r.get("title") or ""),
+            "link": str(r.get("link") or ""),
+            "snippet": str(r.get("snippet") or "")[:_SNIPPET_CHARS],
+            "date": str(r.get("date") or ""),
+        })
+    return results
+
+
+def search_competitor(competitor_name: str) -> dict[str, list[dict]]:
+    """Algemene zoekopdracht en nieuwszoekopdracht tegelijk; {"general": [...], "news": [...]}."""
+    name = competitor_name.strip()
+    general = _search_pool.submit(_search, name)
+    news = _search_pool.submit(_search, f"{name} nieuws", "news")
+    return {"general": general.result(), "news": news.result()}
+
+
+def format_results(results: list[dict]) -> str:
+    lines = []
+    for r in results:
+        date = f" ({r['date']})" if r.get("date") else ""
+        lines.append(f"- {r.get('title') or '(zonder titel)'}{date}: {r.get('snippet', '')} [{r.get('link', '')}]")
+    return "\n".join(lines) or "- (geen resultaten)"
+
+
+def summarize(competitor_name: str, sections: list[tuple[str, list[dict]]], custom_instructions: str = "") -> str:
+    """Eén LLM-aanroep over de zoekresultaten; sections = [(kop, resultaten)]."""
+    blocks = "\n\n".join(f"{title}:\n{format_results(results)}" for title, results in sections)
+    prompt = (
+        f"Concurrent: {competitor_name.strip()}.\n\n{blocks}\n\n"
+        "Schrijf op basis van alleen deze resultaten een korte samenvatting in het Nederlands met de belangrijkste "
+        "bevindingen en alle gebruikte bronnen (URLs)."
+    )
+    if (custom_instructions or "").strip():
+        prompt += f"\n\nExtra instructies: {custom_instructions.strip()}"
+    result = _get_summarizer().kickoff(prompt)
+    return result.raw if hasattr(result, "raw") else str(result)
+
+
+def research_competitor(competitor_name: str, custom_instructions: str = "") -> str:
+    """Onderzoek één concurrent vers (zonder opslag) en retourneer de samenvatting met bronnen. Fouten worden doorgegeven."""
+    found = search_competitor(competitor_name)
+    return summarize(
+        competitor_name,
+        [("Algemene informatie", found["general"]), ("Laatste nieuws", found["news"])],
+        custom_instructions,
+    )
+
+
+def _news_age(date: str) -> timedelta | None:
+    """Leeftijd uit een Serper-datum als "3 uur geleden" of "2 days ago"; None als die niet relatief is."""
+    m = _AGE.search((date or "").lower())
+    if not m:
+        return None
+    return timedelta(seconds=int(m.group(1)) * _AGE_UNITS[m.group(2)[:3]])
+
+
+def _is_new(result: dict, known: set[str], checked: datetime, now: datetime) -> bool:
+    """Onbekende link en (voor zover de datum dat zegt) niet ouder dan de vorige controle, met een dag marge
+    omdat Serper-datums grof zijn ("1 dag geleden")."""
+    if not result.get("link") or result["link"] in known:
+        return False
+    age = _news_age(result.get("date", ""))
+    return age is None or now - age >= checked - timedelta(days=1)
+
+
+def _as_sources(results: list[dict], seen_at: str) -> list[dict]:
+    return [
+        {"title": r.get("title", ""), "link": r["link"], "date": r.get("date", ""), "seen_at": seen_at}
+        for r in results
+        if r.get("link")
+    ]
+
+
+def _merge_sources(new: list[dict], old: list[dict]) -> list[dict]:
+    merged, seen = [], set()
+    for src in new + old:
+        if src["link"] not in seen:
+            seen.add(src["link"])
+            merged.append(src)
+    return merged[:_MAX_SOURCES]
+
+
+def _update_summary(research: CompetitorResearch, news: list[dict]) -> str:
+    """Eén LLM-aanroep over alleen de nieuwe berichten, met de bestaande samenvatting als basis."""
+    prompt = (
+        f"Concurrent: {research.name}.\n\n"
+        f"Bestaande samenvatting (bijgewerkt {research.updated_at[:10]}):\n{research.summary.strip()}\n\n"
+        f"Nieuwe berichten sinds de vorige controle:\n{format_results(news)}\n\n"
+        "Werk de samenvatting bij in het Nederlands: verwerk alleen wat deze berichten toevoegen of wat eerdere "
+        "bevindingen achterhaalt, laat de rest zoals het is en houd alle bronnen (URLs). "
+        "Begin met een korte sectie 'Nieuw sinds de vorige keer'."
+    )
+    result = _get_summarizer().kickoff(prompt)
+    return result.raw if hasattr(result, "raw") else str(result)
+
+
+def research_competitor_cached(
+    competitor_name: str, bypass_cache: bool = False
+) -> tuple[CompetitorResearch, str, int]:
+    """Opgeslagen, bijgewerkt of vers onderzoek. Retourneert (onderzoek, modus, aantal nieuwe berichten);
+    modus is cached, unchanged (geen nieuw nieuws), delta of full. Fouten worden doorgegeven."""
+    name = competitor_name.strip()
+    name_lock = _name_locks[hash(research_key(name)) % _NAME_LOCK_STRIPES]
+    with name_lock:  # gelijktijdige aanvragen voor dezelfde concurrent: de tweede gebruikt het resultaat van de eerste
+        now = datetime.now(timezone.utc)
+        stamp = now.isoformat(timespec="seconds")
+        research = None if bypass_cache else get_research(name)
+        if research is not None:
+            checked = datetime.fromisoformat(research.checked_at)
+            if now - checked < _ttl():
+                return research, "cached", 0
+            if _delta_enabled() and now - datetime.fromisoformat(research.researched_at) < _full_refresh():
+                known = {src["link"] for src in research.sources}
+                news = [r for r in _search(f"{name} nieuws", "news") if _is_new(r, known, checked, now)]
+                if news:
+                    research.summary = _update_summary(research, news)
+                    research.sources = _merge_sources(_as_sources(news, stamp), research.sources)
+                    research.updated_at = stamp
+                research.checked_at = stamp
+                save_research(research)
+                return research, ("delta" if news else "unchanged"), len(news)
+        found = search_competitor(name)
+        summary = summarize(name, [("Algemene informatie", found["general"]), ("Laatste nieuws", found["news"])])
+        research = CompetitorResearch(
+            name=name,
+            summary=summary,
+            sources=_merge_sources(_as_sources(found["news"] + found["general"], stamp), []),
+            researched_at=stamp,
+            checked_at=stamp,
+            updated_at=stamp,
+        )
+        save_research(research)
+        return research, "full", len(found["news"])
+
 
 class SpyCompetitorResearchInput(BaseModel):
     """Input voor de spy_competitor_research tool."""
@@ -25,8 +248,7 @@ class SpyCompetitorResearchInput(BaseModel):
 
 class SpyCompetitorResearchTool(BaseTool):
     """
-    Tool die een CrewAI-agent aanroept voor concurrentie-onderzoek.
-    De agent gebruikt web search (Serper) en retourneert een samenvatting.
+    Tool voor concurrentie-onderzoek: twee web searches (Serper) en één samenvatting door een research-agent.
     """
     name: str = "spy_competitor_research"
     description: str = (
@@ -37,47 +259,11 @@ class SpyCompetitorResearchTool(BaseTool):
     args_schema: Type[BaseModel] = SpyCompetitorResearchInput
 
     def _run(self, competitor_name: str, custom_instructions: str = "") -> str:
-        search_tool = SerperDevTool(country="nl", locale="nl", n_results=5)
-        researcher = Agent(
-            role="Competitive Intelligence Researcher",
-            goal=(
-                "Voer precies 2 zoekopdrachten uit met SerperDevTool, dan een samenvatting in het Nederlands. "
-                "Geen meer, geen minder: exact 2× SerperDevTool aanroepen."
-            ),
-            backstory=(
-                "Je bent een gespecialiseerde research-agent die als tool wordt aangeroepen door Sonja, "
-                "de AI Marketing Coordinator van AFAS. Sonja helpt marketeers van AFAS; jij ondersteunt haar "
-                "door concurrentie-onderzoek te doen. Je bent dus een subagent: je draait binnen de spy_competitor_research-tool "
-                "en levert jouw resultaat terug aan Sonja, die het aan de gebruiker presenteert. "
-                "Je hebt één tool: SerperDevTool (web search). Je moet die precies 2 keer gebruiken "
-                "met de zoekqueries die in de opdracht staan. Daarna schrijf je een korte, heldere samenvatting "
-                "in het Nederlands met bevindingen en bronnen (URLs), geschikt voor AFAS-marketeers."
-            ),
-            tools=[search_tool],
-            verbose=False,
-            allow_delegation=False,
-        )
-        today = datetime.now().strftime("%d-%m-%Y")
-        search1_query = competitor_name.strip()
-        search2_query = f"{competitor_name.strip()} laatste nieuws {today}"
-        prompt = f"""Onderzoek de concurrent: {competitor_name}.
-
-Je MOET SerperDevTool precies 2 keer aanroepen:
-
-1. Eerste zoekopdracht – algemene informatie over de concurrent.
-   Search query: "{search1_query}"
-   (gebruik exact deze zoekterm)
-
-2. Tweede zoekopdracht – laatste nieuws over de concurrent (vandaag = {today}).
-   Search query: "{search2_query}"
-   (gebruik exact deze zoekterm)
-
-Na deze 2 zoekopdrachten: schrijf een korte samenvatting in het Nederlands met de belangrijkste bevindingen en alle bronnen (URLs). Voer geen derde zoekopdracht uit."""
-        if (custom_instructions or "").strip():
-            prompt += f"\n\nExtra instructies: {custom_instructions.strip()}"
         try:
-            result = researcher.kickoff(prompt)
-            return result.raw if hasattr(result, "raw") else str(result)
+            if (custom_instructions or "").strip():
+                return research_competitor(competitor_name, custom_instructions)
+            research, _, _ = research_competitor_cached(competitor_name)
+            return f"(Onderzoek bijgewerkt {research.updated_at[:16].replace('T', ' ')} UTC)\n\n{research.summary}"
         except Exception as e:
             return f"Fout bij onderzoek: {e}"
 
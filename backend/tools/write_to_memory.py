@@ -3,9 +3,15 @@ Sla een herinnering op als nieuw bestand in memory/.
 
 Formaat bestandsnaam: DD-MM-YYYY_HH-MM_slug.md (bijv. 12-02-2026_11-51_marketing-vergadering-leerpunten-kennis.md).
 Inhoud: ## DD-MM-YYYY HH:MM gevolgd door **Titel** en de content. Alleen Sonja kan herinneringen aanmaken (via deze tool).
+
+Binnen een agent-run (begin_memory_batch/end_memory_batch in sonja.py) wordt het bestand direct geschreven
+(de bestandsnaam is dus meteen definitief), maar het indexeren uitgesteld tot het einde van de run: alle
+herinneringen van die run gaan dan in één embed/upsert (rag_add_files). Buiten een run wordt direct geïndexeerd.
 """
 
+import logging
 import re
+from contextvars import ContextVar, Token
 from pathlib import Path
 from typing import Type
 from datetime import datetime
@@ -16,6 +22,11 @@ from pydantic import BaseModel, Field
 
 _MEMORY_DIR = Path(__file__).resolve().parent.parent / "memory"
 
+logger = logging.getLogger(__name__)
+
+# Per run: paden die nog geïndexeerd moeten worden (None = geen batch actief, direct indexeren)
+_pending_index: ContextVar[list[Path] | None] = ContextVar("sonja_pending_memory_index", default=None)
+
 
 def _slug_from_title(title: str) -> str:
     """Maak een bestandsnaam-slug uit de titel: lowercase, spaties en leestekens naar streepjes."""
@@ -25,6 +36,56 @@ def _slug_from_title(title: str) -> str:
     return t[:80] if t else "herinnering"
 
 
+def write_memory_file(title: str, content: str, when: datetime | None = None) -> Path:
+    """Schrijf een herinnering als DD-MM-YYYY_HH-MM_slug.md in memory/ (zonder te indexeren). Retourneert het pad."""
+    now = when or datetime.now()
+    date_str = now.strftime("%d-%m-%Y")
+    time_str = now.strftime("%H-%M")
+    slug = _slug_from_title(title)
+    filename = f"{date_str}_{time_str}_{slug}.md"
+
+    header_ts = now.strftime("%d-%m-%Y %H:%M")
+    file_content = f"## {header_ts}\n**{title}**\n\n{content}\n"
+
+    _MEMORY_DIR.mkdir(parents=True, exist_ok=True)
+    counter = 0
+    while True:
+        path = _MEMORY_DIR / filename
+        try:
+            # "x": aanmaken en controleren in één stap (ook veilig bij parallelle runs met dezelfde titel)
+            with path.open("x", encoding="utf-8") as f:
+                f.write(file_content)
+            return path
+        except FileExistsError:
+            counter += 1
+            filename = f"{date_str}_{time_str}_{slug}-{counter}.md"
+
+
+def begin_memory_batch() -> Token:
+    """Start een batch voor de huidige run (context); geeft het token voor end_memory_batch."""
+    return _pending_index.set([])
+
+
+def end_memory_batch(token: Token) -> list[Path]:
+    """Sluit de batch (in dezelfde context als begin_memory_batch) en geef de paden die nog geïndexeerd moeten worden."""
+    paths = _pending_index.get() or []
+    _pending_index.reset(token)
+    return paths
+
+
+def index_memory_files(paths: list[Path]) -> int:
+    """Indexeer de herinneringen van een run in één embed/upsert. Retourneert het aantal punten.
+    Fouten worden gelogd (de bestanden staan er al; een refresh van de index pakt ze later alsnog op)."""
+    if not paths:
+        return 0
+    from .rag_tool import rag_add_files
+    try:
+        return rag_add_files(paths)
+    except Exception as e:
+        logger.warning("Herinneringen indexeren mislukt (%d bestanden): %s", len(paths), e)
+        return 0
+
+
 class WriteToMemoryInput(BaseModel):
     title: str = Field(
         description="Korte semantische titel van de herinnering, zonder datum (die wordt automatisch toegevoegd). "
@@ -48,32 +109,15 @@ class WriteToMemoryTool(BaseTool):
         content = (content or "").strip()
         if not title and not content:
             return "Geen titel of inhoud opgegeven."
-        if not title:
-            title = "Herinnering"
-        if not content:
-            content = "(geen inhoud)"
-
-        now = datetime.now()
-        date_str = now.strftime("%d-%m-%Y")
-        time_str = now.strftime("%H-%M")
-        slug = _slug_from_title(title)
-        filename = f"{date_str}_{time_str}_{slug}.md"
-
-        header_ts = now.strftime("%d-%m-%Y %H:%M")
-        file_content = f"## {header_ts}\n**{title}**\n\n{content}\n"
-
-        _MEMORY_DIR.mkdir(parents=True, exist_ok=True)
-        path = _MEMORY_DIR / filename
-        counter = 0
-        while path.exists():
-            counter += 1
-            filename = f"{date_str}_{time_str}_{slug}-{counter}.md"
-            path = _MEMORY_DIR / filename
-        path.write_text(file_content, encoding="utf-8")
-
-        from .rag_tool import rag_add_file
-        rag_add_file(path)
-        return f"Herinnering opgeslagen: {filename}. Gebruik read_file met memory/{filename} om het later te lezen."
+        path = write_memory_file(title or "Herinnering", content or "(geen inhoud)")
+
+        pending = _pending_index.get()
+        if pending is not None:
+            pending.append(path)
+        else:
+            from .rag_tool import rag_add_file
+            rag_add_file(path)
+        return f"Herinnering opgeslagen: {path.name}. Gebruik read_file met memory/{path.name} om het later te lezen."
 
 
 write_to_memory_tool = WriteToMemoryTool()
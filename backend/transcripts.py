@@ -0,0 +1,203 @@
+"""
+Klantgesprek-transcripts: metadata-index en full-text search over call_transcripts/.
+
+Bestanden blijven de bron (upload via API of handmatig in de map); de index staat in
+backend/data/transcripts.db (SQLite + FTS5) en wordt bij elke zoekopdracht incrementeel
+bijgewerkt op basis van mtime en grootte (ongewijzigde bestanden worden niet opnieuw gelezen).
+
+Metadata per transcript: filename, date (uit bestandsnaam, een 'Datum:'-regel of mtime),
+customer (uit een 'Klant:'-regel of de bestandsnaam) en size.
+"""
+
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+_BACKEND_DIR = Path(__file__).resolve().parent
+_CALL_TRANSCRIPTS_DIR = _BACKEND_DIR / "call_transcripts"
+_DATA_DIR = _BACKEND_DIR / "data"
+_DB_FILE = _DATA_DIR / "transcripts.db"
+_EXTENSIONS = (".txt", ".md")
+
+_lock = threading.Lock()
+
+_DATE_PATTERNS = (
+    (re.compile(r"(\d{4})-(\d{2})-(\d{2})"), ("y", "m", "d")),
+    (re.compile(r"(\d{2})-(\d{2})-(\d{4})"), ("d", "m", "y")),
+)
+_CUSTOMER_LINE = re.compile(r"^\s*\**\s*(klant|customer|bedrijf|organisatie)\s*\**\s*:\s*(.+)$", re.I | re.M)
+_DATE_LINE = re.compile(r"^\s*\**\s*(datum|date)\s*\**\s*:\s*(.+)$", re.I | re.M)
+
+
+def _connect() -> sqlite3.Connection:
+    _DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(_DB_FILE)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS transcripts (
+            filename TEXT PRIMARY KEY,
+            date TEXT,
+            customer TEXT,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transcripts_date ON transcripts(date);
+        CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts USING fts5(
+            filename UNINDEXED, customer, content, tokenize = 'unicode61 remove_diacritics 2'
+        );
+        """
+    )
+    return conn
+
+
+def _parse_date(text: str) -> str | None:
+    for pattern, order in _DATE_PATTERNS:
+        m = pattern.search(text or "")
+        if not m:
+            continue
+        parts = dict(zip(order, m.groups()))
+        try:
+            return datetime(int(parts["y"]), int(parts["m"]), int(parts["d"])).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _extract_metadata(path: Path, content: str, mtime: float) -> tuple[str, str]:
+    """(date ISO, customer) uit bestandsnaam en inhoud; valt terug op mtime en de bestandsnaam."""
+    head = content[:2000]
+    date = _parse_date(path.stem)
+    if date is None:
+        m = _DATE_LINE.search(head)
+        date = _parse_date(m.group(2)) if m else None
+    if date is None:
+        date = datetime.fromtimestamp(mtime).date().isoformat()
+    m = _CUSTOMER_LINE.search(head)
+    if m:
+        customer = m.group(2).strip().strip("*").strip()
+    else:
+        stem = re.sub(r"\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{4}", "", path.stem)
+        customer = re.sub(r"[_\-]+", " ", stem).strip()
+    return date, customer[:120]
+
+
+def _sync(conn: sqlite3.Connection) -> None:
+    """Index bijwerken: nieuwe/gewijzigde bestanden (her)indexeren, verdwenen bestanden verwijderen."""
+    on_disk: dict[str, Path] = {}
+    if _CALL_TRANSCRIPTS_DIR.is_dir():
+        for path in _CALL_TRANSCRIPTS_DIR.iterdir():
+            if path.is_file() and path.suffix.lower() in _EXTENSIONS and not path.name.startswith("."):
+                on_disk[path.name] = path
+    known = {row["filename"]: (row["size"], row["mtime_ns"]) for row in conn.execute("SELECT filename, size, mtime_ns FROM transcripts")}
+    with conn:
+        for name in set(known) - set(on_disk):
+            conn.execute("DELETE FROM transcripts WHERE filename = ?", (name,))
+            conn.execute("DELETE FROM transcripts_fts WHERE filename = ?", (name,))
+        for name, path in on_disk.items():
+            st = path.stat()
+            if known.get(name) == (st.st_size, st.st_mtime_ns):
+                continue
+            try:
+                content = path.read_text(encoding="utf-8", errors="replace")
+            except Exception:
+                continue
+            date, customer = _extract_metadata(path, content, st.st_mtime)
+            conn.execute(
+                "INSERT OR REPLACE INTO transcripts (filename, date, customer, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                (name, date, customer, st.st_size, st.st_mtime_ns),
+            )
+            conn.execute("DELETE FROM transcripts_fts WHERE filename = ?", (name,))
+            conn.execute(
+                "INSERT INTO transcripts_fts (filename, customer, content) VALUES (?, ?, ?)",
+                (name, customer, content),
+            )
+
+
+def _fts_query(query: str) -> str:
+    """Vrije tekst → FTS5-query: elk woord als (prefix-)term, impliciete AND; geen FTS-syntaxfouten door gebruikersinvoer."""
+    terms = re.findall(r"\w+", query or "")
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+def _filters(date_from: str | None, date_to: str | None, customer: str | None) -> tuple[str, list]:
+    clauses, params = [], []
+    if date_from:
+        clauses.append("t.date >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("t.date <= ?")
+        params.append(date_to)
+    if customer:
+        clauses.append("t.customer LIKE ?")
+        params.append(f"%{customer.strip()}%")
+    return (" AND " + " AND ".join(clauses)) if clauses else "", params
+
+
+def search_transcripts(
+    query: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    customer: str | None = None,
+    limit: int = 5,
+    offset: int = 0,
+    excerpt_tokens: int = 48,
+) -> tuple[int, list[dict]]:
+    """Zoek transcripts. Retourneert (totaal aantal matches, pagina met metadata + excerpt).
+    Zonder query: alleen filteren op datum/klant, nieuwste eerst."""
+    with _lock:
+        conn = _connect()
+        try:
+            _sync(conn)
+            where, params = _filters(date_from, date_to, customer)
+            fts = _fts_query(query or "")
+            if fts:
+                base = (
+                    "FROM transcripts_fts JOIN transcripts t ON t.filename = transcripts_fts.filename "
+                    f"WHERE transcripts_fts MATCH ?{where}"
+                )
+                total = conn.execute(f"SELECT COUNT(*) {base}", [fts, *params]).fetchone()[0]
+                rows = conn.execute(
+                    "SELECT t.filename, t.date, t.customer, t.size, "
+                    f"snippet(transcripts_fts, 2, '**', '**', ' … ', ?) AS excerpt {base} "
+                    "ORDER BY bm25(transcripts_fts) LIMIT ? OFFSET ?",
+                    [excerpt_tokens, fts, *params, limit, offset],
+                ).fetchall()
+            else:
+                base = f"FROM transcripts t JOIN transcripts_fts ON t.filename = transcripts_fts.filename WHERE 1=1{where}"
+                total = conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+                rows = conn.execute(
+                    "SELECT t.filename, t.date, t.customer, t.size, "
+                    f"substr(transcripts_fts.content, 1, ?) AS excerpt {base} "
+                    "ORDER BY t.date DESC, t.filename LIMIT ? OFFSET ?",
+                    [excerpt_tokens * 8, *params, limit, offset],
+                ).fetchall()
+            return total, [dict(r) for r in rows]
+        finally:
+            conn.close()
+
+
+def list_transcripts() -> list[dict]:
+    """Metadata van alle transcripts (filename, date, customer, size), nieuwste eerst."""
+    with _lock:
+        conn = _connect()
+        try:
+            _sync(conn)
+            rows = conn.execute("SELECT filename, date, customer, size FROM transcripts ORDER BY date DESC, filename").fetchall()
+            return [dict(r) for r in rows]
+        finally:
+            conn.close()
+
+
+def read_transcript(filename: str, offset: int = 0, max_chars: int = 8000) -> tuple[str, int] | None:
+    """Een stuk van één transcript: (tekst, totale lengte), of None als het bestand niet bestaat."""
+    if not filename or Path(filename).name != filename:
+        return None
+    path = _CALL_TRANSCRIPTS_DIR / filename
+    if not path.is_file() or path.suffix.lower() not in _EXTENSIONS:
+        return None
+    content = path.read_text(encoding="utf-8", errors="replace")
+    start = max(0, offset)
+    return content[start : start + max_chars], len(content)
@@ -9,15 +9,19 @@ import {
   CalendarDays,
   X,
   Loader2,
+  Play,
 } from "lucide-react"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent } from "@/components/ui/card"
 import { Badge } from "@/components/ui/badge"
 import { MarkdownContent } from "@/components/markdown-content"
 import { ThinkingSteps } from "@/components/thinking-steps"
-import type { AgendaItem } from "@/lib/types"
+import type { AgendaItem, AgendaRun, ThinkingStep } from "@/lib/types"
 import {
   getAgendaItems,
+  getAgendaRun,
+  runAgendaItemNow,
+  streamAgendaRun,
   addEmojis,
   createAgendaItem,
   updateAgendaItem,
@@ -43,6 +47,10 @@ export function AgendaScreen() {
   const [showModal, setShowModal] = useState(false)
   const [editingItem, setEditingItem] = useState<AgendaItem | null>(null)
   const [expandedId, setExpandedId] = useState<string | null>(null)
+  const [expandedRun, setExpandedRun] = useState<AgendaRun | null>(null)
+  // Live stappen van een run die nu loopt (via "Nu uitvoeren")
+  const [liveRunId, setLiveRunId] = useState<string | null>(null)
+  const [liveSteps, setLiveSteps] = useState<ThinkingStep[]>([])
 
   const [formTitle, setFormTitle] = useState("")
   const [formPrompt, setFormPrompt] = useState("")
@@ -54,7 +62,7 @@ export function AgendaScreen() {
     getAgendaItems().then(setItems).catch(() => {})
   }
 
-  // Load + poll elke 60s (zelfde ritme als scheduler get_due_items)
+  // Load + poll elke 60s (laatste runs en next_run_at bijwerken)
   useEffect(() => {
     getAgendaItems().then(setItems).catch(() => {}).finally(() => setLoading(false))
   }, [])
@@ -63,6 +71,18 @@ export function AgendaScreen() {
     return () => clearInterval(interval)
   }, [])
 
+  // Denkstappen en antwoord staan in de run-historie, niet in de lijst: laatste run ophalen bij uitklappen
+  const expandedRunId = items.find((i) => i.id === expandedId)?.last_run_id ?? null
+  useEffect(() => {
+    setExpandedRun(null)
+    if (!expandedId || !expandedRunId) return
+    let cancelled = false
+    getAgendaRun(expandedId, expandedRunId)
+      .then((run) => { if (!cancelled) setExpandedRun(run) })
+      .catch(() => {})
+    return () => { cancelled = true }
+  }, [expandedId, expandedRunId])
+
   const resetForm = () => {
     setFormTitle("")
     setFormPrompt("")
@@ -133,6 +153,21 @@ export function AgendaScreen() {
     } catch { /* ignore */ }
   }
 
+  const handleRunNow = async (e: React.MouseEvent, id: string) => {
+    e.stopPropagation()
+    try {
+      await runAgendaItemNow(id)
+    } catch { return }
+    setExpandedId(id)
+    setLiveRunId(id)
+    setLiveSteps([])
+    try {
+      await streamAgendaRun(id, (step) => setLiveSteps((prev) => [...prev, step]))
+    } catch { /* run al klaar of draait in een ander proces */ }
+    setLiveRunId(null)
+    refresh()
+  }
+
   const sortedItems = [...items].sort((a, b) => {
     const da = a.last_run_at || a.created_at || ""
     const db = b.last_run_at || b.created_at || ""
@@ -208,6 +243,11 @@ export function AgendaScreen() {
                         </td>
                         <td className="px-3 py-2">
                           <span className="font-medium text-card-foreground">{item.title}</span>
+                          {item.dead_letter && (
+                            <Badge variant="destructive" className="ml-2 text-[10px]" title={item.dead_letter.error ?? undefined}>
+                              Mislukt
+                            </Badge>
+                          )}
                           <p className="text-xs text-muted-foreground line-clamp-1 mt-0.5">
                             {item.prompt}
                           </p>
@@ -225,6 +265,20 @@ export function AgendaScreen() {
                         </td>
                         <td className="px-3 py-2 text-right" onClick={(e) => e.stopPropagation()}>
                           <div className="flex justify-end gap-1">
+                            <Button
+                              variant="ghost"
+                              size="icon"
+                              className="h-7 w-7"
+                              disabled={liveRunId === item.id}
+                              onClick={(e) => handleRunNow(e, item.id)}
+                            >
+                              {liveRunId === item.id ? (
+                                <Loader2 className="h-3 w-3 animate-spin" />
+                              ) : (
+                                <Play className="h-3 w-3" />
+                              )}
+                              <span className="sr-only">Nu uitvoeren</span>
+                            </Button>
                             <Button
                               variant="ghost"
                               size="icon"
@@ -250,24 +304,38 @@ export function AgendaScreen() {
                         <tr className="border-b border-border bg-muted/20">
                           <td colSpan={4} className="px-3 py-3">
                             <div className="space-y-3 text-sm">
-                              {item.last_run_at ? (
+                              {liveRunId === item.id ? (
+                                <>
+                                  <p className="text-xs font-medium text-muted-foreground">Bezig…</p>
+                                  {liveSteps.length > 0 && (
+                                    <ThinkingSteps steps={liveSteps} defaultOpen />
+                                  )}
+                                </>
+                              ) : item.last_run_at ? (
                                 <>
                                   <p className="text-xs font-medium text-muted-foreground">
                                     Laatste run: {formatRunAt(item.last_run_at)}
+                                    {item.last_run_status && item.last_run_status !== "done" && ` (${item.last_run_status === "retrying" ? "nieuwe poging volgt" : "mislukt"})`}
                                   </p>
-                                  {(item.last_run_steps?.length ?? 0) > 0 && (
+                                  {expandedRun === null && item.last_run_id && (
+                                    <Loader2 className="h-4 w-4 animate-spin text-muted-foreground" />
+                                  )}
+                                  {expandedRun?.error && (
+                                    <p className="text-xs text-destructive">{expandedRun.error}</p>
+                                  )}
+                                  {(expandedRun?.steps?.length ?? 0) > 0 && (
                                     <div className="mt-2">
                                       <ThinkingSteps
-                                        steps={addEmojis(item.last_run_steps ?? [])}
+                                        steps={addEmojis(expandedRun?.steps ?? [])}
                                         defaultOpen
                                       />
                                     </div>
                                   )}
-                                  {item.last_run_response && (
+                                  {expandedRun?.response && (
                                     <div className="mt-2">
                                       <p className="text-xs font-medium text-muted-foreground mb-1">Antwoord Sonja</p>
                                       <div className="rounded-md bg-background/80 p-3 text-card-foreground [&_.markdown-content]:text-sm">
-                                        <MarkdownContent content={item.last_run_response} />
+                                        <MarkdownContent content={expandedRun.response} />
                                       </div>
                                     </div>
                                   )}
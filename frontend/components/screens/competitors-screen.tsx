@@ -9,6 +9,8 @@ import {
   X,
   Eye,
   Settings,
+  ChevronDown,
+  ChevronRight,
 } from "lucide-react"
 import { Button } from "@/components/ui/button"
 import { Card, CardContent } from "@/components/ui/card"
@@ -16,9 +18,10 @@ import { Checkbox } from "@/components/ui/checkbox"
 import { SonjaAvatar } from "@/components/sonja-avatar"
 import { ThinkingSteps } from "@/components/thinking-steps"
 import { MarkdownContent } from "@/components/markdown-content"
-import type { Competitor, ThinkingStep } from "@/lib/types"
+import type { Competitor, CompetitorResearch, ThinkingStep } from "@/lib/types"
 import {
   getCompetitors,
+  getCompetitorResearch,
   addCompetitor as apiAddCompetitor,
   deleteCompetitor as apiDeleteCompetitor,
   analyzeCompetitorsStream,
@@ -26,13 +29,7 @@ import {
 
 const STORAGE_KEY = "sonja-competitors-prompt"
 
-const DEFAULT_PROMPT = `Gebruik de spy_competitor_research tool voor elk van de geselecteerde concurrenten.
-
-Voor elke concurrent:
-- Roep spy_competitor_research aan met de naam van de concurrent
-- Sla de belangrijkste bevindingen op
-
-Geef daarna per concurrent een samenvatting (recente ontwikkelingen, sterke punten, marktpositie) en sluit af met concrete actiepunten voor AFAS marketing op basis van de gecombineerde analyse.
+const DEFAULT_PROMPT = `Geef per concurrent een samenvatting (recente ontwikkelingen, sterke punten, marktpositie) en sluit af met concrete actiepunten voor AFAS marketing op basis van de gecombineerde analyse.
 Extra instructie/Focus op: Algemeen`
 
 function getStoredPrompt(): string {
@@ -45,8 +42,18 @@ function getStoredPrompt(): string {
   }
 }
 
+function formatCheckedAt(iso: string): string {
+  try {
+    return new Date(iso).toLocaleString("nl-NL", { dateStyle: "short", timeStyle: "short" })
+  } catch {
+    return iso
+  }
+}
+
 export function CompetitorsScreen() {
   const [competitors, setCompetitors] = useState<Competitor[]>([])
+  const [research, setResearch] = useState<Record<string, CompetitorResearch>>({})
+  const [expandedId, setExpandedId] = useState<string | null>(null)
   const [selected, setSelected] = useState<Set<string>>(new Set())
   const [showAddForm, setShowAddForm] = useState(false)
   const [newName, setNewName] = useState("")
@@ -62,12 +69,18 @@ export function CompetitorsScreen() {
   const koffieTimeoutRef = useRef<ReturnType<typeof setTimeout> | null>(null)
   const loadingIntervalRef = useRef<ReturnType<typeof setInterval> | null>(null)
 
-  // Load competitors from backend + prompt from localStorage (after mount)
+  const loadResearch = () =>
+    getCompetitorResearch()
+      .then((list) => setResearch(Object.fromEntries(list.map((r) => [r.competitor_id, r]))))
+      .catch(() => {})
+
+  // Load competitors + known findings from backend, prompt from localStorage (after mount)
   useEffect(() => {
     getCompetitors()
       .then(setCompetitors)
       .catch(() => {})
       .finally(() => setLoading(false))
+    loadResearch()
   }, [])
 
   useEffect(() => {
@@ -162,6 +175,7 @@ export function CompetitorsScreen() {
       )
       setSteps(data.steps)
       setAnalysisResult(data.response)
+      loadResearch()
     } catch {
       setAnalysisResult("Er ging iets mis bij de analyse. Probeer het opnieuw.")
     } finally {
@@ -249,7 +263,7 @@ export function CompetitorsScreen() {
                 className="w-full resize-none rounded-lg border border-input bg-background px-3 py-2 text-xs text-foreground placeholder:text-muted-foreground focus:outline-none focus:ring-2 focus:ring-ring"
               />
               <p className="mt-2 text-[10px] text-muted-foreground">
-                Pas de prompt aan naar wens. Bij &quot;Analyseer&quot; worden de geselecteerde concurrenten automatisch toegevoegd. Reset herstelt de originele standaardprompt.
+                Pas de prompt aan naar wens. Bij &quot;Analyseer&quot; worden de geselecteerde concurrenten eerst parallel onderzocht; deze prompt stuurt de samenvatting daarvan. Reset herstelt de originele standaardprompt.
               </p>
             </CardContent>
           </Card>
@@ -304,35 +318,82 @@ export function CompetitorsScreen() {
                 <div className="flex items-center gap-4 px-4 py-3 text-xs font-medium uppercase tracking-wider text-muted-foreground">
                   <div className="w-8" />
                   <div className="flex-1">Naam</div>
+                  <div className="w-40">Bevindingen</div>
                   <div className="w-10" />
                 </div>
                 {competitors.map((comp) => (
-                  <div
-                    key={comp.id}
-                    className="flex items-center gap-4 px-4 py-3 transition-colors hover:bg-muted/30"
-                  >
-                    <div className="w-8">
-                      <Checkbox
-                        checked={selected.has(comp.id)}
-                        onCheckedChange={() => toggleSelect(comp.id)}
-                      />
-                    </div>
-                    <div className="flex-1">
-                      <span className="text-sm font-medium text-card-foreground">
-                        {comp.name}
-                      </span>
-                    </div>
-                    <div className="w-10">
-                      <Button
-                        variant="ghost"
-                        size="icon"
-                        className="h-8 w-8 text-destructive hover:text-destructive"
-                        onClick={() => handleDelete(comp.id)}
-                      >
-                        <Trash2 className="h-3.5 w-3.5" />
-                        <span className="sr-only">Verwijder {comp.name}</span>
-                      </Button>
+                  <div key={comp.id}>
+                    <div
+                      className="flex items-center gap-4 px-4 py-3 transition-colors hover:bg-muted/30"
+                    >
+                      <div className="w-8">
+                        <Checkbox
+                          checked={selected.has(comp.id)}
+                          onCheckedChange={() => toggleSelect(comp.id)}
+                        />
+                      </div>
+                      <div className="flex-1">
+                        <span className="text-sm font-medium text-card-foreground">
+                          {comp.name}
+                        </span>
+                      </div>
+                      <div className="w-40">
+                        {research[comp.id] ? (
+                          <button
+                            type="button"
+                            className="flex items-center gap-1 text-xs text-muted-foreground hover:text-foreground"
+                            onClick={() => setExpandedId(expandedId === comp.id ? null : comp.id)}
+                          >
+                            {expandedId === comp.id ? (
+                              <ChevronDown className="h-3.5 w-3.5" />
+                            ) : (
+                              <ChevronRight className="h-3.5 w-3.5" />
+                            )}
+                            {formatCheckedAt(research[comp.id].checked_at)}
+                          </button>
+                        ) : (
+                          <span className="text-xs text-muted-foreground">—</span>
+                        )}
+                      </div>
+                      <div className="w-10">
+                        <Button
+                          variant="ghost"
+                          size="icon"
+                          className="h-8 w-8 text-destructive hover:text-destructive"
+                          onClick={() => handleDelete(comp.id)}
+                        >
+                          <Trash2 className="h-3.5 w-3.5" />
+                          <span className="sr-only">Verwijder {comp.name}</span>
+                        </Button>
+                      </div>
                     </div>
+                    {/* Bekende bevindingen: direct uit de opslag, zonder nieuw onderzoek */}
+                    {expandedId === comp.id && research[comp.id] && (
+                      <div className="bg-muted/40 px-4 py-3">
+                        <p className="mb-2 text-[10px] text-muted-foreground">
+                          Bijgewerkt {formatCheckedAt(research[comp.id].updated_at)}, laatst gecontroleerd{" "}
+                          {formatCheckedAt(research[comp.id].checked_at)}
+                        </p>
+                        <MarkdownContent content={research[comp.id].summary} />
+                        {research[comp.id].sources.length > 0 && (
+                          <ul className="mt-3 space-y-1">
+                            {research[comp.id].sources.map((src) => (
+                              <li key={src.link} className="truncate text-xs">
+                                <a
+                                  href={src.link}
+                                  target="_blank"
+                                  rel="noopener noreferrer"
+                                  className="text-primary hover:underline"
+                                >
+                                  {src.title || src.link}
+                                </a>
+                                {src.date && <span className="text-muted-foreground"> · {src.date}</span>}
+                              </li>
+                            ))}
+                          </ul>
+                        )}
+                      </div>
+                    )}
                   </div>
                 ))}
               </div>
@@ -1,6 +1,8 @@
 import type {
   AgendaItem,
+  AgendaRun,
   Competitor,
+  CompetitorResearch,
   ThinkingStep,
 } from "./types"
 
@@ -226,6 +228,14 @@ export async function getCompetitors(): Promise<Competitor[]> {
   return data.competitors ?? []
 }
 
+/** Opgeslagen bevindingen per concurrent (zonder nieuw onderzoek). */
+export async function getCompetitorResearch(): Promise<CompetitorResearch[]> {
+  const res = await fetch(`${API_BASE}/competitors/research`)
+  if (!res.ok) throw new Error("Failed to fetch competitor research")
+  const data = await res.json()
+  return data.research ?? []
+}
+
 export async function addCompetitor(name: string): Promise<Competitor> {
   const res = await fetch(`${API_BASE}/competitors`, {
     method: "POST",
@@ -322,6 +332,41 @@ export async function deleteAgendaItem(id: string): Promise<void> {
   if (!res.ok) throw new Error("Failed to delete agenda item")
 }
 
+export async function getAgendaRuns(
+  id: string,
+  limit = 20,
+  offset = 0
+): Promise<{ total: number; limit: number; offset: number; runs: AgendaRun[] }> {
+  const res = await fetch(`${API_BASE}/agenda/${id}/runs?limit=${limit}&offset=${offset}`)
+  if (!res.ok) throw new Error("Failed to fetch agenda runs")
+  return res.json()
+}
+
+export async function getAgendaRun(id: string, runId: string): Promise<AgendaRun> {
+  const res = await fetch(`${API_BASE}/agenda/${id}/runs/${runId}`)
+  if (!res.ok) throw new Error("Failed to fetch agenda run")
+  return res.json()
+}
+
+/** Item direct uitvoeren (zelfde worker-pool als de scheduler). */
+export async function runAgendaItemNow(id: string): Promise<void> {
+  const res = await fetch(`${API_BASE}/agenda/${id}/run`, { method: "POST" })
+  if (!res.ok) throw new Error("Failed to start agenda item")
+}
+
+/** Lopende run van een item live volgen (SSE): onStep per stap, daarna het antwoord. */
+export async function streamAgendaRun(
+  id: string,
+  onStep: (step: ThinkingStep) => void
+): Promise<{ response: string }> {
+  const res = await fetch(`${API_BASE}/agenda/${id}/runs/current/stream`)
+  if (!res.ok) throw new Error("No running agenda run")
+  const reader = res.body?.getReader()
+  if (!reader) throw new Error("No response body")
+  const { response } = await parseSSEStream(reader, onStep)
+  return { response: response ?? "" }
+}
+
 // ─── Knowledge / Files ──────────────────────────────────────────────────────
 
 export async function getKnowledgeFiles(): Promise<string[]> {
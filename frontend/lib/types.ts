@@ -28,18 +28,75 @@ export interface AgendaItem {
   type: "once" | "recurring"
   schedule: string
   created_at?: string
+  /** Hoger = eerder uitgevoerd als meerdere taken tegelijk wachten */
+  priority?: number
+  /** prompt (Sonja) of competitor_monitor (website-controle van concurrenten) */
+  kind?: string
   last_run_at?: string | null
   /** Volgende geplande uitvoering (ISO), alleen bij GET /agenda */
   next_run_at?: string | null
-  /** Antwoord van Sonja bij laatste run */
-  last_run_response?: string | null
-  /** Denkstappen (tool-aanroepen) bij laatste run */
-  last_run_steps?: ThinkingStep[] | null
+  /** Id van de laatste run; details via GET /agenda/{id}/runs/{run_id} */
+  last_run_id?: string | null
+  /** done, retrying, error of timeout */
+  last_run_status?: string | null
+  last_run_duration_ms?: number | null
+  /** Begin van het antwoord (of de fout) van de laatste run */
+  last_run_summary?: string | null
+  /** Opgegeven uitvoering (geen retries meer); opnieuw via POST /agenda/{id}/retry */
+  dead_letter?: {
+    run_id: string
+    scheduled_for?: string | null
+    error?: string | null
+    attempts: number
+    at: string
+  } | null
+  /** Laatste geplande moment dat het misfire-beleid heeft overgeslagen */
+  skipped_for?: string | null
+}
+
+export interface AgendaRun {
+  id: string
+  item_id: string
+  started_at: string
+  finished_at?: string | null
+  status: string
+  duration_ms?: number | null
+  scheduled_for?: string | null
+  /** Tijd tussen afvuren en start in de worker-pool */
+  queue_wait_ms?: number | null
+  attempt?: number
+  tokens?: Record<string, number> | null
+  step_count: number
+  summary?: string | null
+  error?: string | null
+  /** Alleen bij GET /agenda/{id}/runs/{run_id} */
+  steps?: ThinkingStep[] | null
+  response?: string | null
 }
 
 export interface Competitor {
   id: string
   name: string
+  /** Gevolgde pagina's (website-monitoring via de agenda) */
+  urls?: string[]
+}
+
+export interface CompetitorSource {
+  title: string
+  link: string
+  date?: string
+  seen_at: string
+}
+
+/** Opgeslagen onderzoek per concurrent (GET /competitors/research); tijdstempels in UTC */
+export interface CompetitorResearch {
+  competitor_id: string
+  name: string
+  summary: string
+  sources: CompetitorSource[]
+  researched_at: string
+  checked_at: string
+  updated_at: string
 }
 
 export interface KnowledgeFile {